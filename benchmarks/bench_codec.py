@@ -0,0 +1,74 @@
+"""Time encoding and decoding a large MEMBER document with every installed JSON codec.
+
+Usage: ``python benchmarks/bench_codec.py [--guilds N] [--members N]``
+
+The document holds ``guilds x members`` members with a few values each,
+about 11 MB of JSON with the defaults. Only codecs which are installed are
+timed, note that ``auto`` (the default of ``DPYBOT_JSON_CODEC``) picks the
+standard library, see `dpybot.config._drivers.codec`.
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dpybot.config._drivers import codec  # noqa: E402
+
+
+def make_document(guilds: int, members: int) -> dict:
+    rng = random.Random(0)
+    return {
+        "1": {
+            "MEMBER": {
+                str(10**17 + g): {
+                    str(10**17 + m): {
+                        "xp": rng.randint(0, 10**6),
+                        "balance": rng.random() * 1000,
+                        "name": f"user{m}",
+                        "inventory": ["sword", "shield"],
+                    }
+                    for m in range(members)
+                }
+                for g in range(guilds)
+            }
+        }
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_document(args.guilds, args.members)
+    for name, codec_cls in codec._CODECS.items():
+        if not codec_cls.is_available():
+            print(f"{name:8} not installed")
+            continue
+        selected = codec.select_codec(name)
+        raw = selected.dumps(data)
+        dumps = best_of(args.repeat, lambda: selected.dumps(data))
+        loads = best_of(args.repeat, lambda: selected.loads(raw))
+        print(
+            f"{name:8} {len(raw) / 1e6:5.1f} MB  dumps {dumps * 1000:7.1f} ms"
+            f"  loads {loads * 1000:7.1f} ms  lossless {codec.is_lossless(selected)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
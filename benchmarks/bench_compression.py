@@ -0,0 +1,98 @@
+"""Time saving and loading a large settings file with each compression of JsonDriver.
+
+Usage: ``python benchmarks/bench_compression.py [--members N] [COMPRESSION ...]``
+
+The cog holds ``members`` members of a single guild, about 35 MB of JSON
+with the defaults. Each compression (``none``, ``gzip=1``, ``gzip`` and
+``zstd=1`` by default, the latter only if ``zstandard`` is installed) is
+written with ``durability="os"`` in a temporary directory, then loaded
+again. The JSON codec is selected with ``DPYBOT_JSON_CODEC``, like for the
+bot, the numbers of the ``compression`` option were measured with orjson.
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dpybot.config._drivers import Compression, IdentifierData, JsonDriver, codec  # noqa: E402
+
+
+def make_members(members: int) -> dict:
+    rng = random.Random(1)
+    return {
+        str(10**17 + m): {
+            "xp": rng.randint(0, 10**6),
+            "level": rng.randint(0, 100),
+            "name": f"user{m}",
+            "roles": [str(10**17 + rng.randint(0, 50)) for _ in range(3)],
+            "flags": {"muted": False, "warned": rng.random() < 0.1},
+        }
+        for m in range(members)
+    }
+
+
+async def bench(compression: str, members: dict, saves: int) -> None:
+    cog_name = "Bench" + compression.replace("=", "")
+    guild = IdentifierData(cog_name, "1", "MEMBER", ("1",), (), 2)
+    counter = IdentifierData(cog_name, "1", "GLOBAL", (), ("n",), 0)
+
+    driver = JsonDriver(cog_name, "1", compression=compression, durability="os")
+    await driver.set(guild, members)
+    start = time.perf_counter()
+    for i in range(saves):
+        await driver.set(counter, i)
+    save = (time.perf_counter() - start) / saves
+    compress = driver.save_stats()["compress"]
+    size = driver.data_path.stat().st_size
+    del driver
+    gc.collect()
+
+    start = time.perf_counter()
+    driver = JsonDriver(cog_name, "1", compression=compression)
+    load = time.perf_counter() - start
+    assert await driver.get(guild) == members
+    print(
+        f"{compression:8} {size / 1e6:6.1f} MB/save  save {save * 1000:5.0f} ms"
+        f"  compress {compress['total'] / max(compress['count'], 1) * 1000:5.0f} ms"
+        f"  load {load * 1000:5.0f} ms"
+    )
+
+
+async def run(compressions: list, members: dict, saves: int) -> None:
+    for compression in compressions:
+        await bench(compression, members, saves)
+    await JsonDriver.teardown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("compressions", nargs="*", metavar="COMPRESSION")
+    parser.add_argument("--members", type=int, default=200_000)
+    parser.add_argument("--saves", type=int, default=3)
+    args = parser.parse_args()
+
+    compressions = args.compressions or ["none", "gzip=1", "gzip"]
+    if not args.compressions:
+        try:
+            Compression.parse("zstd=1")
+        except ValueError:
+            print("zstd     not installed")
+        else:
+            compressions.append("zstd=1")
+    codec.configure()
+    members = make_members(args.members)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        asyncio.run(run(compressions, members, args.saves))
+
+
+if __name__ == "__main__":
+    main()
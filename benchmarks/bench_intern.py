@@ -0,0 +1,149 @@
+"""Measure the memory taken by a large cog's data, with and without ``intern_strings``.
+
+Usage: ``python benchmarks/bench_intern.py [--guilds N] [--members N] [--key-types]``
+
+The cog holds ``guilds x members`` members, drawn from a shared pool of
+users so that the same IDs repeat across guilds, with a couple of role IDs
+each: about 137 MB of JSON with the defaults. Each mode loads the settings
+file in a fresh process and reports how much its RSS grew (Linux only),
+then sets 20k more members. ``--key-types`` also compares the size of the
+live objects with interned string keys and with integer keys for the IDs.
+The JSON codec is selected with ``DPYBOT_JSON_CODEC``, like for the bot,
+the numbers of the ``intern_strings`` option were measured with orjson.
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dpybot.config._drivers import IdentifierData, JsonDriver, codec  # noqa: E402
+
+COG_NAME = "BenchIntern"
+
+
+def make_data(guilds: int, members: int) -> dict:
+    rng = random.Random(0)
+    users = [str(3 * 10**17 + rng.randrange(10**17)) for _ in range(members * 20)]
+    data = {}
+    for _ in range(guilds):
+        data[str(7 * 10**17 + rng.randrange(10**17))] = {
+            user: {
+                "xp": rng.randrange(10**6),
+                "level": rng.randrange(100),
+                "balance": rng.randrange(10**5),
+                "last_seen": 1700000000 + rng.randrange(10**7),
+                "roles": [str(5 * 10**17 + rng.randrange(50)) for _ in range(2)],
+            }
+            for user in rng.sample(users, members)
+        }
+    return {"1": {"MEMBER": data}}
+
+
+def rss() -> float:
+    with open("/proc/self/status") as fs:
+        for line in fs:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("Can't read the RSS of this process.")
+
+
+async def measure(intern_strings: bool) -> None:
+    codec.configure()
+    base = rss()
+    start = time.perf_counter()
+    driver = JsonDriver(COG_NAME, "1", intern_strings=intern_strings, commit_window=10)
+    load = time.perf_counter() - start
+    gc.collect()
+    loaded = rss() - base
+
+    guild = next(iter(driver.data["1"]["MEMBER"]))
+    member = next(iter(driver.data["1"]["MEMBER"][guild]))
+    roles = await driver.get(
+        IdentifierData(COG_NAME, "1", "MEMBER", (guild, member), ("roles",), 2)
+    )
+    start = time.perf_counter()
+    for i in range(20_000):
+        await driver.set(
+            IdentifierData(COG_NAME, "1", "MEMBER", (guild, str(10**18 + i)), (), 2),
+            {"xp": i, "level": 1, "balance": 0, "last_seen": 0, "roles": roles},
+        )
+    sets = time.perf_counter() - start
+    gc.collect()
+    mode = "intern_strings" if intern_strings else "default"
+    print(
+        f"{mode:15} RSS +{loaded:4.0f} MB  load {load:4.1f} s"
+        f"  20k sets {sets:4.2f} s (+{rss() - base - loaded:.0f} MB)"
+    )
+
+
+def live_size(node) -> int:
+    seen = set()
+    stack = [node]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return total
+
+
+def convert_keys(node, convert):
+    if isinstance(node, dict):
+        return {convert(key): convert_keys(value, convert) for key, value in node.items()}
+    if isinstance(node, list):
+        return [convert_keys(value, convert) for value in node]
+    return node
+
+
+def to_int(key: str):
+    return int(key) if key.isdigit() and 15 <= len(key) <= 20 else sys.intern(key)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=20_000)
+    parser.add_argument("--key-types", action="store_true")
+    parser.add_argument("--measure", choices=["default", "intern_strings"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure is not None:
+        asyncio.run(measure(args.measure == "intern_strings"))
+        return
+
+    codec.configure()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "data" / COG_NAME / "settings.json"
+        path.parent.mkdir(parents=True)
+        raw = codec.dumps(make_data(args.guilds, args.members))
+        path.write_bytes(raw)
+        print(f"{args.guilds * args.members} members, {len(raw) / 1e6:.0f} MB of JSON")
+        for mode in ("default", "intern_strings"):
+            subprocess.run([sys.executable, __file__, "--measure", mode], cwd=tmp, check=True)
+
+    if args.key_types:
+        data = codec.loads(raw)
+        del raw
+        print(f"live objects: str keys {live_size(data) / 2**20:4.0f} MB", end="")
+        interned = convert_keys(data, sys.intern)
+        print(f", interned {live_size(interned) / 2**20:4.0f} MB", end="")
+        del interned
+        print(f", int keys {live_size(convert_keys(data, to_int)) / 2**20:4.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import discord
 from dotenv import load_dotenv
 
 from dpybot.bot import DpyBot
+from dpybot.config._drivers import initialize_drivers, teardown_drivers
 
 warnings.filterwarnings("default", category=DeprecationWarning)
 
@@ -67,6 +68,7 @@ def _cancel_all_tasks(loop: asyncio.AbstractEventLoop) -> None:
 
 def run_bot() -> None:
     loop = asyncio.new_event_loop()
+    loop.run_until_complete(initialize_drivers())
     bot = DpyBot()
     TOKEN = loop.run_until_complete(bot._config.TOKEN())
     if not TOKEN:
@@ -85,6 +87,7 @@ def run_bot() -> None:
     finally:
         try:
             loop.run_until_complete(bot.close())
+            loop.run_until_complete(teardown_drivers())
             _cancel_all_tasks(loop)
             loop.run_until_complete(asyncio.sleep(2))
             loop.run_until_complete(loop.shutdown_asyncgens())
@@ -1,3 +1,3 @@
-from .config import Config, Value, Group
+from .config import Config, Value, Group, Transaction
 
-__all__ = ["Config", "Value", "Group"]
+__all__ = ["Config", "Value", "Group", "Transaction"]
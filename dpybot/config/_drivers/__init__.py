@@ -1,9 +1,155 @@
 # This is an extremely dumbed down version of the Config framework that can be found at https://github.com/cog-creators/Red-DiscordBot
 # All rights to this remain with the cog-creator whilst I'm allowed to use this under fair use.
 
-from .base import IdentifierData, BaseDriver, ConfigCategory
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Set, Type
+
+from . import codec
+from .base import IdentifierData, BaseDriver, ConfigCategory, Document, Durability
+from .compression import Compression
+from .dual import DualWriteDriver
 from .json import JsonDriver
+from .server import ConfigServer, ServerDriver
+from .sqlite import SqliteDriver
+from .views import FrozenMapping, FrozenSequence
 
 __all__ = [
-    "IdentifierData", "BaseDriver", "ConfigCategory", "JsonDriver",
+    "IdentifierData", "BaseDriver", "ConfigCategory", "Document", "Durability", "Compression",
+    "JsonDriver", "SqliteDriver", "DualWriteDriver", "ConfigServer", "ServerDriver",
+    "FrozenMapping", "FrozenSequence", "register_driver", "get_driver_class",
+    "initialize_drivers", "initialize_driver", "teardown_drivers",
 ]
+
+log = logging.getLogger("red.config")
+
+_DRIVERS: Dict[str, Type[BaseDriver]] = {
+    "json": JsonDriver,
+    "sqlite": SqliteDriver,
+    "server": ServerDriver,
+}
+# The driver classes which were initialized, or are being initialized.
+_initialized: Dict[Type[BaseDriver], "asyncio.Task[None]"] = {}
+# The driver classes picked with Config.get_conf() before they could be initialized.
+_requested: Set[Type[BaseDriver]] = set()
+_started = False
+
+
+def register_driver(name: str, driver_cls: Type[BaseDriver]) -> None:
+    """Make a driver selectable by the given name."""
+    _DRIVERS[name.lower()] = driver_cls
+
+
+def get_driver_class(
+    name: Optional[str] = None, *, cog_name: Optional[str] = None
+) -> Type[BaseDriver]:
+    """Get the class of the driver which should store the data of a cog.
+
+    Unless a ``name`` is given, the driver is selected with the
+    ``DPYBOT_CONFIG_DRIVERS`` environment variable, a comma separated list of
+    ``CogName:driver`` pairs, and for the cogs not listed there, with the
+    ``DPYBOT_CONFIG_DRIVER`` environment variable. The default is ``json``.
+
+    Parameters
+    ----------
+    name : Optional[str]
+        The name of the driver.
+    cog_name : Optional[str]
+        The name of the cog.
+
+    Raises
+    ------
+    ValueError
+        If there's no driver with the selected name.
+    """
+    if name is None and cog_name is not None:
+        name = _cog_drivers().get(cog_name)
+    if name is None:
+        name = os.getenv("DPYBOT_CONFIG_DRIVER") or "json"
+    try:
+        return _DRIVERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown config driver: {name}") from None
+
+
+def _cog_drivers() -> Dict[str, str]:
+    ret = {}
+    for entry in os.getenv("DPYBOT_CONFIG_DRIVERS", "").split(","):
+        cog_name, sep, name = entry.partition(":")
+        if sep:
+            ret[cog_name.strip()] = name.strip()
+    return ret
+
+
+async def initialize_drivers() -> None:
+    """Select the JSON codec and initialize all drivers selected in the environment,
+    with their config details.
+
+    The drivers picked for a cog with ``Config.get_conf(driver=...)`` are
+    initialized too, the ones picked before this is called along with the
+    others, and the ones picked after it in the background, as soon as
+    ``get_conf`` returns.
+
+    Raises
+    ------
+    ValueError
+        If one of the environment variables is invalid.
+    """
+    global _started
+    codec.configure()
+    driver_classes = {get_driver_class()}
+    driver_classes.update(map(get_driver_class, _cog_drivers().values()))
+    driver_classes.update(_requested)
+    _requested.clear()
+    _started = True
+    for driver_cls in driver_classes:
+        await initialize_driver(driver_cls)
+
+
+async def initialize_driver(driver_cls: Type[BaseDriver]) -> None:
+    """Initialize a driver class with its config details, unless it already is.
+
+    Parameters
+    ----------
+    driver_cls : Type[BaseDriver]
+        The driver class to initialize.
+    """
+    await _initialize_task(driver_cls)
+
+
+def _initialize_task(driver_cls: Type[BaseDriver]) -> "asyncio.Task[None]":
+    task = _initialized.get(driver_cls)
+    if task is None:
+        task = asyncio.ensure_future(driver_cls.initialize(**driver_cls.get_config_details()))
+        _initialized[driver_cls] = task
+    return task
+
+
+def _driver_picked(driver_cls: Type[BaseDriver]) -> None:
+    # Called by Config.get_conf() with the driver class it builds a driver of.
+    if driver_cls in _initialized:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _requested.add(driver_cls)
+        return
+    if not _started:
+        _requested.add(driver_cls)
+        return
+    _initialize_task(driver_cls).add_done_callback(_log_failure)
+
+
+def _log_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Failed to initialize a config driver", exc_info=task.exception())
+
+
+async def teardown_drivers() -> None:
+    """Tear down all registered drivers."""
+    global _started
+    for driver_cls in set(_DRIVERS.values()):
+        await driver_cls.teardown()
+    _initialized.clear()
+    _started = False
@@ -1,10 +1,36 @@
 import abc
+import asyncio
 import enum
-from typing import Tuple, Dict, Any, Union, List, AsyncIterator, Type
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import (
+    Tuple,
+    Dict,
+    Any,
+    Union,
+    List,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    Type,
+    Iterable,
+    NamedTuple,
+    Optional,
+)
 
 import rich.progress
 
-__all__ = ["BaseDriver", "IdentifierData", "ConfigCategory"]
+from . import codec
+from .views import freeze
+
+__all__ = ["BaseDriver", "IdentifierData", "ConfigCategory", "Durability", "Document"]
+
+#: A single document, i.e. the data under one full primary key of a category,
+#: as a (category, primary_key, data) tuple.
+Document = Tuple[str, Tuple[str, ...], Any]
 
 class RichIndefiniteBarColumn(rich.progress.ProgressColumn):
     def render(self, task):
@@ -165,10 +191,58 @@ class IdentifierData:
         )
 
 
+class Durability(NamedTuple):
+    """Policy for making sure that written data survives a crash of the OS or a power loss.
+
+    The policy is parsed from a string, one of:
+
+    ``always``
+        Wait for every write to reach the disk (fsync). This is the default.
+    ``interval=<ms>``
+        Don't wait for the disk, but make sure that writes reach it
+        within the given number of milliseconds.
+    ``os``
+        Never wait for the disk, leave it up to the OS.
+
+    All of them are safe when only the bot crashes.
+    The default can be changed with the ``DPYBOT_CONFIG_DURABILITY`` environment variable.
+    """
+
+    mode: str
+    #: The time (in seconds) within which writes reach the disk, for the ``interval`` mode.
+    interval: float = 0.0
+
+    @classmethod
+    def parse(cls, value: Optional[str] = None) -> "Durability":
+        """Parse the durability policy, using the default one when ``value`` is `None`.
+
+        Raises
+        ------
+        ValueError
+            If the policy is invalid.
+        """
+        if value is None:
+            value = os.getenv("DPYBOT_CONFIG_DURABILITY") or "always"
+        mode, _, arg = value.strip().partition("=")
+        if mode in ("always", "os") and not arg:
+            return cls(mode)
+        if mode == "interval":
+            try:
+                interval = float(arg) / 1000
+            except ValueError:
+                interval = 0
+            if interval > 0:
+                return cls(mode, interval)
+        raise ValueError(f"Invalid durability policy: {value!r}")
+
+
 class BaseDriver(abc.ABC):
-    def __init__(self, cog_name: str, identifier: str, **kwargs):
+    def __init__(
+        self, cog_name: str, identifier: str, *, durability: Optional[str] = None, **kwargs
+    ):
         self.cog_name = cog_name
         self.unique_cog_identifier = identifier
+        self.durability = Durability.parse(durability)
 
     @classmethod
     @abc.abstractmethod
@@ -229,6 +303,26 @@ class BaseDriver(abc.ABC):
         """
         raise NotImplementedError
 
+    async def get_view(self, identifier_data: IdentifierData) -> Any:
+        """
+        Finds the value indicated by the given identifiers and returns
+        a read-only view of it.
+
+        The BaseDriver provides a generic method which freezes the copy
+        returned by `get`. Drivers which keep the data in memory may
+        override it to return views of the stored data without copying.
+
+        Parameters
+        ----------
+        identifier_data
+
+        Returns
+        -------
+        Any
+            Read-only view of the stored value.
+        """
+        return freeze(await self.get(identifier_data))
+
     @abc.abstractmethod
     async def set(self, identifier_data: IdentifierData, value=None) -> None:
         """
@@ -242,6 +336,42 @@ class BaseDriver(abc.ABC):
         """
         raise NotImplementedError
 
+    async def set_many(self, items: Iterable[Tuple[IdentifierData, Any]]) -> None:
+        """
+        Sets the values of the keys indicated by each of the given identifiers.
+
+        The BaseDriver provides a generic method which calls `set` for each
+        item. Drivers should override it to set all values in a single
+        operation where possible.
+
+        Parameters
+        ----------
+        items
+            Pairs of identifiers and the JSON serializable values to set them to.
+        """
+        for identifier_data, value in items:
+            await self.set(identifier_data, value)
+
+    async def apply(self, changes: Iterable[Tuple[str, IdentifierData, Any]]) -> None:
+        """
+        Applies the given changes, in order.
+
+        The BaseDriver provides a generic method which calls `set` or `clear`
+        for each change. Drivers should override it to apply all changes
+        atomically, in a single operation.
+
+        Parameters
+        ----------
+        changes
+            Tuples of the operation (either ``"set"`` or ``"clear"``), the identifiers
+            and the value to set (ignored when clearing).
+        """
+        for op, identifier_data, value in changes:
+            if op == "set":
+                await self.set(identifier_data, value)
+            else:
+                await self.clear(identifier_data)
+
     @abc.abstractmethod
     async def clear(self, identifier_data: IdentifierData) -> None:
         """
@@ -273,6 +403,9 @@ class BaseDriver(abc.ABC):
         cls,
         new_driver_cls: Type["BaseDriver"],
         all_custom_group_data: Dict[str, Dict[str, Dict[str, int]]],
+        *,
+        concurrency: int = 4,
+        checkpoint_path: Optional[Path] = None,
     ) -> None:
         """Migrate data from this backend to another.
 
@@ -281,6 +414,12 @@ class BaseDriver(abc.ABC):
         This will only move the data - no instance metadata is modified
         as a result of this operation.
 
+        Up to ``concurrency`` cogs are migrated at once. Every category of
+        a cog is recorded in the checkpoint file once it's migrated, so an
+        interrupted migration continues where it stopped when it's started
+        again. Each cog is then verified by comparing the number and the
+        checksums of its documents in both backends.
+
         Parameters
         ----------
         new_driver_cls
@@ -288,31 +427,156 @@ class BaseDriver(abc.ABC):
         all_custom_group_data : Dict[str, Dict[str, Dict[str, int]]]
             Dict mapping cog names, to cog IDs, to custom groups, to
             primary key lengths.
+        concurrency : int
+            The number of cogs migrated at once.
+        checkpoint_path : Optional[Path]
+            The path of the checkpoint file, ``config-migration.json``
+            in the working directory by default. It's removed once
+            the migration is done.
+
+        Raises
+        ------
+        RuntimeError
+            If the data of some cogs doesn't match after it's migrated.
+            Those cogs are migrated again the next time.
 
         """
         # Backend-agnostic method of migrating from one driver to another.
+        if checkpoint_path is None:
+            checkpoint_path = Path(os.getcwd()) / "config-migration.json"
+        checkpoint = _MigrationCheckpoint(checkpoint_path, cls.__name__, new_driver_cls.__name__)
+        failed = []
         with rich.progress.Progress(
             rich.progress.SpinnerColumn(),
             rich.progress.TextColumn("[progress.description]{task.description}"),
             RichIndefiniteBarColumn(),
             rich.progress.TextColumn("{task.completed} cogs processed"),
+            rich.progress.TextColumn("{task.fields[documents]} documents"),
+            rich.progress.TextColumn("{task.fields[throughput]}"),
             rich.progress.TimeElapsedColumn(),
         ) as progress:
             cog_count = 0
-            tid = progress.add_task("[yellow]Migrating", completed=cog_count, total=cog_count + 1)
-            async for cog_name, cog_id in cls.aiter_cogs():
-                progress.console.print(f"Working on {cog_name}...")
-
-                this_driver = cls(cog_name, cog_id)
-                other_driver = new_driver_cls(cog_name, cog_id)
-                custom_group_data = all_custom_group_data.get(cog_name, {}).get(cog_id, {})
-                exported_data = await this_driver.export_data(custom_group_data)
-                await other_driver.import_data(exported_data, custom_group_data)
+            tid = progress.add_task(
+                "[yellow]Migrating",
+                completed=cog_count,
+                total=cog_count + 1,
+                documents=0,
+                throughput="",
+            )
+            stats = _DocumentStats()
+            start = time.perf_counter()
+
+            def report() -> None:
+                elapsed = max(time.perf_counter() - start, 1e-9)
+                progress.update(
+                    tid,
+                    documents=stats.count,
+                    throughput=(
+                        f"{stats.count / elapsed:.0f} documents/s,"
+                        f" {stats.size / elapsed / 1e6:.2f} MB/s"
+                    ),
+                )
 
+            async def migrate_cog(cog_name: str, cog_id: str) -> None:
+                nonlocal cog_count
+                if checkpoint.is_verified(cog_name, cog_id):
+                    progress.console.print(f"Skipping {cog_name}, it's already migrated.")
+                else:
+                    progress.console.print(f"Working on {cog_name}...")
+                    custom_group_data = all_custom_group_data.get(cog_name, {}).get(cog_id, {})
+                    if not await cls._migrate_cog(
+                        new_driver_cls,
+                        cog_name,
+                        cog_id,
+                        custom_group_data,
+                        checkpoint,
+                        stats,
+                        report,
+                    ):
+                        progress.console.print(f"[red]Verification of {cog_name} failed.")
+                        failed.append(cog_name)
                 cog_count += 1
                 progress.update(tid, completed=cog_count, total=cog_count + 1)
+
+            slots = asyncio.Semaphore(concurrency)
+            tasks = []
+            try:
+                async for cog_name, cog_id in cls.aiter_cogs():
+                    await slots.acquire()
+                    task = asyncio.create_task(migrate_cog(cog_name, cog_id))
+                    task.add_done_callback(lambda _: slots.release())
+                    tasks.append(task)
+                    # Stop scheduling new cogs once one of them raised.
+                    if any(t.done() and not t.cancelled() and t.exception() for t in tasks):
+                        break
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            report()
             progress.update(tid, total=cog_count)
         print()
+        if failed:
+            raise RuntimeError(f"The migrated data of {', '.join(failed)} doesn't match.")
+        checkpoint.remove()
+
+    @classmethod
+    async def _migrate_cog(
+        cls,
+        new_driver_cls: Type["BaseDriver"],
+        cog_name: str,
+        cog_id: str,
+        custom_group_data: Dict[str, int],
+        checkpoint: "_MigrationCheckpoint",
+        stats: "_DocumentStats",
+        report: Callable[[], None],
+    ) -> bool:
+        """Migrate the categories of a cog which aren't in the checkpoint yet and verify them.
+
+        Whatever the new driver holds in those categories is cleared first, it may be left
+        over from an earlier migration of data which changed since.
+        """
+        this_driver = cls(cog_name, cog_id)
+        other_driver = new_driver_cls(cog_name, cog_id)
+        done = checkpoint.categories(cog_name, cog_id)
+
+        if not done:
+            await other_driver.clear(IdentifierData(cog_name, cog_id, "", (), (), 0))
+        else:
+            categories = [c.value for c in ConfigCategory]
+            categories.extend(custom_group_data.keys())
+            for category in categories:
+                if category not in done:
+                    await other_driver.clear(
+                        IdentifierData(
+                            cog_name,
+                            cog_id,
+                            category,
+                            (),
+                            (),
+                            *ConfigCategory.get_pkey_info(category, custom_group_data),
+                        )
+                    )
+
+        async for category, documents in _by_category(this_driver.export_data(custom_group_data)):
+            if category in done:
+                continue
+            category_stats = _DocumentStats()
+            await other_driver.import_data(
+                category_stats.track(documents, stats, report), custom_group_data
+            )
+            checkpoint.add_category(cog_name, cog_id, category, category_stats)
+
+        expected = checkpoint.categories(cog_name, cog_id)
+        migrated = {category: _DocumentStats() for category in expected}
+        async for category, pkey, data in other_driver.export_data(custom_group_data):
+            if category in migrated:
+                migrated[category].add(pkey, data)
+        if migrated == expected:
+            checkpoint.set_verified(cog_name, cog_id)
+            return True
+        checkpoint.reset(cog_name, cog_id)
+        return False
 
     @classmethod
     async def delete_all_data(cls, **kwargs) -> None:
@@ -339,33 +603,44 @@ class BaseDriver(abc.ABC):
         category: Union[ConfigCategory, str],
         custom_group_data: Dict[str, int],
         data: Dict[str, Any],
-    ) -> List[Tuple[Tuple[str, ...], Dict[str, Any]]]:
+    ) -> Iterator[Tuple[Tuple[str, ...], Any]]:
         pkey_len = ConfigCategory.get_pkey_info(category, custom_group_data)[0]
         if pkey_len == 0:
-            return [((), data)]
+            yield (), data
+            return
 
         def flatten(levels_remaining, currdata, parent_key=()):
-            items = []
             for _k, _v in currdata.items():
                 new_key = parent_key + (_k,)
                 if levels_remaining > 1:
-                    items.extend(flatten(levels_remaining - 1, _v, new_key).items())
+                    yield from flatten(levels_remaining - 1, _v, new_key)
                 else:
-                    items.append((new_key, _v))
-            return dict(items)
+                    yield new_key, _v
+
+        yield from flatten(pkey_len, data)
+
+    async def export_data(self, custom_group_data: Dict[str, int]) -> AsyncIterator[Document]:
+        """Export all of this cog's data, one document at a time.
 
-        ret = []
-        for k, v in flatten(pkey_len, data).items():
-            ret.append((k, v))
-        return ret
+        The BaseDriver provides a generic method which loads one category
+        at a time. It may be overridden by subclasses which can read the
+        documents one by one.
 
-    async def export_data(
-        self, custom_group_data: Dict[str, int]
-    ) -> List[Tuple[str, Dict[str, Any]]]:
+        Parameters
+        ----------
+        custom_group_data : Dict[str, int]
+            Dict mapping the custom groups of the cog to the lengths
+            of their primary keys.
+
+        Yields
+        ------
+        Document
+            Asynchronously yields (category, primary_key, data) tuples.
+
+        """
         categories = [c.value for c in ConfigCategory]
         categories.extend(custom_group_data.keys())
 
-        ret = []
         for c in categories:
             ident_data = IdentifierData(
                 self.cog_name,
@@ -379,21 +654,190 @@ class BaseDriver(abc.ABC):
                 data = await self.get(ident_data)
             except KeyError:
                 continue
-            ret.append((c, data))
-        return ret
+            for pkey, document in self._split_primary_key(c, custom_group_data, data):
+                yield c, pkey, document
 
     async def import_data(
-        self, cog_data: List[Tuple[str, Dict[str, Any]]], custom_group_data: Dict[str, int]
+        self,
+        documents: AsyncIterable[Document],
+        custom_group_data: Dict[str, int],
+        *,
+        batch_size: int = 1000,
     ) -> None:
-        for category, all_data in cog_data:
-            splitted_pkey = self._split_primary_key(category, custom_group_data, all_data)
-            for pkey, data in splitted_pkey:
-                ident_data = IdentifierData(
-                    self.cog_name,
-                    self.unique_cog_identifier,
-                    category,
-                    pkey,
-                    (),
-                    *ConfigCategory.get_pkey_info(category, custom_group_data),
-                )
-                await self.set(ident_data, data)
+        """Import the given documents into this cog's data.
+
+        The documents are consumed (and written) in batches, so that
+        no more than ``batch_size`` of them are held at once.
+
+        The BaseDriver provides a generic method which writes each batch
+        with `set_many`. It may be overridden by subclasses.
+
+        Parameters
+        ----------
+        documents : AsyncIterable[Document]
+            The (category, primary_key, data) tuples to import, usually
+            the ones exported by `export_data`.
+        custom_group_data : Dict[str, int]
+            Dict mapping the custom groups of the cog to the lengths
+            of their primary keys.
+        batch_size : int
+            The number of documents written at once.
+
+        """
+        async for batch in _batched(documents, batch_size):
+            await self.set_many(
+                (self._document_identifier(category, pkey, custom_group_data), data)
+                for category, pkey, data in batch
+            )
+
+    def _document_identifier(
+        self, category: str, pkey: Tuple[str, ...], custom_group_data: Dict[str, int]
+    ) -> IdentifierData:
+        return IdentifierData(
+            self.cog_name,
+            self.unique_cog_identifier,
+            category,
+            pkey,
+            (),
+            *ConfigCategory.get_pkey_info(category, custom_group_data),
+        )
+
+
+async def _batched(items: AsyncIterable[Any], size: int) -> AsyncIterator[List[Any]]:
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _by_category(
+    documents: AsyncIterable[Document],
+) -> AsyncIterator[Tuple[str, AsyncIterator[Document]]]:
+    """Split the given documents, which are grouped by their categories, into a stream
+    of the documents of each category. Documents of a category which aren't consumed
+    before moving on to the next one are skipped.
+    """
+    iterator = documents.__aiter__()
+    pending: Optional[Document] = None
+
+    async def advance() -> None:
+        nonlocal pending
+        try:
+            pending = await iterator.__anext__()
+        except StopAsyncIteration:
+            pending = None
+
+    async def category_documents(category: str) -> AsyncIterator[Document]:
+        while pending is not None and pending[0] == category:
+            document = pending
+            await advance()
+            yield document
+
+    await advance()
+    while pending is not None:
+        category = pending[0]
+        yield category, category_documents(category)
+        while pending is not None and pending[0] == category:
+            await advance()
+
+
+class _DocumentStats:
+    """The number, total size and checksum of a set of documents.
+
+    The checksum doesn't depend on the order of the documents.
+    """
+
+    __slots__ = ("count", "size", "checksum")
+
+    def __init__(self, count: int = 0, size: int = 0, checksum: int = 0):
+        self.count = count
+        self.size = size
+        self.checksum = checksum
+
+    def add(self, pkey: Tuple[str, ...], data: Any) -> int:
+        encoded = codec.dumps([pkey, data])
+        digest = hashlib.blake2b(encoded, digest_size=8).digest()
+        self.count += 1
+        self.size += len(encoded)
+        self.checksum = (self.checksum + int.from_bytes(digest, "little")) % 2**64
+        return len(encoded)
+
+    async def track(
+        self,
+        documents: AsyncIterable[Document],
+        total: "_DocumentStats",
+        report: Callable[[], None],
+    ) -> AsyncIterator[Document]:
+        async for document in documents:
+            total.size += self.add(document[1], document[2])
+            total.count += 1
+            if total.count % 1000 == 0:
+                report()
+            yield document
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, _DocumentStats):
+            return NotImplemented
+        return (self.count, self.checksum) == (other.count, other.checksum)
+
+    def to_list(self) -> List[int]:
+        return [self.count, self.size, self.checksum]
+
+
+class _MigrationCheckpoint:
+    """The progress of a migration, saved to a file after every migrated category."""
+
+    def __init__(self, path: Path, source: str, target: str):
+        self.path = path
+        self._data = {"source": source, "target": target, "cogs": {}}
+        try:
+            data = codec.loads(path.read_bytes())
+        except FileNotFoundError:
+            return
+        if data.get("source") == source and data.get("target") == target:
+            self._data = data
+
+    def _cog(self, cog_name: str, cog_id: str) -> Dict[str, Any]:
+        return (
+            self._data["cogs"]
+            .setdefault(cog_name, {})
+            .setdefault(cog_id, {"categories": {}, "verified": False})
+        )
+
+    def is_verified(self, cog_name: str, cog_id: str) -> bool:
+        return self._cog(cog_name, cog_id)["verified"]
+
+    def categories(self, cog_name: str, cog_id: str) -> Dict[str, _DocumentStats]:
+        return {
+            category: _DocumentStats(*stats)
+            for category, stats in self._cog(cog_name, cog_id)["categories"].items()
+        }
+
+    def add_category(
+        self, cog_name: str, cog_id: str, category: str, stats: _DocumentStats
+    ) -> None:
+        self._cog(cog_name, cog_id)["categories"][category] = stats.to_list()
+        self._save()
+
+    def set_verified(self, cog_name: str, cog_id: str) -> None:
+        self._cog(cog_name, cog_id)["verified"] = True
+        self._save()
+
+    def reset(self, cog_name: str, cog_id: str) -> None:
+        del self._data["cogs"][cog_name][cog_id]
+        self._save()
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_bytes(codec.dumps(self._data))
+        tmp_path.replace(self.path)
+
+    def remove(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,230 @@
+"""JSON codec used by the config subsystem.
+
+Serialization is the dominant CPU cost of config saves, so the codec can use
+a fast third-party JSON library instead of the standard library, with the
+``DPYBOT_JSON_CODEC`` environment variable (``auto``, ``orjson``, ``msgspec``
+or ``json``). It's read when the drivers are initialized, see `configure`,
+the standard library is used until then.
+
+``auto``, the default, picks the fastest installed codec which stores data
+unchanged. Neither of the third-party ones currently is: both encode ``NaN``
+and infinities as ``null`` and orjson decodes integers which don't fit in
+64 bits as floats. This means that ``auto`` always picks the standard library
+and that orjson and msgspec only get used once they're selected explicitly.
+
+All codecs return UTF-8 encoded bytes from ``dumps`` and raise `ValueError`
+from ``loads`` for malformed input.
+"""
+
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, Type, Union
+
+__all__ = [
+    "Codec", "get_codec", "select_codec", "configure", "is_lossless", "dumps", "loads", "copy"
+]
+
+log = logging.getLogger("dpybot.config.codec")
+
+
+class Codec:
+    """JSON codec based on the standard library's `json` module."""
+
+    name = "json"
+
+    @staticmethod
+    def is_available() -> bool:
+        return True
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def copy(self, obj: Any) -> Any:
+        return self.loads(self.dumps(obj))
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            import orjson  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return self._orjson.dumps(obj, option=self._option)
+        except TypeError:
+            # orjson doesn't support everything the standard library does (e.g. integers
+            # over 64 bits), let the standard library either handle it or raise.
+            return super().dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._orjson.loads(data)
+
+    def copy(self, obj: Any) -> Any:
+        try:
+            return self._orjson.loads(self._orjson.dumps(obj, option=self._option))
+        except TypeError:
+            # What the standard library encodes has to be decoded by it too.
+            return _stdlib.copy(obj)
+
+
+class MsgspecCodec(Codec):
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+
+        self._decode_error = msgspec.DecodeError
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            import msgspec  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return self._encoder.encode(obj)
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._decode_error as exc:
+            raise ValueError(str(exc)) from exc
+
+    def copy(self, obj: Any) -> Any:
+        try:
+            return self._decoder.decode(self._encoder.encode(obj))
+        except TypeError:
+            return _stdlib.copy(obj)
+
+
+_stdlib = Codec()
+
+_CODECS: Dict[str, Type[Codec]] = {
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecCodec.name: MsgspecCodec,
+    Codec.name: Codec,
+}
+
+_codec: Codec = Codec()
+
+# Values which the standard library stores unchanged and other libraries may not.
+_PROBE = [2**70, -(2**70), 2**64 + 1, float("nan"), float("inf"), float("-inf")]
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a):
+        return math.isnan(b)
+    return type(a) is type(b) and a == b
+
+
+def is_lossless(codec: Codec) -> bool:
+    """Check whether the codec keeps the values which the standard library stores unchanged,
+    both when copying them and when loading them from files it wrote.
+    """
+    try:
+        copied = codec.copy(_PROBE)
+        loaded = codec.loads(json.dumps(_PROBE).encode("utf-8"))
+    except ValueError:
+        return False
+    return all(
+        isinstance(result, list)
+        and len(result) == len(_PROBE)
+        and all(map(_same, _PROBE, result))
+        for result in (copied, loaded)
+    )
+
+
+def get_codec() -> Codec:
+    """Get the codec currently used by the config subsystem."""
+    return _codec
+
+
+def select_codec(name: str = "auto") -> Codec:
+    """Select the codec used by the config subsystem.
+
+    Parameters
+    ----------
+    name : str
+        The name of the codec, or ``"auto"`` to pick the fastest installed one
+        which stores data unchanged (see `is_lossless`).
+
+    Raises
+    ------
+    ValueError
+        If the codec with the given name doesn't exist or isn't installed.
+    """
+    global _codec
+    if name == "auto":
+        _codec = next(
+            codec
+            for codec in (c() for c in _CODECS.values() if c.is_available())
+            if is_lossless(codec)
+        )
+    else:
+        try:
+            codec_cls = _CODECS[name]
+        except KeyError:
+            raise ValueError(f"Unknown JSON codec: {name}") from None
+        if not codec_cls.is_available():
+            raise ValueError(f"The {name} JSON codec isn't installed.")
+        _codec = codec_cls()
+        if not is_lossless(_codec):
+            log.warning(
+                "The %s JSON codec doesn't store some values (e.g. NaN or integers"
+                " over 64 bits) unchanged.",
+                name,
+            )
+    log.debug("Using the %s JSON codec.", _codec.name)
+    return _codec
+
+
+def configure() -> Codec:
+    """Select the codec named by the ``DPYBOT_JSON_CODEC`` environment variable.
+
+    Raises
+    ------
+    ValueError
+        If the environment variable names a codec which doesn't exist or isn't installed.
+    """
+    name = os.getenv("DPYBOT_JSON_CODEC", "").strip() or "auto"
+    try:
+        return select_codec(name)
+    except ValueError as exc:
+        raise ValueError(f"Invalid DPYBOT_JSON_CODEC: {exc}") from None
+
+
+def dumps(obj: Any) -> bytes:
+    return _codec.dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return _codec.loads(data)
+
+
+def copy(obj: Any) -> Any:
+    """Deep copy the given object, making sure that it's JSON serializable."""
+    return _codec.copy(obj)
@@ -0,0 +1,161 @@
+"""Compression of the settings files written by the config drivers.
+
+Compressed files are recognized by their magic bytes when they're read, so
+the compression of a cog can be changed (or turned off) at any time without
+migrating its data. ``gzip`` uses the standard library, while ``zstd``
+requires the ``zstandard`` package.
+
+The compression is parsed from a string, one of ``none``, ``gzip`` or
+``zstd``, optionally followed by ``=<level>``, e.g. ``zstd=9``. The default
+can be changed with the ``DPYBOT_CONFIG_COMPRESSION`` environment variable.
+"""
+
+import os
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Type
+
+__all__ = ["Compression", "decompress"]
+
+
+class Compressor:
+    """No compression."""
+
+    name = "none"
+    magic = b""
+    default_level = 0
+
+    @staticmethod
+    def is_available() -> bool:
+        return True
+
+    def compress(self, chunks: List[bytes], level: int) -> List[bytes]:
+        return chunks
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class GzipCompressor(Compressor):
+    name = "gzip"
+    magic = b"\x1f\x8b"
+    default_level = 6
+    # Makes zlib write (and expect) a gzip header and trailer.
+    _WBITS = 16 + zlib.MAX_WBITS
+
+    def compress(self, chunks: List[bytes], level: int) -> List[bytes]:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, self._WBITS)
+        ret = [compressor.compress(chunk) for chunk in chunks]
+        ret.append(compressor.flush())
+        return ret
+
+    def decompress(self, data: bytes) -> bytes:
+        try:
+            return zlib.decompress(data, self._WBITS)
+        except zlib.error as exc:
+            raise ValueError(str(exc)) from exc
+
+
+class ZstdCompressor(Compressor):
+    name = "zstd"
+    magic = b"\x28\xb5\x2f\xfd"
+    default_level = 3
+
+    def __init__(self):
+        import zstandard
+
+        self._zstandard = zstandard
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def compress(self, chunks: List[bytes], level: int) -> List[bytes]:
+        compressor = self._zstandard.ZstdCompressor(level=level).compressobj()
+        ret = [compressor.compress(chunk) for chunk in chunks]
+        ret.append(compressor.flush())
+        return ret
+
+    def decompress(self, data: bytes) -> bytes:
+        # The frames written by `compress` don't record the size of their content.
+        try:
+            return self._zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        except self._zstandard.ZstdError as exc:
+            raise ValueError(str(exc)) from exc
+
+
+_COMPRESSORS: Dict[str, Type[Compressor]] = {
+    Compressor.name: Compressor,
+    GzipCompressor.name: GzipCompressor,
+    ZstdCompressor.name: ZstdCompressor,
+}
+
+_instances: Dict[str, Compressor] = {}
+
+
+def _get_compressor(name: str) -> Compressor:
+    compressor = _instances.get(name)
+    if compressor is None:
+        compressor = _instances[name] = _COMPRESSORS[name]()
+    return compressor
+
+
+class Compression(NamedTuple):
+    """The compression of a settings file, see the module's docstring for its format."""
+
+    algorithm: str
+    level: int = 0
+
+    @classmethod
+    def parse(cls, value: Optional[str] = None) -> "Compression":
+        """Parse the compression, using the default one when ``value`` is `None`.
+
+        Raises
+        ------
+        ValueError
+            If the compression is invalid or its library isn't installed.
+        """
+        if value is None:
+            value = os.getenv("DPYBOT_CONFIG_COMPRESSION") or "none"
+        algorithm, _, arg = value.strip().lower().partition("=")
+        compressor_cls = _COMPRESSORS.get(algorithm)
+        if compressor_cls is None or (arg and compressor_cls is Compressor):
+            raise ValueError(f"Invalid compression: {value!r}")
+        if not compressor_cls.is_available():
+            raise ValueError(f"The {algorithm} compression isn't installed.")
+        if not arg:
+            return cls(algorithm, compressor_cls.default_level)
+        try:
+            return cls(algorithm, int(arg))
+        except ValueError:
+            raise ValueError(f"Invalid compression level: {value!r}") from None
+
+    @property
+    def enabled(self) -> bool:
+        return self.algorithm != Compressor.name
+
+    def compress(self, chunks: List[bytes]) -> List[bytes]:
+        """Compress the concatenation of the given chunks."""
+        return _get_compressor(self.algorithm).compress(chunks, self.level)
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress the contents of a file, which may or may not be compressed.
+
+    Raises
+    ------
+    ValueError
+        If the data is compressed but corrupted, or if it's compressed
+        with an algorithm whose library isn't installed.
+    """
+    for compressor_cls in _COMPRESSORS.values():
+        if compressor_cls.magic and data[: len(compressor_cls.magic)] == compressor_cls.magic:
+            if not compressor_cls.is_available():
+                raise ValueError(
+                    f"The data is compressed with {compressor_cls.name}, which isn't installed."
+                )
+            return _get_compressor(compressor_cls.name).decompress(data)
+    return data
@@ -0,0 +1,185 @@
+"""Live migration of a cog's data from one driver to another.
+
+While a cog is being migrated, `DualWriteDriver` stands in for its driver:
+every change is written to the old driver first and then mirrored to the
+new one, while `DualWriteDriver.copy` copies the existing documents in the
+background. Reads keep going to the old driver until the copy is verified.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Set, Tuple
+
+from .base import BaseDriver, Document, IdentifierData, _batched, _DocumentStats
+
+__all__ = ["DualWriteDriver"]
+
+
+class DualWriteDriver(BaseDriver):
+    """Driver writing to both an old and a new driver of the same cog.
+
+    Changes are mirrored to the new driver a whole document at a time: after
+    a change is written to the old driver, the document it touched is read
+    back from it and written to the new one. This means that documents which
+    weren't copied yet don't end up incomplete in the new driver, and that
+    `copy` can skip the documents changed since it started.
+
+    Changes of the cog are serialized while it's being migrated.
+    """
+
+    def __init__(self, old: BaseDriver, new: BaseDriver):
+        super().__init__(old.cog_name, old.unique_cog_identifier)
+        self.old = old
+        self.new = new
+        #: Whether reads are served by the new driver, set once the copy is verified.
+        self.reads_from_new = False
+        self._lock = asyncio.Lock()
+        # The documents (or prefixes of them) changed since the copy started.
+        self._touched: Set[Tuple[str, ...]] = set()
+
+    @classmethod
+    async def initialize(cls, **storage_details) -> None:
+        # The wrapped drivers are initialized on their own.
+        return
+
+    @classmethod
+    async def teardown(cls) -> None:
+        return
+
+    @staticmethod
+    def get_config_details() -> Dict[str, Any]:
+        return {}
+
+    @classmethod
+    def aiter_cogs(cls) -> AsyncIterator[Tuple[str, str]]:
+        raise NotImplementedError("List the cogs of the wrapped drivers instead.")
+
+    @property
+    def _reads(self) -> BaseDriver:
+        return self.new if self.reads_from_new else self.old
+
+    async def get(self, identifier_data: IdentifierData) -> Any:
+        return await self._reads.get(identifier_data)
+
+    async def get_view(self, identifier_data: IdentifierData) -> Any:
+        return await self._reads.get_view(identifier_data)
+
+    async def set(self, identifier_data: IdentifierData, value=None) -> None:
+        await self.apply([("set", identifier_data, value)])
+
+    async def set_many(self, items: Iterable[Tuple[IdentifierData, Any]]) -> None:
+        await self.apply(("set", identifier_data, value) for identifier_data, value in items)
+
+    async def clear(self, identifier_data: IdentifierData) -> None:
+        await self.apply([("clear", identifier_data, None)])
+
+    async def apply(self, changes: Iterable[Tuple[str, IdentifierData, Any]]) -> None:
+        changes = list(changes)
+        async with self._lock:
+            await self.old.apply(changes)
+            for op, identifier_data, value in changes:
+                await self._mirror(op, identifier_data, value)
+
+    async def export_data(self, custom_group_data: Dict[str, int]) -> AsyncIterator[Document]:
+        async for document in self._reads.export_data(custom_group_data):
+            yield document
+
+    async def _mirror(self, op: str, identifier_data: IdentifierData, value: Any) -> None:
+        category = identifier_data.category
+        pkey = identifier_data.primary_key
+        if not category or len(pkey) < identifier_data.primary_key_len:
+            # The change replaces everything under a prefix of documents, it can be repeated.
+            # Setting all of the cog's data needs the new driver to support it, for custom
+            # groups, `SqliteDriver` only does once they have documents in the database.
+            self._touched.add((category, *pkey) if category else ())
+            if op == "set":
+                await self.new.set(identifier_data, value)
+            else:
+                await self.new.clear(identifier_data)
+            return
+
+        document = IdentifierData(
+            self.cog_name,
+            self.unique_cog_identifier,
+            category,
+            pkey,
+            (),
+            identifier_data.primary_key_len,
+            identifier_data.is_custom,
+        )
+        self._touched.add((category, *pkey))
+        try:
+            value = await self.old.get(document)
+        except KeyError:
+            await self.new.clear(document)
+        else:
+            await self.new.set(document, value)
+
+    def _is_touched(self, category: str, pkey: Tuple[str, ...]) -> bool:
+        key = (category, *pkey)
+        return any(key[:length] in self._touched for length in range(len(key) + 1))
+
+    async def copy(
+        self, custom_group_data: Dict[str, int], *, rate: float = 1000, batch_size: int = 100
+    ) -> None:
+        """Copy all of the cog's documents from the old driver to the new one.
+
+        The cog's data in the new driver is cleared first.
+
+        Parameters
+        ----------
+        custom_group_data : Dict[str, int]
+            Dict mapping the custom groups of the cog to the lengths
+            of their primary keys.
+        rate : float
+            The maximum number of documents copied per second.
+        batch_size : int
+            The number of documents copied at once.
+        """
+        async with self._lock:
+            self._touched.clear()
+            await self.new.clear(
+                IdentifierData(self.cog_name, self.unique_cog_identifier, "", (), (), 0)
+            )
+        start = time.perf_counter()
+        copied = 0
+        async for batch in _batched(self.old.export_data(custom_group_data), batch_size):
+            async with self._lock:
+                # The documents changed since they were exported are already up-to-date.
+                await self.new.set_many(
+                    (self._document_identifier(category, pkey, custom_group_data), data)
+                    for category, pkey, data in batch
+                    if not self._is_touched(category, pkey)
+                )
+            copied += len(batch)
+            delay = copied / rate - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def verify(self, custom_group_data: Dict[str, int]) -> bool:
+        """Compare the cog's documents in both drivers, switching reads to the new one
+        if they match.
+
+        Changes of the cog wait until the comparison is done.
+
+        Returns
+        -------
+        bool
+            Whether the documents match.
+        """
+        async with self._lock:
+            old_stats = await _category_stats(self.old, custom_group_data)
+            new_stats = await _category_stats(self.new, custom_group_data)
+            if old_stats != new_stats:
+                return False
+            self.reads_from_new = True
+            return True
+
+
+async def _category_stats(
+    driver: BaseDriver, custom_group_data: Dict[str, int]
+) -> Dict[str, _DocumentStats]:
+    stats: Dict[str, _DocumentStats] = {}
+    async for category, pkey, data in driver.export_data(custom_group_data):
+        stats.setdefault(category, _DocumentStats()).add(pkey, data)
+    return stats
@@ -0,0 +1,8 @@
+"""Driver storing the data of each cog in JSON settings files under the ``data`` directory.
+
+The driver is split into a module per part of it, the only public name is `JsonDriver`.
+"""
+
+from .driver import JsonDriver
+
+__all__ = ["JsonDriver"]
@@ -0,0 +1,156 @@
+"""The state shared by all `JsonDriver` instances of a cog."""
+
+import asyncio
+import logging
+import os
+import weakref
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from ..base import Durability
+from ..compression import Compression
+from .evictor import _evictor
+from .files import _file_key, _read_settings, _stat_key
+from .pipeline import _CommitFlusher, _SavePipeline
+from .registry import _cogs
+from .stats import _DurationStats, _LockStats, _SizeStats, _acquire
+from .watcher import _watcher
+
+if TYPE_CHECKING:
+    from .storage import _FileStorage
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _CogOptions(NamedTuple):
+    """The options of a cog's storage, see `JsonDriver` for what they do.
+
+    They're fixed when the cog's data is first loaded, all drivers of the cog share them.
+    """
+
+    path: Path
+    storage: Type["_FileStorage"]
+    compression: Compression
+    durability: Durability
+    commit_window: Optional[float] = None
+    commit_max_pending: int = 100
+    journal_compact_size: int = 8 * 1024 * 1024
+    shard_count: int = 16
+    incremental_saves: bool = True
+    binary_snapshot: bool = False
+    watch: bool = False
+    intern_strings: bool = False
+
+
+class _Cog:
+    """The state of a single cog, shared by all of its drivers.
+
+    It's created by the first driver of the cog and dropped
+    once the last one is garbage collected.
+    """
+
+    def __init__(self, name: str, options: _CogOptions):
+        self.name = name
+        self.options = options
+        self.path = options.path
+        self.data: Optional[Dict[str, Any]] = None
+        self.drivers = 0
+        # Held while the data is being read off the event loop,
+        # and by writers while they change it.
+        self.lock = asyncio.Lock()
+        # The locks of the documents (and prefixes of them) which are being changed.
+        self.document_locks = weakref.WeakValueDictionary()
+        self.lock_stats = {"document": _LockStats(), "data": _LockStats()}
+        self.save_stats = {
+            "serialize": _DurationStats(),
+            "compress": _DurationStats(),
+            "write": _DurationStats(),
+            "fsync": _DurationStats(),
+            "bytes": _SizeStats(),
+        }
+        # The (inode, size, mtime) of the settings file which the data was last read from
+        # or written to, when it's watched. Changes made by other processes don't match it.
+        self.file_key: Optional[Tuple[int, int, int]] = None
+        self.reload_listeners: List[Callable[[], Any]] = []
+        self.pipeline = _SavePipeline(self)
+        self.flusher = None if options.commit_window is None else _CommitFlusher(self)
+        self.storage = options.storage(self)
+
+    @property
+    def evictable(self) -> bool:
+        # Watched files and binary snapshots are matched against the file the data was
+        # loaded from, which reloading the data from the file would lose track of.
+        return self.storage.evictable and not (self.options.watch or self.options.binary_snapshot)
+
+    def data_lock(self):
+        return _acquire(self.lock, self.lock_stats["data"])
+
+    def load(self) -> None:
+        if self.options.watch:
+            # Taken before the file is read, so that a change made while
+            # it's being read gets reloaded instead of missed.
+            self.file_key = _file_key(self.path)
+            _watcher.watch(self.name, self.path)
+        self.storage.load()
+
+    def loaded(self, size: int) -> None:
+        """Record that the data was loaded from a settings file of the given size."""
+        if self.evictable:
+            _evictor.track(self.name, size)
+
+    def record_file_key(self, stat: os.stat_result) -> None:
+        # Only recorded for watched cogs, so that their own writes aren't taken for changes.
+        if self.options.watch:
+            self.file_key = _stat_key(stat)
+
+    async def reload(self) -> None:
+        """Replace the data with the contents of the settings file,
+        if it was changed by another process.
+        """
+        # Our own writes record the key of the file they write before releasing this.
+        async with self.pipeline.write_lock:
+            if _file_key(self.path) == self.file_key:
+                return
+            loop = asyncio.get_running_loop()
+            try:
+                key, data = await loop.run_in_executor(
+                    None, _read_settings, self.path, self.options.intern_strings
+                )
+            except FileNotFoundError:
+                return
+            except ValueError:
+                log.warning("Not reloading %s, its settings file is malformed.", self.name)
+                return
+            if _cogs.get(self.name) is not self:
+                # The cog's data was unloaded in the meantime.
+                return
+            async with self.data_lock():
+                if self.pipeline.has_pending_changes or (
+                    self.flusher is not None and self.flusher.has_pending_changes
+                ):
+                    log.warning(
+                        "The settings file of %s was changed by another process while this one"
+                        " had unsaved changes, which will overwrite it.",
+                        self.name,
+                    )
+                    return
+                self.data = data
+                self.storage.reset()
+                self.file_key = key
+        log.debug("Reloaded the data of %s, changed by another process.", self.name)
+        for callback in self.reload_listeners:
+            try:
+                callback()
+            except Exception:
+                log.exception("Reload listener of %s failed", self.name)
+
+    def close(self) -> None:
+        """Write out what's pending, once the last driver of the cog is gone."""
+        self.storage.unload_sync()
+        self.pipeline.close()
+        if self.flusher is not None:
+            self.flusher.close()
+        self.storage.close()
+        if self.options.watch:
+            _watcher.unwatch(self.name)
+        _evictor.forget(self.name)
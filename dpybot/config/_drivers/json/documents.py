@@ -0,0 +1,192 @@
+"""Changing, walking and encoding the nested dicts holding a cog's data."""
+
+import pickle
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .. import codec
+
+
+class _FragmentCache:
+    """Cache of the serialized documents of a cog's settings file.
+
+    The settings file is assembled from the encoded documents (the values
+    found at the ``uuid -> category -> first primary key`` level) and only
+    the documents which changed since the last save get encoded again.
+    """
+
+    # The most documents, and the most bytes of their previous encoding,
+    # which can be missing from the cache for a save to be encoded on the loop.
+    max_missing_documents = 64
+    max_missing_bytes = 256 * 1024
+
+    def __init__(self):
+        self.fragments: Dict[str, Dict[str, Dict[str, bytes]]] = {}
+        # Whether every document was cached by the last encoding,
+        # and what was invalidated since then.
+        self.complete = False
+        self.missing_documents = 0
+        self.missing_bytes = 0
+
+    @property
+    def is_cheap(self) -> bool:
+        """Whether few enough documents are missing for the encoding to be done on the loop."""
+        return (
+            self.complete
+            and self.missing_documents <= self.max_missing_documents
+            and self.missing_bytes <= self.max_missing_bytes
+        )
+
+    def invalidate(self, identifiers: Tuple[str, ...]) -> None:
+        if len(identifiers) < 3:
+            # The new value may hold any number of documents.
+            self.complete = False
+        if not identifiers:
+            self.fragments.clear()
+            return
+        self.missing_documents += 1
+        partial = self.fragments
+        for i in identifiers[:2]:
+            if i not in partial:
+                return
+            partial = partial[i]
+        if len(identifiers) >= 3:
+            self.missing_bytes += len(partial.pop(identifiers[2], b""))
+        elif len(identifiers) == 2:
+            self.fragments[identifiers[0]].pop(identifiers[1], None)
+        else:
+            self.fragments.pop(identifiers[0], None)
+
+    def encode(
+        self, data: Dict[str, Any], spans: Optional[List[Tuple[Tuple[str, ...], int, int]]] = None
+    ) -> List[bytes]:
+        """Encode the given data, returning the chunks of the encoded file.
+
+        When ``spans`` is given, it's filled with the path and the position
+        (start and end offsets) in the file of every document and of every value
+        above the document level which isn't a non-empty dict.
+        """
+        chunks = []
+        positions = None if spans is None else []
+        self._encode(chunks, data, self.fragments, (), positions)
+        self.complete = True
+        self.missing_documents = self.missing_bytes = 0
+        if spans is not None:
+            offsets = [0, *accumulate(map(len, chunks))]
+            spans.extend((path, offsets[i], offsets[i + 1]) for path, i in positions)
+        return chunks
+
+    def _encode(
+        self,
+        chunks: List[bytes],
+        node: Any,
+        cache: Dict[str, Any],
+        path: Tuple[str, ...],
+        positions: Optional[List[Tuple[Tuple[str, ...], int]]],
+    ) -> None:
+        if not isinstance(node, dict) or (path and not node):
+            if positions is not None and path:
+                positions.append((path, len(chunks)))
+            chunks.append(codec.dumps(node))
+            return
+        separator = b"{"
+        for key, value in node.items():
+            chunks.append(separator + codec.dumps(key) + b":")
+            separator = b","
+            if len(path) < 2:
+                self._encode(chunks, value, cache.setdefault(key, {}), path + (key,), positions)
+                continue
+            fragment = cache.get(key)
+            if fragment is None:
+                if isinstance(value, _Undecoded):
+                    fragment = cache[key] = value.raw
+                else:
+                    fragment = cache[key] = codec.dumps(value)
+            if positions is not None:
+                positions.append((path + (key,), len(chunks)))
+            chunks.append(fragment)
+        chunks.append(b"}" if separator == b"," else b"{}")
+
+
+class _Undecoded:
+    """Placeholder for a document of a lazily loaded settings file which isn't decoded yet."""
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: memoryview):
+        self.raw = raw
+
+    def decode(self) -> Any:
+        return codec.loads(bytes(self.raw))
+
+
+def _apply_set(data: Dict[str, Any], identifiers: Tuple[str, ...], value: Any) -> None:
+    partial = data
+    for i in identifiers[:-1]:
+        try:
+            partial = partial.setdefault(i, {})
+        except AttributeError:
+            # Tried to set sub-field of non-object
+            raise TypeError("Cannot set sub-field of non-object")
+    partial[identifiers[-1]] = value
+
+
+def _check_settable(data: Dict[str, Any], identifiers: Tuple[str, ...]) -> None:
+    partial = data
+    for i in identifiers[:-1]:
+        partial = partial.get(i)
+        if partial is None:
+            return
+        if not isinstance(partial, dict):
+            raise TypeError("Cannot set sub-field of non-object")
+
+
+def _apply_clear(data: Dict[str, Any], identifiers: Tuple[str, ...]) -> bool:
+    partial = data
+    try:
+        for i in identifiers[:-1]:
+            partial = partial[i]
+        del partial[identifiers[-1]]
+    except KeyError:
+        return False
+    return True
+
+
+def _iter_documents(
+    node: Any, levels: int, pkey: Tuple[str, ...] = ()
+) -> Iterable[Tuple[Tuple[str, ...], Any]]:
+    """Iterate over the documents under the given node, without decoding them."""
+    if levels == 0:
+        yield pkey, node
+        return
+    node = _peek(node)
+    # The data can change while the documents are being consumed.
+    for key, value in list(node.items()):
+        yield from _iter_documents(value, levels - 1, pkey + (key,))
+
+
+def _peek(node: Any) -> Any:
+    """Get the given node, decoding it without replacing it if it wasn't decoded yet."""
+    return node.decode() if isinstance(node, _Undecoded) else node
+
+
+def _copy_decoded(node: Any, depth: int) -> Any:
+    """Deep copy the given node, decoding (without replacing) the documents under it."""
+    if isinstance(node, _Undecoded):
+        return node.decode()
+    if depth < 3 and isinstance(node, dict):
+        return {key: _copy_decoded(value, depth + 1) for key, value in node.items()}
+    return pickle.loads(pickle.dumps(node, -1))
+
+
+def _decode_all(node: Any, depth: int) -> int:
+    if not isinstance(node, dict):
+        return 0
+    decoded = 0
+    for key, value in node.items():
+        if isinstance(value, _Undecoded):
+            node[key] = value.decode()
+            decoded += 1
+        elif depth < 2:
+            decoded += _decode_all(value, depth + 1)
+    return decoded
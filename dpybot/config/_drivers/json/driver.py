@@ -0,0 +1,537 @@
+"""The driver storing the data of each cog in a JSON settings file."""
+
+import asyncio
+import contextlib
+import os
+import pickle
+import sys
+import weakref
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
+
+#
+#
+#
+# NEED TO IMPLEMENT THE BELOW TO WORK WITH NON REDBOTS
+#
+#
+#
+
+from .. import codec
+from ..base import BaseDriver, ConfigCategory, Document, Durability, IdentifierData, _batched
+from ..compression import Compression
+from ..views import freeze
+from .cog import _Cog, _CogOptions
+from .documents import (
+    _apply_clear,
+    _apply_set,
+    _check_settable,
+    _copy_decoded,
+    _iter_documents,
+    _peek,
+)
+from .evictor import _evictor
+from .files import _intern_strings, _syncer
+from .manifest import _list_cogs
+from .registry import _cogs, finalize_driver, _finalizers
+from .stats import _acquire
+from .storage import (
+    _FileStorage,
+    _ForkedStorage,
+    _JournalStorage,
+    _LazyStorage,
+    _ShardedStorage,
+    _select_storage,
+)
+from .watcher import _watcher
+from .writer import _writer
+
+__all__ = ["JsonDriver"]
+
+
+# noinspection PyProtectedMember
+class JsonDriver(BaseDriver):
+    """
+    Subclass of :py:class:`.BaseDriver`.
+
+    .. py:attribute:: file_name
+
+        The name of the file in which to store JSON data.
+
+    .. py:attribute:: data_path
+
+        The path in which to store the file indicated by :py:attr:`file_name`.
+
+    .. py:attribute:: commit_window
+
+        When set, changes are written in groups at most this many seconds
+        apart instead of rewriting the file on every change.
+
+    .. py:attribute:: commit_max_pending
+
+        The number of pending changes that triggers a group commit before
+        :py:attr:`commit_window` elapses.
+
+    .. py:attribute:: commit_wait
+
+        Whether `set` and `clear` should wait until their group
+        commit is written to disk.
+
+    .. py:attribute:: journal
+
+        Whether changes should be appended to a journal file next to
+        :py:attr:`data_path` instead of rewriting the whole file.
+
+    .. py:attribute:: journal_compact_size
+
+        The size (in bytes) of the journal file after which it gets compacted
+        into a new snapshot of :py:attr:`data_path`.
+
+    .. py:attribute:: sharded
+
+        Whether the data should be split into many files, one per uuid,
+        category and bucket of primary keys, instead of a single file.
+        Shards are only read once they're needed.
+
+    .. py:attribute:: shard_count
+
+        The number of buckets the documents of each category are split into
+        when :py:attr:`sharded` is enabled.
+
+    .. py:attribute:: incremental_saves
+
+        Whether the serialized documents should be cached between saves,
+        so that only the documents which changed need to be encoded again.
+        Trades memory (roughly the size of the file) for save CPU time.
+
+    .. py:attribute:: lazy_load
+
+        Whether the documents (i.e. the data of a single guild, member, etc.)
+        should only be decoded once they're first accessed. An index of the
+        documents' positions in the file is written next to :py:attr:`data_path`
+        on every save and the file is memory-mapped when the data is loaded,
+        so loading only costs as much as the data which actually gets used.
+        Requires :py:attr:`incremental_saves`.
+
+    .. py:attribute:: durability
+
+        The `Durability` policy of the writes, see `Durability` for the available
+        ones. With anything other than ``always``, changes made shortly before
+        the OS crashes or the machine loses power may be lost.
+
+    .. py:attribute:: fork_saves
+
+        Whether the settings file should be written by a forked child process
+        (only available on Linux), so that encoding a large amount
+        of data doesn't hold up the event loop. The whole file is encoded on
+        every save, the serialized documents aren't cached between saves.
+
+    .. py:attribute:: compression
+
+        The `Compression` of the settings file, e.g. ``zstd`` or ``gzip=9``.
+        Compressed files are recognized when they're read, so this can be
+        changed at any time. Compression happens in the threads which write
+        the file, it doesn't hold up the event loop.
+
+    .. py:attribute:: intern_strings
+
+        Whether the keys and the IDs stored as strings should be interned, so
+        that every occurrence of the same one shares the memory of a single
+        string. Reduces the memory taken by the loaded data (by about a third
+        for member data) at the cost of loading it several times slower.
+
+    .. py:attribute:: binary_snapshot
+
+        Whether a copy of the data in Python's `marshal` format should be kept
+        next to :py:attr:`data_path`, which is faster to load than the JSON file.
+        The snapshot is written when the driver is torn down (or the cog's data
+        is unloaded) and is only used if the settings file didn't change since.
+
+    .. py:attribute:: watch
+
+        Whether the settings file should be watched for changes made by other
+        processes sharing the data directory, replacing the cog's data in memory
+        with the file's contents when it changes. Changes made by both processes
+        at around the same time aren't merged, the last one written wins.
+        See `add_reload_listener` to be told about reloads.
+    """
+
+    def __init__(
+        self,
+        cog_name: str,
+        identifier: str,
+        *,
+        data_path_override: Optional[Path] = None,
+        file_name_override: str = "settings.json",
+        commit_window: Optional[float] = None,
+        commit_max_pending: int = 100,
+        commit_wait: bool = False,
+        journal: bool = False,
+        journal_compact_size: int = 8 * 1024 * 1024,
+        sharded: bool = False,
+        shard_count: int = 16,
+        incremental_saves: bool = True,
+        lazy_load: bool = False,
+        binary_snapshot: bool = False,
+        fork_saves: bool = False,
+        watch: bool = False,
+        compression: Optional[str] = None,
+        intern_strings: bool = False,
+        durability: Optional[str] = None,
+    ):
+        super().__init__(cog_name, identifier, durability=durability)
+        self.commit_wait = commit_wait
+        self.file_name = file_name_override
+        if data_path_override is not None:
+            self.data_path = data_path_override
+        elif cog_name == "Core" and identifier == "0":
+            self.data_path = Path(os.getcwd())
+        else:
+            self.data_path = Path(os.getcwd()) / f"data/{cog_name}/"
+        self.data_path.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.data_path / self.file_name
+        storage = _select_storage(
+            journal=journal, sharded=sharded, lazy_load=lazy_load, fork_saves=fork_saves
+        )
+        options = _CogOptions(
+            self.data_path,
+            storage,
+            Compression.parse(compression),
+            self.durability,
+            commit_window=commit_window,
+            commit_max_pending=commit_max_pending,
+            journal_compact_size=journal_compact_size,
+            shard_count=shard_count,
+            incremental_saves=incremental_saves,
+            binary_snapshot=binary_snapshot,
+            watch=watch,
+            intern_strings=intern_strings,
+        )
+        storage.check_options(options)
+        self._load_data(options)
+
+    @property
+    def _lock(self):
+        return self._cog.lock
+
+    def _data_lock(self):
+        return self._cog.data_lock()
+
+    def _document_lock(self, identifiers: Tuple[str, ...]):
+        # Writers of the same document are serialized across the awaits which
+        # happen before their change is applied, e.g. while loading shards.
+        key = tuple(identifiers[:3])
+        locks = self._cog.document_locks
+        lock = locks.get(key)
+        if lock is None:
+            lock = locks[key] = asyncio.Lock()
+        return _acquire(lock, self._cog.lock_stats["document"])
+
+    def lock_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the statistics of the time writers of this cog spent waiting for locks.
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            The statistics of the ``"document"`` locks, held by a writer while it
+            changes a single document, and of the ``"data"`` lock, held while
+            the cog's data gets encoded outside of the event loop.
+            Waits are measured in seconds.
+        """
+        return {kind: stats.to_dict() for kind, stats in self._cog.lock_stats.items()}
+
+    def save_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the statistics of the time spent saving this cog's data.
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            The durations (in seconds) of encoding the changes (``"serialize"``),
+            of writing them to disk (``"write"``) and of the parts of the latter spent
+            compressing them (``"compress"``) and waiting for the disk to sync them
+            (``"fsync"``), and the sizes of the written settings files (``"bytes"``).
+        """
+        return {kind: stats.to_dict() for kind, stats in self._cog.save_stats.items()}
+
+    @staticmethod
+    def executor_stats() -> Dict[str, Any]:
+        """Get the statistics of the threads shared by all cogs' writes.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The number of writes waiting for a thread (``"queued"``) and for room
+            in the queue (``"waiting"``), and the durations (in seconds) writes
+            spent from being requested to starting (``"queue_wait"``).
+        """
+        return _writer.to_dict()
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        """Get the statistics of the eviction of idle cogs' data from memory.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The number of accesses of data which was loaded (``"hits"``) and
+            which had to be loaded again (``"misses"``), the number of times
+            data was unloaded (``"evictions"``), the number of cogs whose data
+            is loaded (``"resident"``) or not (``"evicted"``) and the estimated
+            size of the loaded data (``"resident_bytes"``).
+        """
+        return _evictor.to_dict()
+
+    def add_reload_listener(self, callback: Callable[[], Any]) -> None:
+        """Register a function called after this cog's data is reloaded
+        because another process changed its settings file.
+
+        Only called when :py:attr:`watch` is enabled. Values read through the
+        driver are always up-to-date, this is meant for anything derived from them.
+        """
+        self._cog.reload_listeners.append(callback)
+
+    @property
+    def data(self):
+        return self._cog.data
+
+    @data.setter
+    def data(self, value):
+        self._cog.data = value
+
+    @classmethod
+    async def initialize(cls, **storage_details) -> None:
+        _writer.configure()
+        _evictor.configure()
+        _watcher.start()
+        _evictor.start()
+
+    @classmethod
+    async def teardown(cls) -> None:
+        _watcher.close()
+        _evictor.stop()
+        cogs = list(_cogs.values())
+        await asyncio.gather(*(cog.flusher.flush() for cog in cogs if cog.flusher is not None))
+        await asyncio.gather(*(cog.storage.teardown() for cog in cogs))
+        await _writer.run(_syncer.sync_all)
+        _writer.shutdown()
+
+    @staticmethod
+    def get_config_details() -> Dict[str, Any]:
+        # No driver-specific configuration needed
+        return {}
+
+    def _load_data(self, options: _CogOptions) -> None:
+        cog = _cogs.get(self.cog_name)
+        if cog is None:
+            cog = _Cog(self.cog_name, options)
+            cog.load()
+            _cogs[self.cog_name] = cog
+        elif options != cog.options:
+            # Drivers created with the default options use the ones the cog was loaded with.
+            defaults = _CogOptions(
+                cog.path, _FileStorage, Compression.parse(None), Durability.parse(None)
+            )
+            if options != defaults:
+                raise ValueError(
+                    f"The data of {self.cog_name} is already loaded with other options,"
+                    " which can't change until all of its drivers are gone."
+                )
+        cog.drivers += 1
+        self._cog = cog
+
+        _finalizers.append(weakref.finalize(self, finalize_driver, self.cog_name))
+
+        options = cog.options
+        self.data_path = options.path
+        self.commit_window = options.commit_window
+        self.commit_max_pending = options.commit_max_pending
+        self.journal = issubclass(options.storage, _JournalStorage)
+        self.journal_compact_size = options.journal_compact_size
+        self.sharded = options.storage is _ShardedStorage
+        self.shard_count = options.shard_count
+        self.incremental_saves = options.incremental_saves
+        self.lazy_load = issubclass(options.storage, _LazyStorage)
+        self.binary_snapshot = options.binary_snapshot
+        self.fork_saves = options.storage is _ForkedStorage
+        self.watch = options.watch
+        self.compression = options.compression
+        self.intern_strings = options.intern_strings
+        self.durability = options.durability
+
+    def migrate_identifier(self, raw_identifier: int):
+        storage = self._cog.storage
+        if self.data is None:
+            # Evicted, see `_Evictor`.
+            storage.load()
+        if storage.contains(self.unique_cog_identifier):
+            # Data has already been migrated
+            return
+        poss_identifiers = [str(raw_identifier), str(hash(raw_identifier))]
+        for ident in poss_identifiers:
+            if storage.contains(ident):
+                storage.fetch_sync((ident,))
+            if ident not in self.data:
+                continue
+            self.data[self.unique_cog_identifier] = self.data.pop(ident)
+            storage.record("clear", (ident,))
+            storage.record(
+                "set", (self.unique_cog_identifier,), self.data[self.unique_cog_identifier]
+            )
+            storage.prepare_rewrite()()
+            break
+
+    async def get(self, identifier_data: IdentifierData):
+        full_identifiers = identifier_data.to_tuple()[1:]
+        await self._ensure_loaded(full_identifiers)
+        partial = self.data
+        for i in full_identifiers:
+            partial = partial[i]
+        return pickle.loads(pickle.dumps(partial, -1))
+
+    async def get_view(self, identifier_data: IdentifierData):
+        full_identifiers = identifier_data.to_tuple()[1:]
+        await self._ensure_loaded(full_identifiers)
+        partial = self.data
+        for i in full_identifiers:
+            partial = partial[i]
+        return freeze(partial)
+
+    async def set(self, identifier_data: IdentifierData, value=None):
+        full_identifiers = identifier_data.to_tuple()[1:]
+        # This is both our deepcopy() and our way of making sure this value is actually JSON
+        # serializable.
+        full_identifiers, value_copy = self._interned(full_identifiers, codec.copy(value))
+
+        async with self._document_lock(full_identifiers):
+            await self._ensure_loaded(full_identifiers)
+            async with self._data_lock():
+                _apply_set(self.data, full_identifiers, value_copy)
+                self._cog.storage.record("set", full_identifiers, value_copy)
+        await self._wait_for_commit(await self._save())
+
+    async def set_many(self, items: Iterable[Tuple[IdentifierData, Any]]) -> None:
+        await self.apply(("set", identifier_data, value) for identifier_data, value in items)
+
+    async def apply(self, changes: Iterable[Tuple[str, IdentifierData, Any]]) -> None:
+        changes = [
+            (op, identifier_data.to_tuple()[1:], codec.copy(value) if op == "set" else None)
+            for op, identifier_data, value in changes
+        ]
+        changes = [(op, *self._interned(identifiers, value)) for op, identifiers, value in changes]
+        if not changes:
+            return
+        async with contextlib.AsyncExitStack() as stack:
+            # Sorted, so that concurrent calls can't deadlock on each other's locks.
+            for key in sorted({identifiers[:3] for _, identifiers, _ in changes}):
+                await stack.enter_async_context(self._document_lock(key))
+            for _, identifiers, _ in changes:
+                await self._ensure_loaded(identifiers)
+            async with self._data_lock():
+                # Changes which can't be applied fail before anything is changed.
+                for op, identifiers, _ in changes:
+                    if op == "set":
+                        _check_settable(self.data, identifiers)
+                for op, identifiers, value in changes:
+                    if op == "set":
+                        _apply_set(self.data, identifiers, value)
+                        self._cog.storage.record("set", identifiers, value)
+                    elif _apply_clear(self.data, identifiers):
+                        self._cog.storage.record("clear", identifiers)
+        await self._wait_for_commit(await self._save())
+
+    async def clear(self, identifier_data: IdentifierData):
+        full_identifiers = identifier_data.to_tuple()[1:]
+        async with self._document_lock(full_identifiers):
+            await self._ensure_loaded(full_identifiers)
+            async with self._data_lock():
+                if not _apply_clear(self.data, full_identifiers):
+                    return
+                self._cog.storage.record("clear", full_identifiers)
+        await self._wait_for_commit(await self._save())
+
+    @classmethod
+    async def aiter_cogs(cls) -> AsyncIterator[Tuple[str, str]]:
+        yield "Core", "0"
+        loop = asyncio.get_running_loop()
+        for cog_name, cog_id in await loop.run_in_executor(None, _list_cogs):
+            yield cog_name, cog_id
+
+    async def export_data(self, custom_group_data: Dict[str, int]) -> AsyncIterator[Document]:
+        categories = [c.value for c in ConfigCategory]
+        categories.extend(custom_group_data.keys())
+        uuid = self.unique_cog_identifier
+
+        for category in categories:
+            await self._ensure_resident()
+            await self._cog.storage.fetch((uuid, category))
+            # Lazily loaded documents are decoded one at a time, without being kept around.
+            data = _peek(_peek(self.data.get(uuid, {})).get(category))
+            if data is None:
+                continue
+            pkey_len = ConfigCategory.get_pkey_info(category, custom_group_data)[0]
+            # Only a single document is copied at a time, instead of the whole category.
+            for pkey, document in _iter_documents(data, pkey_len):
+                yield category, pkey, _copy_decoded(document, 2 + len(pkey))
+
+    async def import_data(
+        self,
+        documents: AsyncIterable[Document],
+        custom_group_data: Dict[str, int],
+        *,
+        batch_size: int = 1000,
+    ) -> None:
+        def update_write_data(identifier_data: IdentifierData, _data):
+            partial = self.data
+            idents, _data = self._interned(identifier_data.to_tuple()[1:], _data)
+            self._cog.storage.fetch_sync(idents)
+            self._cog.storage.resolve(idents)
+            for ident in idents[:-1]:
+                partial = partial.setdefault(ident, {})
+            partial[idents[-1]] = _data
+            self._cog.storage.record("set", idents, _data)
+
+        async for batch in _batched(documents, batch_size):
+            async with self._data_lock():
+                # Nothing keeps the cog from being evicted between batches.
+                await _evictor.restore(self._cog)
+                for category, pkey, data in batch:
+                    update_write_data(
+                        self._document_identifier(category, pkey, custom_group_data), data
+                    )
+        # All of the data is kept in memory anyway, saving every batch would only
+        # mean rewriting the file over and over.
+        await self._wait_for_commit(await self._save())
+
+    async def flush(self) -> None:
+        """Write any changes that are waiting for their group commit."""
+        if self._cog.flusher is not None:
+            await self._cog.flusher.flush()
+
+    async def _ensure_resident(self) -> None:
+        if not _evictor.touch(self.cog_name):
+            async with self._data_lock():
+                await _evictor.restore(self._cog)
+
+    async def _ensure_loaded(self, identifiers: Tuple[str, ...]) -> None:
+        _watcher.ensure_started()
+        await self._ensure_resident()
+        await self._cog.storage.fetch(identifiers)
+        self._cog.storage.resolve(identifiers)
+
+    def _interned(self, identifiers: Tuple[str, ...], value: Any) -> Tuple[Tuple[str, ...], Any]:
+        if not self._cog.options.intern_strings:
+            return identifiers, value
+        return tuple(map(sys.intern, identifiers)), _intern_strings(value)
+
+    async def _save(self) -> Optional[asyncio.Future]:
+        # When group commit is enabled, this returns the batch
+        # the changes were added to instead of writing.
+        if self._cog.flusher is not None:
+            return self._cog.flusher.schedule()
+        await self._cog.pipeline.save()
+        return None
+
+    async def _wait_for_commit(self, batch: Optional[asyncio.Future]) -> None:
+        if batch is not None and self.commit_wait:
+            # The batch is shared with other writers, don't let cancellation propagate into it.
+            await asyncio.shield(batch)
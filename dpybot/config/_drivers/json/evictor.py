@@ -0,0 +1,251 @@
+"""Unloading the data of idle cogs, to keep the memory it takes within a budget."""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .files import _read_settings
+from .registry import _cogs
+
+if TYPE_CHECKING:
+    from .cog import _Cog
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _Evictor:
+    """Unloads the data of cogs which weren't used for a while, until it's needed again.
+
+    Cogs are evicted once they weren't accessed for ``idle_timeout`` seconds,
+    and the least recently used ones while the data of all cogs takes more
+    than ``memory_budget`` bytes. The size of a cog's data is estimated from
+    the size of its JSON, decoded data takes a few times more memory.
+    A cog is only evicted once all of its changes are on disk.
+
+    The policy is read from the ``DPYBOT_CONFIG_MEMORY_BUDGET`` (in bytes,
+    optionally followed by a unit such as ``KB``, ``MiB`` or ``G``) and
+    ``DPYBOT_CONFIG_IDLE_TIMEOUT`` (in seconds) environment variables when
+    the driver is initialized, no cog is evicted by default.
+    Cogs using the journal, the sharded layout, lazy loading, binary snapshots
+    or watching their settings file are never evicted.
+    """
+
+    check_interval = 5.0
+
+    def __init__(self):
+        self.memory_budget: Optional[int] = None
+        self.idle_timeout: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The estimated sizes and the last access times of the cogs which can be evicted.
+        self.sizes: Dict[str, int] = {}
+        self.last_access: Dict[str, float] = {}
+        self.evicted = set()
+        self._task: Optional[asyncio.Task] = None
+        self._enforcing: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_budget is not None or self.idle_timeout is not None
+
+    def track(self, cog_name: str, size: int) -> None:
+        """Start tracking a cog whose data was just loaded."""
+        self.sizes[cog_name] = size
+        self.last_access[cog_name] = time.monotonic()
+        self.evicted.discard(cog_name)
+        self._check_budget()
+
+    def resize(self, cog_name: str, size: int) -> None:
+        if cog_name in self.sizes:
+            self.sizes[cog_name] = size
+
+    def forget(self, cog_name: str) -> None:
+        self.sizes.pop(cog_name, None)
+        self.last_access.pop(cog_name, None)
+        self.evicted.discard(cog_name)
+
+    def touch(self, cog_name: str) -> bool:
+        """Record an access of the cog's data, returning whether it's loaded."""
+        if cog_name in self.evicted:
+            return False
+        if cog_name in self.last_access:
+            self.last_access[cog_name] = time.monotonic()
+            self.hits += 1
+        return True
+
+    async def restore(self, cog: "_Cog") -> None:
+        """Load the cog's data again if it was evicted.
+
+        Must be called with the data lock of the cog held.
+        """
+        cog_name = cog.name
+        if cog_name not in self.evicted:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            _, cog.data = await loop.run_in_executor(
+                None, _read_settings, cog.path, cog.options.intern_strings
+            )
+        except FileNotFoundError:
+            cog.data = {}
+        self.evicted.discard(cog_name)
+        self.last_access[cog_name] = time.monotonic()
+        self.misses += 1
+        self._check_budget()
+
+    async def evict(self, cog_name: str) -> bool:
+        """Write the cog's pending changes and unload its data.
+
+        Returns ``False`` if the cog can't be evicted right now.
+        """
+        cog = _cogs.get(cog_name)
+        if cog is None or cog_name in self.evicted or not cog.evictable:
+            return False
+        flusher = cog.flusher
+        if flusher is not None:
+            await flusher.flush()
+        async with cog.pipeline.write_lock:
+            async with cog.data_lock():
+                writing = any(lock.locked() for lock in list(cog.document_locks.values()))
+                if (
+                    cog_name not in self.sizes
+                    or cog_name in self.evicted
+                    or writing
+                    or cog.pipeline.has_pending_changes
+                    or (flusher is not None and flusher.has_pending_changes)
+                ):
+                    return False
+                cog.data = None
+                cog.storage.reset()
+                self.evicted.add(cog_name)
+                self.evictions += 1
+        log.debug("Evicted the data of %s.", cog_name)
+        return True
+
+    async def enforce(self) -> None:
+        """Evict the cogs which are idle or which don't fit in the memory budget."""
+        now = time.monotonic()
+        resident = sorted(
+            (accessed, cog_name)
+            for cog_name, accessed in self.last_access.items()
+            if cog_name not in self.evicted
+        )
+        total = sum(self.sizes[cog_name] for _, cog_name in resident)
+        # From the least recently used.
+        for accessed, cog_name in resident:
+            idle = self.idle_timeout is not None and now - accessed >= self.idle_timeout
+            over_budget = self.memory_budget is not None and total > self.memory_budget
+            if not (idle or over_budget):
+                break
+            if await self.evict(cog_name):
+                total -= self.sizes[cog_name]
+
+    def _check_budget(self) -> None:
+        if self.memory_budget is None or (
+            self._enforcing is not None and not self._enforcing.done()
+        ):
+            return
+        resident = sum(size for cog, size in self.sizes.items() if cog not in self.evicted)
+        if resident <= self.memory_budget:
+            return
+        try:
+            self._enforcing = asyncio.get_running_loop().create_task(self.enforce())
+        except RuntimeError:
+            # Enforced once the driver gets initialized.
+            pass
+
+    def configure(self) -> None:
+        """Read the policy from the environment variables.
+
+        Raises
+        ------
+        ValueError
+            If one of the environment variables is invalid.
+        """
+        self.memory_budget = _parse_size(
+            "DPYBOT_CONFIG_MEMORY_BUDGET", os.getenv("DPYBOT_CONFIG_MEMORY_BUDGET")
+        )
+        self.idle_timeout = _parse_duration(
+            "DPYBOT_CONFIG_IDLE_TIMEOUT", os.getenv("DPYBOT_CONFIG_IDLE_TIMEOUT")
+        )
+
+    def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        for task in (self._task, self._enforcing):
+            if task is not None:
+                task.cancel()
+        self._task = self._enforcing = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.enforce()
+            except Exception:
+                log.exception("Failed to evict the data of idle cogs")
+            await asyncio.sleep(self.check_interval)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "memory_budget": self.memory_budget,
+            "idle_timeout": self.idle_timeout,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "resident": len(self.sizes) - len(self.evicted),
+            "evicted": len(self.evicted),
+            "resident_bytes": sum(
+                size for cog_name, size in self.sizes.items() if cog_name not in self.evicted
+            ),
+        }
+
+
+_SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "K": 1024,
+    "KIB": 1024,
+    "KB": 1000,
+    "M": 1024**2,
+    "MIB": 1024**2,
+    "MB": 1000**2,
+    "G": 1024**3,
+    "GIB": 1024**3,
+    "GB": 1000**3,
+}
+
+
+def _parse_size(name: str, value: Optional[str]) -> Optional[int]:
+    if not value or not value.strip():
+        return None
+    match = re.fullmatch(r"([0-9.]+)\s*([A-Z]*)", value.strip().upper())
+    try:
+        if match is None:
+            raise ValueError
+        size = float(match.group(1)) * _SIZE_UNITS[match.group(2)]
+    except (KeyError, ValueError):
+        raise ValueError(
+            f"Invalid {name}: {value!r}, expected a size such as 512MB, 1.5GiB or 1048576."
+        ) from None
+    return int(size) or None
+
+
+def _parse_duration(name: str, value: Optional[str]) -> Optional[float]:
+    if not value or not value.strip():
+        return None
+    try:
+        duration = float(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r}, expected a number of seconds.") from None
+    if duration < 0:
+        raise ValueError(f"Invalid {name}: {value!r}, expected a number of seconds.")
+    return duration or None
+
+
+_evictor = _Evictor()
@@ -0,0 +1,284 @@
+"""Reading, writing and syncing the settings files and the files next to them."""
+
+import asyncio
+import contextlib
+import functools
+import gc
+import hashlib
+import logging
+import marshal
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NoReturn, Optional, Tuple
+from uuid import uuid4
+
+from .. import codec
+from ..base import Durability
+from ..compression import Compression, decompress
+
+
+log = logging.getLogger("redbot.json_driver")
+
+
+# The time the current thread spent in fsync, see _timed_write.
+_fsync_time = threading.local()
+
+_ALWAYS = Durability("always")
+
+
+class _Syncer:
+    """Background thread syncing the files written with the ``interval`` durability to disk."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._due: Dict[Path, float] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, path: Path, delay: float) -> None:
+        """Sync the given file (and its directory) to disk within ``delay`` seconds."""
+        deadline = time.monotonic() + delay
+        with self._cond:
+            if self._due.get(path, deadline) < deadline:
+                return
+            self._due[path] = deadline
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="config-sync", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [path for path, deadline in self._due.items() if deadline <= now]
+                if not due:
+                    timeout = min(self._due.values()) - now if self._due else None
+                    self._cond.wait(timeout)
+                    continue
+                for path in due:
+                    del self._due[path]
+            for path in due:
+                _sync_path(path)
+
+    def sync_all(self) -> None:
+        """Sync all files which are waiting for it right away."""
+        with self._cond:
+            due, self._due = list(self._due), {}
+        for path in due:
+            _sync_path(path)
+
+
+_syncer = _Syncer()
+
+
+async def _wait_for_exit(pid: int) -> None:
+    """Wait until the child process with the given pid exits, without reaping it."""
+    try:
+        fd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        # Python 3.8 or Linux older than 5.3.
+        while os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+            await asyncio.sleep(0.01)
+        return
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+
+
+def _file_key(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        return _stat_key(path.stat())
+    except FileNotFoundError:
+        return None
+
+
+def _stat_key(stat: os.stat_result) -> Tuple[int, int, int]:
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _read_settings(path: Path, intern_strings: bool) -> Tuple[Tuple[int, int, int], Any]:
+    with path.open("rb") as fs:
+        key = _stat_key(os.fstat(fs.fileno()))
+        raw = decompress(fs.read())
+    return key, _decode_settings(raw, intern_strings)
+
+
+def _decode_settings(raw: bytes, intern_strings: bool) -> Any:
+    with _gc_paused():
+        if not intern_strings:
+            return codec.loads(raw)
+        data = _intern_strings(codec.loads(raw))
+        # Freeing the decoded duplicates left holes all over the memory holding
+        # the data, a copy made once it's freed packs it tightly (marshal keeps
+        # the interned strings shared).
+        dumped = marshal.dumps(data)
+        del data
+        return marshal.loads(dumped)
+
+
+def _intern_strings(node: Any) -> Any:
+    """Copy the given decoded JSON, interning its keys and the IDs stored as strings."""
+    if type(node) is dict:
+        return {sys.intern(key): _intern_strings(value) for key, value in node.items()}
+    if type(node) is list:
+        return [_intern_strings(value) for value in node]
+    # IDs (of roles, channels, etc.) are the values which repeat the most.
+    if type(node) is str and 15 <= len(node) <= 20 and node.isdigit():
+        return sys.intern(node)
+    return node
+
+
+def _save_in_child(
+    data: Dict[str, Any], path: Path, durability: Durability, compression: Compression
+) -> NoReturn:
+    status = 1
+    try:
+        # Collections would touch (and so copy) the pages of every object shared with the parent.
+        gc.disable()
+        with path.open("wb") as fs:
+            fs.writelines(compression.compress([codec.dumps(data)]))
+            fs.flush()
+            if durability.mode == "always":
+                _fsync(fs.fileno())
+        status = 0
+    finally:
+        os._exit(status)
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # Decoding a large file creates millions of containers, each allocation
+    # counting towards the next (pointless) garbage collection.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.blake2b()
+    with path.open("rb") as fs:
+        for block in iter(functools.partial(fs.read, 1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_json(path: Path, data: Any) -> None:
+    _save_chunks(path, [codec.dumps(data)])
+
+
+def _write_files(
+    files: List[Tuple[Path, Optional[bytes]]], durability: Durability = _ALWAYS
+) -> None:
+    """Write the given files, removing the ones (files or directories) without contents."""
+    for path, contents in files:
+        if contents is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _save_chunks(path, [contents], durability)
+        elif path.is_dir():
+            shutil.rmtree(path)
+        else:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _save_sidecar(path: Path, contents: bytes) -> None:
+    # Sidecar files can always be rebuilt from the settings file and are validated
+    # against it when they're read, so they don't need to be fsynced.
+    tmp_path = path.with_name("{}-{}.tmp".format(path.stem, uuid4().fields[0]))
+    tmp_path.write_bytes(contents)
+    tmp_path.replace(path)
+
+
+def _save_chunks(path: Path, chunks: List[bytes], durability: Durability = _ALWAYS) -> None:
+    """
+    This fsync stuff here is entirely necessary.
+
+    On windows, it is not available in entirety.
+    If a windows user ends up with tons of temp files, they should consider hosting on
+    something POSIX compatible, or using a different backend instead.
+
+    Most users wont encounter this issue, but with high write volumes,
+    without the fsync on both the temp file, and after the replace on the directory,
+    There's no real durability or atomicity guarantee from the filesystem.
+
+    In depth overview of underlying reasons why this is needed:
+        https://lwn.net/Articles/457667/
+
+    Also see:
+        http://man7.org/linux/man-pages/man2/open.2.html#NOTES (synchronous I/O section)
+    And:
+        https://www.mjmwired.net/kernel/Documentation/filesystems/ext4.txt#310
+    """
+    filename = path.stem
+    tmp_file = "{}-{}.tmp".format(filename, uuid4().fields[0])
+    tmp_path = path.parent / tmp_file
+    with tmp_path.open(mode="wb") as fs:
+        fs.writelines(chunks)
+        fs.flush()  # This does get closed on context exit, ...
+        if durability.mode == "always":
+            _fsync(fs.fileno())  # but that needs to happen prior to this line
+
+    tmp_path.replace(path)
+
+    if durability.mode == "always":
+        _sync_directory(path.parent)
+    elif durability.mode == "interval":
+        _syncer.schedule(path, durability.interval)
+
+
+def _sync_file(fs: Any, path: Path, durability: Durability) -> None:
+    """Sync a file which was written to in place, according to the given durability."""
+    if durability.mode == "always":
+        _fsync(fs.fileno())
+    elif durability.mode == "interval":
+        _syncer.schedule(path, durability.interval)
+
+
+def _fsync(fd: int) -> None:
+    start = time.perf_counter()
+    os.fsync(fd)
+    _fsync_time.total = getattr(_fsync_time, "total", 0.0) + time.perf_counter() - start
+
+
+def _sync_path(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        # Replaced or removed since.
+        return
+    try:
+        _fsync(fd)
+    except OSError:
+        # Windows can't fsync read-only file descriptors.
+        log.debug("Failed to sync %s to disk", path, exc_info=True)
+    finally:
+        os.close(fd)
+    _sync_directory(path.parent)
+
+
+def _sync_directory(path: Path) -> None:
+    try:
+        flag = os.O_DIRECTORY  # pylint: disable=no-member
+    except AttributeError:
+        pass
+    else:
+        fd = os.open(path, flag)
+        try:
+            _fsync(fd)
+        finally:
+            os.close(fd)
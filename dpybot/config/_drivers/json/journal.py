@@ -0,0 +1,149 @@
+"""The append-only journal of the changes made to a cog's data."""
+
+import asyncio
+import functools
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .. import codec
+from .documents import _apply_clear, _apply_set
+from .files import _sync_file
+
+if TYPE_CHECKING:
+    from .cog import _Cog
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _Journal:
+    """Append-only journal of changes made on top of a cog's settings file.
+
+    Each record is a single JSON line in the form ``[op, identifiers, value]``
+    where ``identifiers`` is the path of the change inside the cog's data.
+    Once the journal grows past ``compact_size`` bytes, it gets compacted
+    into a fresh snapshot of the settings file.
+
+    When appending fails, the journal is cut back to the records before it
+    and the next save compacts it, since the records which weren't appended
+    only exist in the cog's data anymore.
+    """
+
+    def __init__(self, cog: "_Cog"):
+        self.cog = cog
+        self.path = cog.path.with_suffix(".journal")
+        self.compact_size = cog.options.journal_compact_size
+        self.pending: List[bytes] = []
+        self.size = 0
+        # Whether an append failed since the last compaction.
+        self.needs_compaction = False
+        self._fs = None
+        self._compaction: Optional[asyncio.Task] = None
+
+    def replay(self, data: Dict[str, Any]) -> None:
+        """Apply all changes from the journal file on top of the given snapshot."""
+        try:
+            fs = self.path.open("r+b")
+        except FileNotFoundError:
+            return
+        with fs:
+            for line in fs:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Record is missing its terminator.")
+                    op, identifiers, value = codec.loads(line)
+                except ValueError:
+                    # A torn write at the end of the journal, everything before it is intact.
+                    log.warning("Discarding incomplete record at the end of %s", self.path)
+                    fs.truncate(self.size)
+                    break
+                self.cog.storage.resolve(identifiers)
+                if op == "set":
+                    _apply_set(data, identifiers, value)
+                else:
+                    _apply_clear(data, identifiers)
+                self.size += len(line)
+
+    def record(self, op: str, identifiers: Tuple[str, ...], value: Any = None) -> None:
+        self.pending.append(codec.dumps([op, identifiers, value]) + b"\n")
+
+    def prepare_append(self) -> Callable[[], None]:
+        """Take the pending records, returning a function which appends them to the journal."""
+        if self.needs_compaction:
+            return self.prepare_compaction()
+        records, self.pending = self.pending, []
+        return functools.partial(self._append, b"".join(records))
+
+    def _open(self) -> Any:
+        if self._fs is None:
+            # Unbuffered, a failed write mustn't leave bytes behind to be written later.
+            self._fs = self.path.open("ab", buffering=0)
+        return self._fs
+
+    def _append(self, records: bytes) -> None:
+        if not records:
+            return
+        fs = self._open()
+        try:
+            view = memoryview(records)
+            while view:
+                view = view[fs.write(view) :]
+            _sync_file(fs, self.path, self.cog.options.durability)
+        except BaseException:
+            # Later records mustn't land after a torn one, replaying stops at it.
+            self.needs_compaction = True
+            self._truncate()
+            raise
+        self.size += len(records)
+
+    def _truncate(self) -> None:
+        """Cut the journal back to the records which were appended in full."""
+        try:
+            self._fs.truncate(self.size)
+        except OSError:
+            log.warning("Failed to truncate the journal of %s", self.cog.name, exc_info=True)
+
+    def prepare_compaction(self) -> Callable[[], None]:
+        """Encode a snapshot, returning a function which writes it and truncates the journal."""
+        # The snapshot already contains every pending change.
+        self.pending.clear()
+        write_snapshot = self.cog.storage.prepare_file()
+
+        def compact() -> None:
+            write_snapshot()
+            fs = self._open()
+            # Records replayed twice after a crash before this point are harmless,
+            # they're idempotent.
+            fs.truncate(0)
+            _sync_file(fs, self.path, self.cog.options.durability)
+            self.size = 0
+            self.needs_compaction = False
+
+        return compact
+
+    def compact_sync(self) -> None:
+        """Write a fresh snapshot and truncate the journal."""
+        self.prepare_compaction()()
+
+    def schedule_compaction(self) -> None:
+        if self.size < self.compact_size:
+            return
+        if self._compaction is None or self._compaction.done():
+            self._compaction = asyncio.create_task(self._compact())
+
+    async def _compact(self) -> None:
+        pipeline = self.cog.pipeline
+        async with pipeline.write_lock:
+            if self.size < self.compact_size:
+                return
+            try:
+                await pipeline.run(self.prepare_compaction, rewrite=True)
+            except Exception:
+                log.exception("Failed to compact the journal of %s", self.cog.name)
+
+    def close(self) -> None:
+        if self._compaction is not None:
+            self._compaction.cancel()
+            self._compaction = None
+        if self._fs is not None:
+            self._fs.close()
+            self._fs = None
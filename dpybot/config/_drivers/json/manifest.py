@@ -0,0 +1,111 @@
+"""The index of the cogs with a settings file, used to list them."""
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from .. import codec
+from ..compression import decompress
+from .files import _save_sidecar
+
+
+class _Manifest:
+    """Index of the cogs with a settings file in the ``data`` directory.
+
+    The entry of each cog holds its ids along with the size and mtime
+    of its settings file at the time the ids were taken from it. Entries
+    which don't match their settings file anymore are ignored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @staticmethod
+    def data_root() -> Path:
+        return Path(os.getcwd()) / "data"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            try:
+                entries = codec.loads((self.data_root() / "manifest.json").read_bytes())
+            except (FileNotFoundError, ValueError):
+                entries = None
+            self._entries = entries if isinstance(entries, dict) else {}
+        return self._entries
+
+    def get(self, cog_dir: str, stat: os.stat_result) -> Optional[List[str]]:
+        """Get the ids of the cog in the given directory, if its entry is up-to-date."""
+        with self._lock:
+            entry = self._load().get(cog_dir)
+        if (
+            entry is None
+            or entry.get("size") != stat.st_size
+            or entry.get("mtime_ns") != stat.st_mtime_ns
+        ):
+            return None
+        return entry.get("ids")
+
+    def update(self, entries: Dict[str, Optional[Tuple[List[str], os.stat_result]]]) -> None:
+        """Update the entries of the given cog directories, removing the ones set to `None`."""
+        with self._lock:
+            manifest = self._load()
+            for cog_dir, entry in entries.items():
+                if entry is None:
+                    manifest.pop(cog_dir, None)
+                    continue
+                cog_ids, stat = entry
+                manifest[cog_dir] = {
+                    "ids": cog_ids,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+            _save_sidecar(self.data_root() / "manifest.json", codec.dumps(manifest))
+
+    def record(self, path: Path, cog_ids: List[str], stat: os.stat_result) -> None:
+        """Update the entry of the cog whose settings file was just written to the given path."""
+        if path.name != "settings.json" or path.parent.parent != self.data_root():
+            # Not a file listed by `JsonDriver.aiter_cogs`.
+            return
+        self.update({path.parent.name: (cog_ids, stat)})
+
+
+_manifest = _Manifest()
+
+
+def _list_cogs() -> List[Tuple[str, str]]:
+    ret = []
+    updates = {}
+    # iterate through all the cog directories in os.getcwd()/data, excluding the core folder
+    for _dir in _manifest.data_root().iterdir():
+        if _dir.name == "core" or not _dir.is_dir():
+            continue
+        shards_path = _dir / "settings.shards"
+        if shards_path.is_dir():
+            for child in shards_path.iterdir():
+                if child.is_dir():
+                    ret.append((_dir.stem, unquote(child.name)))
+            continue
+        fpath = _dir / "settings.json"
+        try:
+            stat = fpath.stat()
+        except FileNotFoundError:
+            continue
+        cog_ids = _manifest.get(_dir.name, stat)
+        if cog_ids is None:
+            # The settings file was written without us, read the ids from the file itself.
+            try:
+                data = codec.loads(decompress(fpath.read_bytes()))
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                updates[_dir.name] = None
+                continue
+            cog_ids = [cog_id for cog_id, inner in data.items() if isinstance(inner, dict)]
+            updates[_dir.name] = (cog_ids, stat)
+        ret.extend((_dir.stem, cog_id) for cog_id in cog_ids)
+    if updates:
+        _manifest.update(updates)
+    return ret
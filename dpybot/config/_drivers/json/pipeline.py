@@ -0,0 +1,166 @@
+"""Writing the changes of a cog to disk, one save at a time or in batches."""
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .stats import _timed, _timed_write
+from .writer import _writer
+
+if TYPE_CHECKING:
+    from .cog import _Cog
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _SavePipeline:
+    """Writes the changes of a single cog to disk.
+
+    Writes are serialized and coalesced: a save requested while another one
+    is in progress happens right after it, together with all other saves
+    requested in the meantime. Changes are encoded before any I/O happens,
+    so writers never wait for the disk, only (when the encoding can't be done
+    on the event loop) for the encoding.
+    """
+
+    def __init__(self, cog: "_Cog"):
+        self.cog = cog
+        self.write_lock = asyncio.Lock()
+        self._next: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def save(self) -> None:
+        """Write all changes made so far, returning once they're on disk."""
+        if self._next is None:
+            self._next = asyncio.get_running_loop().create_future()
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run())
+        # The save is shared with other writers, don't let cancellation propagate into it.
+        await asyncio.shield(self._next)
+
+    @property
+    def has_pending_changes(self) -> bool:
+        """Whether a save was requested and didn't start yet."""
+        return self._next is not None
+
+    async def _run(self) -> None:
+        while self._next is not None:
+            async with self.write_lock:
+                done, self._next = self._next, None
+                try:
+                    await self.cog.storage.save()
+                except asyncio.CancelledError:
+                    done.cancel()
+                    raise
+                except Exception as exc:
+                    done.set_exception(exc)
+                    # The save may have no waiters left.
+                    done.exception()
+                else:
+                    done.set_result(None)
+            self.cog.storage.after_save()
+
+    async def run(self, prepare: Callable[[], Callable[[], None]], rewrite: bool = False) -> None:
+        """Encode the changes with ``prepare`` and write them with the function it returns.
+
+        ``rewrite`` tells that ``prepare`` encodes all of the data rather than
+        only the changes. Must be called with `write_lock` held.
+        """
+        stats = self.cog.save_stats
+        if self.cog.storage.encodes_on_loop(rewrite):
+            serialize_time, write = _timed(prepare)
+        else:
+            async with self.cog.data_lock():
+                serialize_time, write = await _writer.run(_timed, prepare)
+        stats["serialize"].add(serialize_time)
+        write_time, fsync_time = await _writer.run(_timed_write, write)
+        stats["write"].add(write_time)
+        stats["fsync"].add(fsync_time)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class _CommitFlusher:
+    """Group commit for a single cog's settings file.
+
+    Instead of rewriting the file on every change, mutations are added to
+    the current batch and the whole batch is written once, either when
+    the commit window elapses or when enough changes are pending.
+    """
+
+    def __init__(self, cog: "_Cog"):
+        self.cog = cog
+        self.window = cog.options.commit_window
+        self.max_pending = cog.options.commit_max_pending
+        self._pending = 0
+        self._batch: Optional[asyncio.Future] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self) -> asyncio.Future:
+        """Add a change to the current batch.
+
+        Returns
+        -------
+        asyncio.Future
+            A future which resolves once the batch is written to disk.
+        """
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        if self._pending >= self.max_pending:
+            self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._batch
+
+    @property
+    def has_pending_changes(self) -> bool:
+        """Whether there is a batch waiting to be written."""
+        return self._batch is not None
+
+    async def _run(self) -> None:
+        while self._batch is not None:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write the current batch, if there is one."""
+        batch, self._batch = self._batch, None
+        self._pending = 0
+        self._wakeup.clear()
+        if batch is None:
+            return
+        try:
+            await self.cog.pipeline.save()
+        except asyncio.CancelledError:
+            batch.cancel()
+            raise
+        except Exception as exc:
+            log.exception("Failed to write batched changes for %s", self.cog.name)
+            batch.set_exception(exc)
+            # The batch may have no waiters at all.
+            batch.exception()
+        else:
+            batch.set_result(None)
+
+    def flush_sync(self) -> None:
+        """Write the current batch without going through the event loop."""
+        batch, self._batch = self._batch, None
+        self._pending = 0
+        if batch is None:
+            return
+        self.cog.storage.save_sync()
+        if not batch.done():
+            batch.set_result(None)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
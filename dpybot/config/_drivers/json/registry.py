@@ -0,0 +1,27 @@
+"""The cogs whose data is loaded by the `JsonDriver` instances of this process."""
+
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    from .cog import _Cog
+
+
+# The state of the cogs which have at least one driver, by their names.
+_cogs: Dict[str, "_Cog"] = {}
+_finalizers = []
+
+
+def finalize_driver(cog_name):
+    cog = _cogs.get(cog_name)
+    if cog is None:
+        return
+
+    cog.drivers -= 1
+
+    if cog.drivers == 0:
+        del _cogs[cog_name]
+        cog.close()
+
+    for f in _finalizers:
+        if not f.alive:
+            _finalizers.remove(f)
@@ -0,0 +1,180 @@
+"""The sharded layout, which splits a cog's data into many files."""
+
+import logging
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from .. import codec
+from .files import _save_json, _write_files
+
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _ShardedStore:
+    """Storage of a cog's data split into many small files.
+
+    The data of each uuid and category lives in its own directory, with the
+    documents further split into ``shard_count`` files by a hash of
+    their first primary key. Only the shards touched by a change get
+    rewritten, and shards are only read once they're first needed.
+    """
+
+    def __init__(self, cog_name: str, root: Path, shard_count: int):
+        self.cog_name = cog_name
+        self.root = root
+        layout_path = root / "layout.json"
+        try:
+            stored_count = codec.loads(layout_path.read_bytes())["shard_count"]
+        except FileNotFoundError:
+            root.mkdir(parents=True, exist_ok=True)
+            _save_json(layout_path, {"shard_count": shard_count})
+        else:
+            if stored_count != shard_count:
+                log.warning(
+                    "%s is sharded into %s files per category, ignoring the requested %s.",
+                    cog_name,
+                    stored_count,
+                    shard_count,
+                )
+            shard_count = stored_count
+        self.shard_count = shard_count
+        # Shards (uuid, category, bucket) and prefixes (uuid,) or (uuid, category)
+        # which are fully loaded into memory.
+        self.loaded = set()
+        self.dirty = set()
+        self.keys = defaultdict(set)
+
+    def bucket(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shard_count
+
+    def path(self, *parts: Any) -> Path:
+        *dirs, last = parts
+        path = self.root.joinpath(*(quote(p, safe="") for p in dirs))
+        if isinstance(last, int):
+            return path / f"{last}.json"
+        return path / quote(last, safe="")
+
+    def read(self, identifiers: Tuple[str, ...]) -> List[Tuple[Tuple[str, str, int], Any]]:
+        """Read all shards needed to access the given identifiers which aren't loaded yet."""
+        if len(identifiers) >= 3:
+            uuid, category, key = identifiers[:3]
+            shards = [(uuid, category, self.bucket(key))]
+        elif tuple(identifiers) in self.loaded:
+            return []
+        else:
+            shards = list(self._list_shards(tuple(identifiers)))
+
+        ret = []
+        for shard in shards:
+            if shard in self.loaded:
+                continue
+            try:
+                ret.append((shard, codec.loads(self.path(*shard).read_bytes())))
+            except FileNotFoundError:
+                ret.append((shard, {}))
+        return ret
+
+    def _list_shards(self, prefix: Tuple[str, ...]):
+        if len(prefix) == 2:
+            directory = self.path(*prefix)
+            for path in directory.glob("*.json"):
+                yield prefix + (int(path.stem),)
+            return
+        directory = self.root if not prefix else self.path(*prefix)
+        if not directory.is_dir():
+            return
+        for child in directory.iterdir():
+            if child.is_dir():
+                yield from self._list_shards(prefix + (unquote(child.name),))
+
+    def merge(
+        self,
+        data: Dict[str, Any],
+        identifiers: Tuple[str, ...],
+        shards: List[Tuple[Tuple[str, str, int], Any]],
+    ) -> None:
+        """Merge the shards returned by `read` into the in-memory data."""
+        for shard, contents in shards:
+            if shard in self.loaded:
+                # Read concurrently by someone else, what's in memory may be newer.
+                continue
+            self.loaded.add(shard)
+            if not contents:
+                continue
+            uuid, category, bucket = shard
+            data.setdefault(uuid, {}).setdefault(category, {}).update(contents)
+            self.keys[shard].update(contents)
+        if len(identifiers) < 3:
+            self.loaded.add(tuple(identifiers))
+
+    def load_sync(self, data: Dict[str, Any], identifiers: Tuple[str, ...]) -> None:
+        self.merge(data, identifiers, self.read(identifiers))
+
+    def mark(self, identifiers: Tuple[str, ...]) -> None:
+        if len(identifiers) >= 3:
+            uuid, category, key = identifiers[:3]
+            shard = (uuid, category, self.bucket(key))
+            self.keys[shard].add(key)
+            self.dirty.add(shard)
+        else:
+            self.dirty.add(tuple(identifiers))
+
+    def write_dirty(self, data: Dict[str, Any]) -> None:
+        _write_files(self.encode_dirty(data))
+
+    def encode_dirty(self, data: Dict[str, Any]) -> List[Tuple[Path, Optional[bytes]]]:
+        """Encode the dirty shards, returning the files to write in the form accepted
+        by `_write_files`.
+        """
+        dirty, self.dirty = self.dirty, set()
+        files = []
+        for item in dirty:
+            if len(item) == 3:
+                files.append(self._encode_shard(data, item))
+            else:
+                files.extend(self._encode_prefix(data, item))
+        return files
+
+    def _encode_shard(
+        self, data: Dict[str, Any], shard: Tuple[str, str, int]
+    ) -> Tuple[Path, Optional[bytes]]:
+        uuid, category, _bucket = shard
+        category_data = data.get(uuid, {}).get(category, {})
+        keys = self.keys[shard]
+        contents = {k: category_data[k] for k in keys if k in category_data}
+        keys.intersection_update(contents)
+        return self.path(*shard), codec.dumps(contents) if contents else None
+
+    def _encode_prefix(
+        self, data: Dict[str, Any], prefix: Tuple[str, ...]
+    ) -> List[Tuple[Path, Optional[bytes]]]:
+        # Everything under the prefix has been replaced or removed, the prefix
+        # is fully loaded so the in-memory data is authoritative.
+        partial = data
+        for i in prefix:
+            partial = partial.get(i, {})
+        if len(prefix) == 1:
+            uuid = prefix[0]
+            categories = {(uuid, category): docs for category, docs in partial.items()}
+        else:
+            categories = {prefix: partial}
+
+        on_disk = set(self._list_shards(prefix))
+        in_memory = set()
+        for (uuid, category), docs in categories.items():
+            for shard in [s for s in list(self.keys) if s[:2] == (uuid, category)]:
+                self.keys[shard].clear()
+            for key in docs:
+                shard = (uuid, category, self.bucket(key))
+                self.keys[shard].add(key)
+                in_memory.add(shard)
+        files = [self._encode_shard(data, shard) for shard in in_memory | on_disk]
+
+        directory = self.path(*prefix)
+        if not partial and directory.is_dir():
+            files.append((directory, None))
+        return files
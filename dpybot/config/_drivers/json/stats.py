@@ -0,0 +1,90 @@
+"""Statistics of the time spent waiting for locks and saving the settings files."""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from .files import _fsync_time
+
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _LockStats:
+    """Statistics of the time spent waiting for a kind of lock."""
+
+    __slots__ = ("acquisitions", "contended", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def add(self, wait: float, contended: bool) -> None:
+        self.acquisitions += 1
+        if contended:
+            self.contended += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "total_wait": self.total_wait,
+            "max_wait": self.max_wait,
+        }
+
+
+class _DurationStats:
+    """Statistics of the durations of a kind of operation."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"count": self.count, "total": self.total, "max": self.max}
+
+
+class _SizeStats(_DurationStats):
+    """Statistics of the sizes (in bytes) of a kind of write."""
+
+    __slots__ = ()
+
+
+@contextlib.asynccontextmanager
+async def _acquire(lock: asyncio.Lock, stats: _LockStats):
+    contended = lock.locked()
+    start = time.perf_counter()
+    async with lock:
+        wait = time.perf_counter() - start
+        stats.add(wait, contended)
+        if wait > 1:
+            log.debug("Waited %.2fs for a lock.", wait)
+        yield
+
+
+def _timed(func: Callable[[], Any]) -> Tuple[float, Any]:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _timed_write(write: Callable[[], None]) -> Tuple[float, float]:
+    """Call the write function, returning its duration and the part of it spent in fsync."""
+    _fsync_time.total = 0.0
+    start = time.perf_counter()
+    write()
+    return time.perf_counter() - start, _fsync_time.total
@@ -0,0 +1,590 @@
+"""The ways a cog's data can be stored on disk."""
+
+import asyncio
+import functools
+import logging
+import marshal
+import mmap
+import os
+import sys
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple, Type
+from uuid import uuid4
+
+from .. import codec
+from ..compression import decompress
+from .cog import _Cog, _CogOptions
+from .documents import _FragmentCache, _Undecoded, _decode_all
+from .evictor import _evictor
+from .files import (
+    _decode_settings,
+    _gc_paused,
+    _hash_file,
+    _save_chunks,
+    _save_in_child,
+    _save_sidecar,
+    _sync_directory,
+    _syncer,
+    _wait_for_exit,
+    _write_files,
+)
+from .journal import _Journal
+from .manifest import _manifest
+from .sharded import _ShardedStore
+from .stats import _timed
+from .writer import _writer
+
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _FileStorage:
+    """Stores a cog's data in a single settings file, rewritten on every save.
+
+    The subclasses are the other ways of storing the data, which can't be
+    combined with each other. Each of them declares the options it supports.
+    """
+
+    #: The name of the storage, used in error messages.
+    description = "a single settings file"
+    #: The options which can be enabled along with the storage.
+    supported_options = frozenset({"binary_snapshot", "watch", "compression", "intern_strings"})
+    #: Whether the data can be unloaded and loaded again from the settings file.
+    evictable = True
+    #: Whether the positions of the documents are written to an index next to the file.
+    writes_index = False
+
+    def __init__(self, cog: _Cog):
+        self.cog = cog
+        self.fragments = _FragmentCache() if cog.options.incremental_saves else None
+        # The (size, mtime) of the settings file which the binary snapshot was made from.
+        self.snapshot_key: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def check_options(cls, options: _CogOptions) -> None:
+        """Raise a `ValueError` if the storage can't be used with the given options."""
+        enabled = {
+            "binary_snapshot": options.binary_snapshot,
+            "watch": options.watch,
+            "compression": options.compression.enabled,
+            "intern_strings": options.intern_strings,
+        }
+        for option, value in enabled.items():
+            if value and option not in cls.supported_options:
+                raise ValueError(f"The {option} option can't be used with {cls.description}.")
+
+    def load(self) -> None:
+        """Load the cog's data from disk."""
+        cog = self.cog
+        try:
+            if not (cog.options.binary_snapshot and self._load_snapshot()):
+                raw = decompress(cog.path.read_bytes())
+                cog.data = _decode_settings(raw, cog.options.intern_strings)
+                cog.loaded(len(raw))
+        except FileNotFoundError:
+            cog.data = {}
+            cog.path.write_bytes(codec.dumps(cog.data))
+            cog.record_file_key(cog.path.stat())
+            cog.loaded(2)
+
+    def _load_snapshot(self) -> bool:
+        """Load the data from the binary snapshot.
+
+        Returns ``False`` when the snapshot doesn't match the settings file.
+        """
+        path = self.cog.path
+        try:
+            snapshot = path.with_suffix(".snapshot").read_bytes()
+            key_size = int.from_bytes(snapshot[:4], "little")
+            key = marshal.loads(snapshot[4 : 4 + key_size])
+            stat = path.stat()
+            if (
+                key["marshal_version"] != marshal.version
+                or key["size"] != stat.st_size
+                or key["mtime_ns"] != stat.st_mtime_ns
+                or key["blake2b"] != _hash_file(path)
+            ):
+                return False
+            with _gc_paused():
+                data = marshal.loads(memoryview(snapshot)[4 + key_size :])
+        except FileNotFoundError:
+            return False
+        except Exception:
+            log.warning("Ignoring unreadable binary snapshot of %s", self.cog.name, exc_info=True)
+            return False
+        self.cog.data = data
+        self.snapshot_key = (stat.st_size, stat.st_mtime_ns)
+        return True
+
+    async def fetch(self, identifiers: Tuple[str, ...]) -> None:
+        """Read the parts of the data needed to access the identifiers which aren't in memory."""
+
+    def fetch_sync(self, identifiers: Tuple[str, ...]) -> None:
+        pass
+
+    def resolve(self, identifiers: Tuple[str, ...]) -> None:
+        """Decode the parts of the data needed to access the identifiers which aren't decoded."""
+
+    def contains(self, uuid: str) -> bool:
+        return uuid in self.cog.data
+
+    def record(self, op: str, identifiers: Tuple[str, ...], value: Any = None) -> None:
+        """Record a change which was just applied to the data."""
+        if self.fragments is not None:
+            self.fragments.invalidate(identifiers)
+
+    def reset(self) -> None:
+        """Forget what was derived from the data, after it's replaced or unloaded."""
+        if self.fragments is not None:
+            self.fragments = _FragmentCache()
+        self.snapshot_key = None
+
+    def encodes_on_loop(self, rewrite: bool = False) -> bool:
+        """Whether encoding the changes, or all of the data with ``rewrite``,
+        is cheap enough to do on the event loop.
+        """
+        # The cache is empty after the cog is loaded and after large changes.
+        return self.fragments is not None and self.fragments.is_cheap
+
+    async def save(self) -> None:
+        """Write the changes made so far.
+
+        Must be called with the `_SavePipeline.write_lock` of the cog held.
+        """
+        await self.cog.pipeline.run(self.prepare_write)
+
+    def save_sync(self) -> None:
+        self.prepare_write()()
+
+    def after_save(self) -> None:
+        pass
+
+    def prepare_write(self) -> Callable[[], None]:
+        """Encode the changes, returning a function which writes them out.
+
+        Only the returned function does any I/O and it doesn't touch the cog's data,
+        so it can run while the data is being changed.
+        """
+        return self.prepare_file()
+
+    def prepare_rewrite(self) -> Callable[[], None]:
+        """Like `prepare_write`, but writing all of the data to the settings file."""
+        return self.prepare_file()
+
+    def encode(
+        self, spans: Optional[List[Tuple[Tuple[str, ...], int, int]]] = None
+    ) -> List[bytes]:
+        if self.fragments is None:
+            return [codec.dumps(self.cog.data)]
+        return self.fragments.encode(self.cog.data, spans)
+
+    def prepare_file(self) -> Callable[[], None]:
+        """Encode all of the data, returning a function which writes the settings file."""
+        cog = self.cog
+        cog_ids = [cog_id for cog_id, inner in cog.data.items() if isinstance(inner, dict)]
+        # The index is only needed to load the file lazily.
+        spans = [] if self.writes_index else None
+        chunks = self.encode(spans)
+        path = cog.path
+        durability = cog.options.durability
+        compression = cog.options.compression
+
+        def write() -> None:
+            _evictor.resize(cog.name, sum(map(len, chunks)))
+            stats = cog.save_stats
+            if compression.enabled:
+                compress_time, compressed = _timed(functools.partial(compression.compress, chunks))
+                stats["compress"].add(compress_time)
+                _save_chunks(path, compressed, durability)
+            else:
+                _save_chunks(path, chunks, durability)
+            stat = path.stat()
+            stats["bytes"].add(stat.st_size)
+            cog.record_file_key(stat)
+            if spans is not None:
+                _save_sidecar(
+                    path.with_suffix(".index"),
+                    codec.dumps(
+                        {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "spans": spans}
+                    ),
+                )
+            _manifest.record(path, cog_ids, stat)
+
+        return write
+
+    def prepare_snapshot(self) -> Callable[[], None]:
+        """Encode the data to both the settings file and the binary snapshot,
+        returning a function which writes the two.
+        """
+        write_file = self.prepare_rewrite()
+        data = marshal.dumps(self.cog.data)
+        path = self.cog.path
+
+        def write() -> None:
+            write_file()
+            stat = path.stat()
+            key = {
+                "marshal_version": marshal.version,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "blake2b": _hash_file(path),
+            }
+            key_data = marshal.dumps(key)
+            _save_sidecar(
+                path.with_suffix(".snapshot"),
+                len(key_data).to_bytes(4, "little") + key_data + data,
+            )
+            self.snapshot_key = (stat.st_size, stat.st_mtime_ns)
+
+        return write
+
+    async def write_snapshot(self) -> None:
+        """Write the binary snapshot of the data, if it's outdated."""
+        async with self.cog.pipeline.write_lock:
+            if not self.snapshot_is_current():
+                await self.cog.pipeline.run(self.prepare_snapshot, rewrite=True)
+
+    def snapshot_is_current(self) -> bool:
+        try:
+            stat = self.cog.path.stat()
+        except FileNotFoundError:
+            return False
+        return self.snapshot_key == (stat.st_size, stat.st_mtime_ns)
+
+    def unload_sync(self) -> None:
+        """Write out everything which is pending, before the data is unloaded for good."""
+        cog = self.cog
+        if cog.data is None:
+            return
+        if cog.flusher is not None:
+            # Nobody is left to await the flusher, write any pending batch right away.
+            cog.flusher.flush_sync()
+        if cog.options.binary_snapshot and not self.snapshot_is_current():
+            self.prepare_snapshot()()
+
+    async def teardown(self) -> None:
+        if self.cog.options.binary_snapshot:
+            await self.write_snapshot()
+
+    def close(self) -> None:
+        pass
+
+
+class _JournalStorage(_FileStorage):
+    """Appends the changes to a `_Journal` next to the settings file,
+    which only gets rewritten when the journal is compacted.
+    """
+
+    description = "the journal"
+    supported_options = frozenset({"binary_snapshot", "compression", "intern_strings"})
+    evictable = False
+
+    def __init__(self, cog: _Cog):
+        super().__init__(cog)
+        self.journal = _Journal(cog)
+
+    def load(self) -> None:
+        super().load()
+        self.journal.replay(self.cog.data)
+
+    def record(self, op: str, identifiers: Tuple[str, ...], value: Any = None) -> None:
+        self.journal.record(op, identifiers, value)
+        super().record(op, identifiers, value)
+
+    def encodes_on_loop(self, rewrite: bool = False) -> bool:
+        if rewrite or self.journal.needs_compaction:
+            return super().encodes_on_loop(rewrite)
+        # Only the records of the changes get encoded.
+        return True
+
+    def after_save(self) -> None:
+        self.journal.schedule_compaction()
+
+    def prepare_write(self) -> Callable[[], None]:
+        return self.journal.prepare_append()
+
+    def prepare_rewrite(self) -> Callable[[], None]:
+        return self.journal.prepare_compaction()
+
+    def snapshot_is_current(self) -> bool:
+        return not self.journal.size and super().snapshot_is_current()
+
+    def unload_sync(self) -> None:
+        super().unload_sync()
+        if self.cog.data is not None and not self.cog.options.binary_snapshot:
+            self.journal.compact_sync()
+
+    async def teardown(self) -> None:
+        await super().teardown()
+        async with self.cog.pipeline.write_lock:
+            self.journal.close()
+
+    def close(self) -> None:
+        self.journal.close()
+
+
+class _LazyStorage(_FileStorage):
+    """Decodes the documents of the settings file only once they're first accessed.
+
+    The file is memory-mapped when it's loaded and its documents are located
+    with the index of their positions written next to it on every save.
+    """
+
+    description = "lazy loading"
+    supported_options = frozenset()
+    evictable = False
+    writes_index = True
+
+    def __init__(self, cog: _Cog):
+        super().__init__(cog)
+        # The number of documents which aren't decoded yet.
+        self.undecoded = 0
+
+    @classmethod
+    def check_options(cls, options: _CogOptions) -> None:
+        if not options.incremental_saves:
+            raise ValueError("Lazy loading requires incremental saves.")
+        super().check_options(options)
+
+    def load(self) -> None:
+        try:
+            loaded = self._load_lazy()
+        except FileNotFoundError:
+            loaded = False
+        if not loaded:
+            super().load()
+
+    def _load_lazy(self) -> bool:
+        """Load the data without decoding the documents, using the index of the last save.
+
+        Returns ``False`` when there's no up-to-date index for the settings file.
+        """
+        path = self.cog.path
+        try:
+            index = codec.loads(path.with_suffix(".index").read_bytes())
+        except (FileNotFoundError, ValueError):
+            return False
+        stat = path.stat()
+        if index.get("size") != stat.st_size or index.get("mtime_ns") != stat.st_mtime_ns:
+            # The file was written without us, e.g. edited by hand.
+            return False
+
+        with path.open("rb") as fs:
+            if sys.platform == "win32":
+                # Files which are mapped into memory can't be replaced on Windows.
+                buffer = fs.read()
+            else:
+                buffer = mmap.mmap(fs.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        # Every document gets cached below.
+        self.fragments.complete = True
+        data = {}
+        undecoded = 0
+        for path, start, end in index["spans"]:
+            *parents, key = path
+            partial, cache = data, self.fragments.fragments
+            for i in parents:
+                partial = partial.setdefault(i, {})
+                cache = cache.setdefault(i, {})
+            if len(path) < 3:
+                partial[key] = codec.loads(bytes(view[start:end]))
+            else:
+                # The raw document doubles as its cached encoding for the next save.
+                partial[key] = _Undecoded(view[start:end])
+                cache[key] = partial[key].raw
+                undecoded += 1
+        self.cog.data = data
+        self.undecoded = undecoded
+        return True
+
+    def resolve(self, identifiers: Tuple[str, ...]) -> None:
+        if not self.undecoded:
+            return
+        node = self.cog.data
+        for key in identifiers[:3]:
+            child = node.get(key) if isinstance(node, dict) else None
+            if child is None:
+                return
+            if isinstance(child, _Undecoded):
+                node[key] = child.decode()
+                self.undecoded -= 1
+                return
+            node = child
+        self.undecoded -= _decode_all(node, len(identifiers))
+
+
+class _ForkedStorage(_FileStorage):
+    """Writes the settings file from a forked child process.
+
+    This works like ``BGSAVE`` in Redis: the child encodes the copy-on-write
+    image of the data the cog had when it was forked, while the parent keeps
+    serving (and changing) it without sharing the GIL with the encoding.
+    Once the child exits, the parent swaps the file it wrote in place of the
+    settings file.
+    """
+
+    description = "forked saves"
+
+    def __init__(self, cog: _Cog):
+        super().__init__(cog)
+        # The whole file is encoded by every child, there's nothing to cache.
+        self.fragments = None
+        # The pid of the running child, the file it writes to and the cog ids it saves.
+        self._child: Optional[Tuple[int, Path, List[str]]] = None
+        self._finish_lock = threading.Lock()
+
+    @classmethod
+    def check_options(cls, options: _CogOptions) -> None:
+        if not sys.platform.startswith("linux"):
+            raise ValueError("Forked saves are only supported on Linux.")
+        super().check_options(options)
+
+    async def save(self) -> None:
+        start = time.perf_counter()
+        pid = self._fork()
+        await _wait_for_exit(pid)
+        await _writer.run(self.finish_sync)
+        # The child encodes, compresses and writes the file.
+        self.cog.save_stats["write"].add(time.perf_counter() - start)
+
+    def _fork(self) -> int:
+        cog = self.cog
+        cog_ids = [cog_id for cog_id, inner in cog.data.items() if isinstance(inner, dict)]
+        tmp_path = cog.path.with_name("{}-{}.tmp".format(cog.path.stem, uuid4().fields[0]))
+        with warnings.catch_warnings():
+            # The child only encodes and writes the data, it doesn't
+            # use any of the locks which other threads could be holding.
+            warnings.simplefilter("ignore", DeprecationWarning)
+            pid = os.fork()
+        if pid == 0:
+            _save_in_child(cog.data, tmp_path, cog.options.durability, cog.options.compression)
+        self._child = (pid, tmp_path, cog_ids)
+        return pid
+
+    def finish_sync(self) -> None:
+        """Wait for the running child, if there is one, and swap in the file it wrote."""
+        with self._finish_lock:
+            if self._child is None:
+                return
+            (pid, tmp_path, cog_ids), self._child = self._child, None
+            _, status = os.waitpid(pid, 0)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code != 0:
+                try:
+                    tmp_path.unlink()
+                except FileNotFoundError:
+                    pass
+                raise OSError(
+                    f"The background save of {self.cog.name} failed with exit code {exit_code}."
+                )
+            path = self.cog.path
+            tmp_path.replace(path)
+            durability = self.cog.options.durability
+            if durability.mode == "always":
+                _sync_directory(path.parent)
+            elif durability.mode == "interval":
+                _syncer.schedule(path, durability.interval)
+            stat = path.stat()
+            self.cog.save_stats["bytes"].add(stat.st_size)
+            self.cog.record_file_key(stat)
+            _manifest.record(path, cog_ids, stat)
+
+    def save_sync(self) -> None:
+        # A save still running in a child process must land before any newer one.
+        self.finish_sync()
+        super().save_sync()
+
+    def unload_sync(self) -> None:
+        self.finish_sync()
+        super().unload_sync()
+
+
+class _ShardedStorage(_FileStorage):
+    """Splits the data into many files with a `_ShardedStore`,
+    which are only read once they're needed.
+    """
+
+    description = "the sharded layout"
+    supported_options = frozenset()
+    evictable = False
+
+    def __init__(self, cog: _Cog):
+        super().__init__(cog)
+        # Only the shards which changed get encoded.
+        self.fragments = None
+        self.store: Optional[_ShardedStore] = None
+
+    def load(self) -> None:
+        cog = self.cog
+        root = cog.path.with_suffix(".shards")
+        is_new = not root.exists()
+        store = self.store = _ShardedStore(cog.name, root, cog.options.shard_count)
+        cog.data = {}
+        if not is_new or not cog.path.exists():
+            return
+
+        # Move existing data over to the sharded layout.
+        cog.data = codec.loads(decompress(cog.path.read_bytes()))
+        for uuid in cog.data:
+            store.loaded.add((uuid,))
+            store.mark((uuid,))
+        store.write_dirty(cog.data)
+        cog.path.replace(cog.path.with_name(cog.path.name + ".bak"))
+
+    async def fetch(self, identifiers: Tuple[str, ...]) -> None:
+        loop = asyncio.get_running_loop()
+        shards = await loop.run_in_executor(None, self.store.read, identifiers)
+        async with self.cog.data_lock():
+            self.store.merge(self.cog.data, identifiers, shards)
+
+    def fetch_sync(self, identifiers: Tuple[str, ...]) -> None:
+        self.store.load_sync(self.cog.data, identifiers)
+
+    def contains(self, uuid: str) -> bool:
+        return super().contains(uuid) or self.store.path(uuid).is_dir()
+
+    def record(self, op: str, identifiers: Tuple[str, ...], value: Any = None) -> None:
+        self.store.mark(identifiers)
+
+    def encodes_on_loop(self, rewrite: bool = False) -> bool:
+        # Encoding prefixes lists their shards on disk.
+        return False
+
+    def prepare_write(self) -> Callable[[], None]:
+        files = self.store.encode_dirty(self.cog.data)
+        return functools.partial(_write_files, files, self.cog.options.durability)
+
+    def prepare_rewrite(self) -> Callable[[], None]:
+        # The shards which didn't change are up-to-date.
+        return self.prepare_write()
+
+
+class _LazyJournalStorage(_JournalStorage, _LazyStorage):
+    """Appends the changes to a journal next to a lazily loaded settings file."""
+
+    description = "lazy loading with the journal"
+    supported_options = frozenset()
+
+
+# The storages of the combinations of the options which select one.
+_STORAGES = {
+    frozenset(): _FileStorage,
+    frozenset({"journal"}): _JournalStorage,
+    frozenset({"sharded"}): _ShardedStorage,
+    frozenset({"lazy_load"}): _LazyStorage,
+    frozenset({"lazy_load", "journal"}): _LazyJournalStorage,
+    frozenset({"fork_saves"}): _ForkedStorage,
+}
+
+
+def _select_storage(**options: bool) -> Type[_FileStorage]:
+    enabled = frozenset(option for option, value in options.items() if value)
+    try:
+        return _STORAGES[enabled]
+    except KeyError:
+        raise ValueError(
+            "The {} options can't be combined.".format(", ".join(sorted(enabled)))
+        ) from None
@@ -0,0 +1,190 @@
+"""Reloading the data of cogs whose settings file is changed by another process."""
+
+import asyncio
+import ctypes.util
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .files import _file_key
+from .registry import _cogs
+
+
+log = logging.getLogger("redbot.json_driver")
+
+
+class _Inotify:
+    """Reports the files written to, or moved into, a set of directories using Linux's inotify."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories: Dict[int, Path] = {}
+
+    def add(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self._directories[wd] = directory
+
+    def read(self) -> List[Path]:
+        """Get the paths of the files changed since the last read."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self._directories.get(wd)
+            if directory is not None and name:
+                paths.append(directory / os.fsdecode(name))
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _FileWatcher:
+    """Reloads the data of the cogs whose settings files were changed by other processes.
+
+    Uses inotify when it's available, and otherwise checks
+    the files every `poll_interval` seconds.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self):
+        self._paths: Dict[Path, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inotify: Optional[_Inotify] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._reloads: Dict[str, asyncio.Task] = {}
+        # The cogs whose files changed since their last reload started.
+        self._dirty = set()
+        self._closed = False
+
+    def watch(self, cog_name: str, path: Path) -> None:
+        self._paths[path] = cog_name
+        if self._inotify is not None:
+            try:
+                self._inotify.add(path.parent)
+            except OSError:
+                log.warning("Can't watch %s, falling back to polling.", path, exc_info=True)
+                self.stop()
+        self.ensure_started()
+
+    def unwatch(self, cog_name: str) -> None:
+        self._paths = {path: cog for path, cog in self._paths.items() if cog != cog_name}
+        self._dirty.discard(cog_name)
+        if not self._paths:
+            self.stop()
+
+    def ensure_started(self) -> None:
+        """Start watching the files if there's a running event loop and it isn't already.
+
+        Called whenever the data of a cog is accessed, as drivers may be created
+        before the event loop runs, and after the driver was initialized.
+        """
+        if self._closed or not self._paths:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is not loop:
+            self.start()
+
+    def start(self) -> None:
+        """Start watching the files from the running event loop, if it isn't already."""
+        loop = asyncio.get_running_loop()
+        self._closed = False
+        if not self._paths or self._loop is loop:
+            return
+        self.stop()
+        self._loop = loop
+        try:
+            inotify = _Inotify()
+        except (AttributeError, OSError):
+            # Not on Linux, or out of inotify instances.
+            self._poll_task = asyncio.create_task(self._poll())
+            return
+        try:
+            for directory in {path.parent for path in self._paths}:
+                inotify.add(directory)
+        except OSError:
+            log.warning("Can't watch the settings files, falling back to polling.", exc_info=True)
+            inotify.close()
+            self._poll_task = asyncio.create_task(self._poll())
+            return
+        self._inotify = inotify
+        loop.add_reader(inotify.fd, self._on_inotify)
+
+    def stop(self) -> None:
+        if self._inotify is not None:
+            self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        for task in self._reloads.values():
+            task.cancel()
+        self._reloads.clear()
+        self._loop = None
+
+    def close(self) -> None:
+        """Stop watching the files until `start` is called again."""
+        self._closed = True
+        self.stop()
+
+    def _on_inotify(self) -> None:
+        for path in self._inotify.read():
+            cog_name = self._paths.get(path)
+            if cog_name is not None:
+                self._schedule_reload(cog_name, path)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for path, cog_name in list(self._paths.items()):
+                cog = _cogs.get(cog_name)
+                if cog is not None and _file_key(path) != cog.file_key:
+                    self._schedule_reload(cog_name, path)
+
+    def _schedule_reload(self, cog_name: str, path: Path) -> None:
+        self._dirty.add(cog_name)
+        task = self._reloads.get(cog_name)
+        if task is None or task.done():
+            self._reloads[cog_name] = asyncio.create_task(self._reload(cog_name))
+
+    async def _reload(self, cog_name: str) -> None:
+        # Changes made while the file is being read get picked up by another round.
+        while cog_name in self._dirty:
+            self._dirty.discard(cog_name)
+            cog = _cogs.get(cog_name)
+            if cog is None:
+                return
+            try:
+                await cog.reload()
+            except Exception:
+                log.exception("Failed to reload the data of %s", cog_name)
+
+
+_watcher = _FileWatcher()
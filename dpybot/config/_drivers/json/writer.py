@@ -0,0 +1,127 @@
+"""The threads which encode and write the changes of every cog."""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .stats import _DurationStats
+
+
+class _WriterExecutor:
+    """The threads which the config's writes to disk run in.
+
+    Keeping them apart from the event loop's default executor means that
+    a burst of saves can't starve its other users (e.g. DNS resolution)
+    and the other way around. At most ``max_queued`` calls wait for a
+    thread at once, any further ones wait on the event loop until
+    the queue has room for them.
+
+    The size of the pool and of the queue are read from the
+    ``DPYBOT_CONFIG_WRITERS`` (4 by default) and ``DPYBOT_CONFIG_WRITE_QUEUE``
+    (64 by default) environment variables when the driver is initialized.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 64):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.waiting = 0
+        self.queued = 0
+        self.queue_wait = _DurationStats()
+        self._queued_lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configure(self) -> None:
+        """Read the size of the pool and of the queue from the environment variables.
+
+        Raises
+        ------
+        ValueError
+            If one of the environment variables is invalid.
+        """
+        max_workers = _parse_count("DPYBOT_CONFIG_WRITERS", os.getenv("DPYBOT_CONFIG_WRITERS"), 4)
+        max_queued = _parse_count(
+            "DPYBOT_CONFIG_WRITE_QUEUE", os.getenv("DPYBOT_CONFIG_WRITE_QUEUE"), 64
+        )
+        if max_workers != self.max_workers and self._executor is not None:
+            # The calls already submitted still run in the old threads.
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if max_queued != self.max_queued:
+            # The slots are made again by the next call.
+            self._loop = None
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Call the function with the given arguments in one of the threads."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_queued)
+            self._loop = loop
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="config-writer"
+            )
+        submitted = time.perf_counter()
+        slots = self._slots
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            with self._queued_lock:
+                self.queued += 1
+            future = self._executor.submit(self._call, func, args)
+            try:
+                started, result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # It never left the queue, `_call` didn't take it off.
+                    with self._queued_lock:
+                        self.queued -= 1
+                raise
+        finally:
+            slots.release()
+        self.queue_wait.add(started - submitted)
+        return result
+
+    def _call(self, func: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[float, Any]:
+        started = time.perf_counter()
+        with self._queued_lock:
+            self.queued -= 1
+        return started, func(*args)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "queued": self.queued,
+            "waiting": self.waiting,
+            "queue_wait": self.queue_wait.to_dict(),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _parse_count(name: str, value: Optional[str], default: int) -> int:
+    if not value or not value.strip():
+        return default
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise ValueError(f"Invalid {name}: {value!r}, expected a whole number of at least 1.")
+    return count
+
+
+_writer = _WriterExecutor()
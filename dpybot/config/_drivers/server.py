@@ -0,0 +1,384 @@
+"""Config daemon shared by several bot processes, and the driver talking to it.
+
+The data of every cog is owned by a single `ConfigServer` process, which
+stores it with another driver (`JsonDriver` by default) and serves all
+other processes over a Unix socket. This lets the shards of a bot run in
+separate processes without overwriting each other's files.
+
+Messages are JSON arrays, each prefixed with its length as a 4-byte big
+endian integer. A request is ``[id, op, cog_name, cog_id, payload]`` and is
+answered with ``[id, error, result]``, where ``error`` is either ``null``
+or ``[exception_name, message]``. Requests of a connection are handled in
+order, but clients don't need to wait for a response before sending the
+next request. Messages with an id of 0 are sent by the server on its own,
+to let the clients know that another process changed some data.
+
+The daemon can be started with ``python -m dpybot.config.server``.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Type
+
+from . import codec
+from .base import BaseDriver, IdentifierData
+from .json import JsonDriver
+
+__all__ = ["ConfigServer", "ServerDriver"]
+
+log = logging.getLogger("dpybot.config.server")
+
+# The number of values the driver keeps cached in each process.
+_CACHE_SIZE = 10000
+
+_ERRORS: Dict[str, Type[Exception]] = {
+    "KeyError": KeyError,
+    "ValueError": ValueError,
+    "TypeError": TypeError,
+}
+
+
+def default_socket_path() -> Path:
+    return Path(os.getenv("DPYBOT_CONFIG_SOCKET") or Path(os.getcwd()) / "data" / "config.sock")
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Any:
+    size = int.from_bytes(await reader.readexactly(4), "big")
+    return codec.loads(await reader.readexactly(size))
+
+
+def _write_message(writer: asyncio.StreamWriter, message: Any) -> None:
+    data = codec.dumps(message)
+    writer.write(len(data).to_bytes(4, "big") + data)
+
+
+def _dump_identifier(identifier_data: IdentifierData) -> List[Any]:
+    return [
+        identifier_data.category,
+        identifier_data.primary_key,
+        identifier_data.identifiers,
+        identifier_data.primary_key_len,
+        identifier_data.is_custom,
+    ]
+
+
+def _load_identifier(cog_name: str, cog_id: str, data: List[Any]) -> IdentifierData:
+    category, primary_key, identifiers, primary_key_len, is_custom = data
+    return IdentifierData(
+        cog_name,
+        cog_id,
+        category,
+        tuple(primary_key),
+        tuple(identifiers),
+        primary_key_len,
+        is_custom,
+    )
+
+
+class ConfigServer:
+    """The config daemon, serving the data of all cogs over a Unix socket.
+
+    Changes are acknowledged once they're applied in memory, the backing
+    driver writes them to disk in groups (see `JsonDriver.commit_window`).
+
+    Parameters
+    ----------
+    path : Optional[Path]
+        The path of the socket, ``DPYBOT_CONFIG_SOCKET`` or ``data/config.sock``
+        in the working directory by default.
+    driver_cls : Type[BaseDriver]
+        The driver storing the data.
+    **driver_options
+        Options passed to each instance of the driver.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        driver_cls: Type[BaseDriver] = JsonDriver,
+        **driver_options: Any,
+    ):
+        self.path = default_socket_path() if path is None else Path(path)
+        self.driver_cls = driver_cls
+        if driver_cls is JsonDriver:
+            driver_options.setdefault("commit_window", 0.05)
+        self.driver_options = driver_options
+        self._drivers: Dict[Tuple[str, str], BaseDriver] = {}
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start accepting connections."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # Left behind by a daemon which didn't shut down cleanly.
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        codec.configure()
+        await self.driver_cls.initialize(**self.driver_cls.get_config_details())
+        self._server = await asyncio.start_unix_server(self._handle, path=str(self.path))
+        log.info("Serving config data on %s", self.path)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Stop the server and write all of the data to disk."""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+        await self.driver_cls.teardown()
+
+    def _driver(self, cog_name: str, cog_id: str) -> BaseDriver:
+        key = (cog_name, cog_id)
+        driver = self._drivers.get(key)
+        if driver is None:
+            driver = self._drivers[key] = self.driver_cls(
+                cog_name, cog_id, **self.driver_options
+            )
+        return driver
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while True:
+                try:
+                    req_id, op, cog_name, cog_id, payload = await _read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                try:
+                    result = await self._dispatch(writer, op, cog_name, cog_id, payload)
+                except Exception as exc:
+                    _write_message(writer, [req_id, [type(exc).__name__, str(exc)], None])
+                else:
+                    _write_message(writer, [req_id, None, result])
+                await writer.drain()
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _dispatch(
+        self, sender: asyncio.StreamWriter, op: str, cog_name: str, cog_id: str, payload: Any
+    ) -> Any:
+        if op == "cogs":
+            return [list(cog) async for cog in self.driver_cls.aiter_cogs()]
+
+        driver = self._driver(cog_name, cog_id)
+        if op == "get":
+            return await driver.get(_load_identifier(cog_name, cog_id, payload))
+        if op == "apply":
+            changes = [
+                (change_op, _load_identifier(cog_name, cog_id, identifier), value)
+                for change_op, identifier, value in payload
+            ]
+            await driver.apply(changes)
+            self._invalidate(
+                sender, cog_name, cog_id, [identifier_data for _, identifier_data, _ in changes]
+            )
+            return None
+        raise ValueError(f"Unknown operation: {op}")
+
+    def _invalidate(
+        self,
+        sender: asyncio.StreamWriter,
+        cog_name: str,
+        cog_id: str,
+        changed: List[IdentifierData],
+    ) -> None:
+        message = [0, "invalidate", cog_name, cog_id, [i.to_tuple()[2:] for i in changed]]
+        for writer in self._clients:
+            if writer is not sender:
+                _write_message(writer, message)
+
+
+class ServerDriver(BaseDriver):
+    """
+    Subclass of :py:class:`.BaseDriver` storing data in a `ConfigServer`.
+
+    All drivers of a process share a single connection to the server, on
+    which requests are pipelined. The values read are cached in the process
+    until the server lets it know that they were changed.
+
+    The data is stored by the server, so this driver takes no options: the
+    options of the driver storing it are passed to `ConfigServer` instead.
+    """
+
+    _socket_path: Optional[Path] = None
+    _writer: Optional[asyncio.StreamWriter] = None
+    _reader_task: Optional[asyncio.Task] = None
+    _connecting: Optional[asyncio.Lock] = None
+    _pending: Dict[int, asyncio.Future] = {}
+    _next_id = 1
+    _cache: collections.OrderedDict = collections.OrderedDict()
+    # Incremented whenever cached values are invalidated, responses to the requests
+    # sent before that aren't cached since they may already be outdated.
+    _epoch = 0
+
+    def __init__(self, cog_name: str, identifier: str, **driver_options: Any):
+        if driver_options:
+            raise ValueError(
+                "The server driver doesn't take any driver options, pass them to the"
+                f" ConfigServer instead: {', '.join(sorted(driver_options))}"
+            )
+        super().__init__(cog_name, identifier)
+
+    @classmethod
+    async def initialize(cls, **storage_details) -> None:
+        path = storage_details.get("path")
+        if path is not None:
+            cls._socket_path = Path(path)
+        await cls._connect()
+
+    @classmethod
+    async def teardown(cls) -> None:
+        if cls._writer is not None:
+            cls._writer.close()
+        if cls._reader_task is not None:
+            cls._reader_task.cancel()
+        cls._disconnected()
+
+    @staticmethod
+    def get_config_details() -> Dict[str, Any]:
+        path = os.getenv("DPYBOT_CONFIG_SOCKET")
+        if path:
+            return {"path": path}
+        return {}
+
+    @classmethod
+    async def _connect(cls) -> asyncio.StreamWriter:
+        if cls._connecting is None:
+            cls._connecting = asyncio.Lock()
+        async with cls._connecting:
+            if cls._writer is None:
+                if cls._socket_path is None:
+                    cls._socket_path = default_socket_path()
+                reader, writer = await asyncio.open_unix_connection(str(cls._socket_path))
+                cls._writer = writer
+                cls._reader_task = asyncio.create_task(cls._read_responses(reader))
+        return cls._writer
+
+    @classmethod
+    def _disconnected(cls) -> None:
+        cls._writer = None
+        cls._reader_task = None
+        cls._connecting = None
+        # Invalidations may have been missed.
+        cls._cache.clear()
+        cls._epoch += 1
+        pending, cls._pending = cls._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Lost the connection to the config server."))
+
+    @classmethod
+    async def _read_responses(cls, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                req_id, *message = await _read_message(reader)
+                if req_id == 0:
+                    _, cog_name, cog_id, changed = message
+                    cls._invalidate(cog_name, cog_id, changed)
+                    continue
+                future = cls._pending.pop(req_id, None)
+                if future is None or future.done():
+                    continue
+                error, result = message
+                if error is None:
+                    future.set_result(result)
+                else:
+                    name, text = error
+                    future.set_exception(_ERRORS.get(name, RuntimeError)(text))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            log.warning("Lost the connection to the config server.")
+        finally:
+            if asyncio.current_task() is cls._reader_task:
+                cls._disconnected()
+
+    @classmethod
+    async def _request(cls, op: str, cog_name: str, cog_id: str, payload: Any = None) -> Any:
+        writer = await cls._connect()
+        req_id = cls._next_id
+        cls._next_id += 1
+        future = cls._pending[req_id] = asyncio.get_running_loop().create_future()
+        _write_message(writer, [req_id, op, cog_name, cog_id, payload])
+        await writer.drain()
+        return await future
+
+    @classmethod
+    def _invalidate(cls, cog_name: str, cog_id: str, changed: List[List[str]]) -> None:
+        cls._epoch += 1
+        prefixes = [(cog_name, cog_id, *identifiers) for identifiers in changed]
+        for key in list(cls._cache):
+            for prefix in prefixes:
+                length = min(len(key), len(prefix))
+                if key[:length] == prefix[:length]:
+                    del cls._cache[key]
+                    break
+
+    def _key(self, identifier_data: IdentifierData) -> Tuple[str, ...]:
+        return (self.cog_name, self.unique_cog_identifier, *identifier_data.to_tuple()[2:])
+
+    async def get(self, identifier_data: IdentifierData) -> Any:
+        cls = type(self)
+        key = self._key(identifier_data)
+        try:
+            value = cls._cache[key]
+        except KeyError:
+            epoch = cls._epoch
+            value = await self._request(
+                "get", self.cog_name, self.unique_cog_identifier, _dump_identifier(identifier_data)
+            )
+            if epoch == cls._epoch:
+                cls._cache[key] = value
+                if len(cls._cache) > _CACHE_SIZE:
+                    cls._cache.popitem(last=False)
+        else:
+            cls._cache.move_to_end(key)
+        return pickle.loads(pickle.dumps(value, -1))
+
+    async def set(self, identifier_data: IdentifierData, value=None) -> None:
+        await self.apply([("set", identifier_data, value)])
+
+    async def set_many(self, items) -> None:
+        await self.apply(("set", identifier_data, value) for identifier_data, value in items)
+
+    async def clear(self, identifier_data: IdentifierData) -> None:
+        await self.apply([("clear", identifier_data, None)])
+
+    async def apply(self, changes) -> None:
+        changes = list(changes)
+        if not changes:
+            return
+        type(self)._invalidate(
+            self.cog_name,
+            self.unique_cog_identifier,
+            [identifier_data.to_tuple()[2:] for _, identifier_data, _ in changes],
+        )
+        await self._request(
+            "apply",
+            self.cog_name,
+            self.unique_cog_identifier,
+            [[op, _dump_identifier(i), value] for op, i, value in changes],
+        )
+
+    @classmethod
+    async def aiter_cogs(cls) -> AsyncIterator[Tuple[str, str]]:
+        for cog_name, cog_id in await cls._request("cogs", "", ""):
+            yield cog_name, cog_id
+
@@ -0,0 +1,442 @@
+import asyncio
+import concurrent.futures
+import os
+import sqlite3
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from . import codec
+from .base import BaseDriver, ConfigCategory, Document, IdentifierData, _batched
+
+__all__ = ["SqliteDriver"]
+
+_T = TypeVar("_T")
+
+# Primary keys are stored as a single column, with their parts separated by this character.
+# It sorts right before the space, which lets us look up all documents under a partial
+# primary key with a range query.
+_PKEY_SEP = "\x1f"
+_PKEY_SEP_END = "\x20"
+
+# The synchronous level of the connection for each durability mode. In WAL mode, with the NORMAL
+# level the log only gets synced to disk on checkpoints, which are forced for the interval mode.
+_SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "os": "OFF"}
+
+# The number of rows read at once when exporting a cog's data.
+_EXPORT_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    cog_name TEXT NOT NULL,
+    cog_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    pkey TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (cog_name, cog_id, category, pkey)
+) WITHOUT ROWID
+"""
+
+
+class SqliteDriver(BaseDriver):
+    """
+    Subclass of :py:class:`.BaseDriver` storing data in an SQLite database.
+
+    Every document (i.e. the data of a single guild, member, etc.) is stored
+    in its own row, so changes only ever rewrite the touched document
+    and nothing has to be kept in memory.
+
+    All statements are executed on a single, dedicated thread which
+    owns the connection to the database.
+
+    Setting all of the cog's data at once needs the length of the primary
+    keys of each category. For custom groups, it's taken from their documents
+    already in the database, so custom groups without any documents can't be
+    set this way.
+    """
+
+    _db_path: Optional[Path] = None
+    _conn: Optional[sqlite3.Connection] = None
+    _executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _checkpoint: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def initialize(cls, **storage_details) -> None:
+        path = storage_details.get("path")
+        if path is not None:
+            cls._db_path = Path(path)
+        await cls._execute(lambda conn: None)
+
+    @classmethod
+    async def teardown(cls) -> None:
+        if cls._executor is None:
+            return
+        if cls._checkpoint is not None:
+            # Closing the connection checkpoints the database anyway.
+            cls._checkpoint.cancel()
+            cls._checkpoint = None
+        await cls._execute(cls._close)
+        cls._executor.shutdown()
+        cls._executor = None
+
+    @staticmethod
+    def get_config_details() -> Dict[str, Any]:
+        path = os.getenv("DPYBOT_SQLITE_PATH")
+        if path:
+            return {"path": path}
+        return {}
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            if cls._db_path is None:
+                cls._db_path = Path(os.getcwd()) / "data" / "config.sqlite3"
+            cls._db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(cls._db_path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(_SCHEMA)
+            cls._conn = conn
+        return cls._conn
+
+    @classmethod
+    def _close(cls, conn: sqlite3.Connection) -> None:
+        conn.close()
+        cls._conn = None
+
+    @classmethod
+    async def _execute(cls, func: Callable[[sqlite3.Connection], _T]) -> _T:
+        """Run the given function with the connection on the database thread."""
+        if cls._executor is None:
+            cls._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="config-sqlite"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, lambda: func(cls._connect()))
+
+    async def _transact(self, statements: List[Callable[[sqlite3.Connection], None]]) -> None:
+        """Execute the given statements in a single transaction, with this driver's durability."""
+        if not statements:
+            return
+        await self._execute(_in_transaction(statements, _SYNCHRONOUS[self.durability.mode]))
+        if self.durability.mode == "interval":
+            cls = type(self)
+            if cls._checkpoint is None or cls._checkpoint.done():
+                cls._checkpoint = asyncio.create_task(
+                    cls._checkpoint_later(self.durability.interval)
+                )
+
+    @classmethod
+    async def _checkpoint_later(cls, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await cls._execute(lambda conn: conn.execute("PRAGMA wal_checkpoint(PASSIVE)"))
+
+    @staticmethod
+    def _pkey_range(primary_key: Tuple[str, ...]) -> Tuple[str, str]:
+        if not primary_key:
+            return "", "\U0010ffff"
+        prefix = _PKEY_SEP.join(primary_key)
+        return prefix + _PKEY_SEP, prefix + _PKEY_SEP_END
+
+    def _where(self, identifier_data: IdentifierData) -> Tuple[str, Tuple[Any, ...]]:
+        """Get the WHERE clause selecting all rows under the given identifiers."""
+        params: Tuple[Any, ...] = (self.cog_name, self.unique_cog_identifier)
+        if not identifier_data.category:
+            return "cog_name = ? AND cog_id = ?", params
+        params += (identifier_data.category,)
+        primary_key = identifier_data.primary_key
+        if len(primary_key) == identifier_data.primary_key_len:
+            return (
+                "cog_name = ? AND cog_id = ? AND category = ? AND pkey = ?",
+                params + (_PKEY_SEP.join(primary_key),),
+            )
+        return (
+            "cog_name = ? AND cog_id = ? AND category = ? AND pkey >= ? AND pkey < ?",
+            params + self._pkey_range(primary_key),
+        )
+
+    async def get(self, identifier_data: IdentifierData):
+        where, params = self._where(identifier_data)
+
+        def _get(conn: sqlite3.Connection) -> List[Tuple[str, str, bytes]]:
+            return conn.execute(
+                f"SELECT category, pkey, data FROM documents WHERE {where}", params
+            ).fetchall()
+
+        rows = await self._execute(_get)
+        if not rows:
+            raise KeyError(identifier_data.to_tuple())
+
+        if not identifier_data.category:
+            ret: Dict[str, Any] = {}
+            for category, pkey, data in rows:
+                _insert_document(ret.setdefault(category, {}), pkey, codec.loads(data))
+            return ret
+
+        if len(identifier_data.primary_key) < identifier_data.primary_key_len:
+            ret = {}
+            skip = len(identifier_data.primary_key)
+            for _category, pkey, data in rows:
+                parts = pkey.split(_PKEY_SEP)[skip:]
+                _insert_document(ret, _PKEY_SEP.join(parts), codec.loads(data))
+            return ret
+
+        partial = codec.loads(rows[0][2])
+        for i in identifier_data.identifiers:
+            partial = partial[i]
+        return partial
+
+    async def set(self, identifier_data: IdentifierData, value=None):
+        await self._transact([self._prepare_set(identifier_data, value)])
+
+    async def set_many(self, items: Iterable[Tuple[IdentifierData, Any]]) -> None:
+        await self.apply(("set", identifier_data, value) for identifier_data, value in items)
+
+    def _prepare_set(
+        self, identifier_data: IdentifierData, value: Any
+    ) -> Callable[[sqlite3.Connection], None]:
+        """Get a function executing the statements of a `set` inside of a transaction."""
+        if not identifier_data.category:
+            return self._prepare_set_cog(value)
+        category = identifier_data.category
+        primary_key = identifier_data.primary_key
+        where, params = self._where(identifier_data)
+
+        if len(primary_key) < identifier_data.primary_key_len:
+            # Replacing multiple documents at once.
+            levels = identifier_data.primary_key_len - len(primary_key)
+            rows = [
+                (
+                    self.cog_name,
+                    self.unique_cog_identifier,
+                    category,
+                    _PKEY_SEP.join(primary_key + pkey),
+                    codec.dumps(data),
+                )
+                for pkey, data in _flatten(levels, value)
+            ]
+
+            def _set_many(conn: sqlite3.Connection) -> None:
+                conn.execute(f"DELETE FROM documents WHERE {where}", params)
+                conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?)", rows)
+
+            return _set_many
+
+        identifiers = identifier_data.identifiers
+        # This also makes sure that the value is actually JSON serializable.
+        encoded = codec.dumps(value)
+        row_key = (
+            self.cog_name,
+            self.unique_cog_identifier,
+            category,
+            _PKEY_SEP.join(primary_key),
+        )
+
+        def _set(conn: sqlite3.Connection) -> None:
+            if identifiers:
+                row = conn.execute(f"SELECT data FROM documents WHERE {where}", params).fetchone()
+                document = codec.loads(row[0]) if row is not None else {}
+                partial = document
+                for i in identifiers[:-1]:
+                    try:
+                        partial = partial.setdefault(i, {})
+                    except AttributeError:
+                        # Tried to set sub-field of non-object
+                        raise TypeError("Cannot set sub-field of non-object")
+                partial[identifiers[-1]] = codec.loads(encoded)
+                data = codec.dumps(document)
+            else:
+                data = encoded
+            conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", row_key + (data,)
+            )
+
+        return _set
+
+    def _prepare_set_cog(self, value: Dict[str, Any]) -> Callable[[sqlite3.Connection], None]:
+        """Get a function replacing all of the cog's data inside of a transaction."""
+        cog_key = (self.cog_name, self.unique_cog_identifier)
+        # This also makes sure that the value is actually JSON serializable.
+        value = codec.copy(value)
+
+        def _set_cog(conn: sqlite3.Connection) -> None:
+            rows = [
+                cog_key + (category, _PKEY_SEP.join(pkey), codec.dumps(data))
+                for category, documents in value.items()
+                for pkey, data in _flatten(_pkey_len(conn, cog_key, category), documents)
+            ]
+            conn.execute("DELETE FROM documents WHERE cog_name = ? AND cog_id = ?", cog_key)
+            conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?)", rows)
+
+        return _set_cog
+
+    async def clear(self, identifier_data: IdentifierData):
+        await self._transact([self._prepare_clear(identifier_data)])
+
+    async def apply(self, changes: Iterable[Tuple[str, IdentifierData, Any]]) -> None:
+        statements = [
+            self._prepare_set(identifier_data, value)
+            if op == "set"
+            else self._prepare_clear(identifier_data)
+            for op, identifier_data, value in changes
+        ]
+        await self._transact(statements)
+
+    def _prepare_clear(
+        self, identifier_data: IdentifierData
+    ) -> Callable[[sqlite3.Connection], None]:
+        """Get a function executing the statements of a `clear` inside of a transaction."""
+        where, params = self._where(identifier_data)
+        identifiers = identifier_data.identifiers
+        is_document = (
+            identifier_data.category
+            and len(identifier_data.primary_key) == identifier_data.primary_key_len
+        )
+
+        def _clear(conn: sqlite3.Connection) -> None:
+            if not (is_document and identifiers):
+                conn.execute(f"DELETE FROM documents WHERE {where}", params)
+                return
+            row = conn.execute(f"SELECT data FROM documents WHERE {where}", params).fetchone()
+            if row is None:
+                return
+            document = partial = codec.loads(row[0])
+            try:
+                for i in identifiers[:-1]:
+                    partial = partial[i]
+                del partial[identifiers[-1]]
+            except KeyError:
+                return
+            conn.execute(
+                f"UPDATE documents SET data = ? WHERE {where}",
+                (codec.dumps(document),) + params,
+            )
+
+        return _clear
+
+    @classmethod
+    async def aiter_cogs(cls) -> AsyncIterator[Tuple[str, str]]:
+        def _aiter_cogs(conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+            return conn.execute("SELECT DISTINCT cog_name, cog_id FROM documents").fetchall()
+
+        for cog_name, cog_id in await cls._execute(_aiter_cogs):
+            yield cog_name, cog_id
+
+    @classmethod
+    async def delete_all_data(cls, **kwargs) -> None:
+        def _delete_all_data(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.execute("DELETE FROM documents")
+
+        await cls._execute(_delete_all_data)
+
+    async def export_data(self, custom_group_data: Dict[str, int]) -> AsyncIterator[Document]:
+        # The rows are fetched in batches by a cursor, which is
+        # only ever used from the connection's thread.
+        def _export_data(conn: sqlite3.Connection) -> sqlite3.Cursor:
+            return conn.execute(
+                "SELECT category, pkey, data FROM documents WHERE cog_name = ? AND cog_id = ?"
+                " ORDER BY category",
+                (self.cog_name, self.unique_cog_identifier),
+            )
+
+        cursor = await self._execute(_export_data)
+        try:
+            while True:
+                rows = await self._execute(lambda conn: cursor.fetchmany(_EXPORT_BATCH_SIZE))
+                if not rows:
+                    break
+                for category, pkey, data in rows:
+                    pkey_parts = tuple(pkey.split(_PKEY_SEP)) if pkey else ()
+                    yield category, pkey_parts, codec.loads(data)
+        finally:
+            await self._execute(lambda conn: cursor.close())
+
+    async def import_data(
+        self,
+        documents: AsyncIterable[Document],
+        custom_group_data: Dict[str, int],
+        *,
+        batch_size: int = 1000,
+    ) -> None:
+        async for batch in _batched(documents, batch_size):
+            rows = [
+                (
+                    self.cog_name,
+                    self.unique_cog_identifier,
+                    category,
+                    _PKEY_SEP.join(pkey),
+                    codec.dumps(data),
+                )
+                for category, pkey, data in batch
+            ]
+
+            def _import_data(conn: sqlite3.Connection) -> None:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", rows
+                    )
+
+            await self._execute(_import_data)
+
+
+def _in_transaction(
+    statements: List[Callable[[sqlite3.Connection], None]], synchronous: str = "FULL"
+) -> Callable[[sqlite3.Connection], None]:
+    def _transaction(conn: sqlite3.Connection) -> None:
+        # This can't be changed inside of a transaction.
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in statements:
+                statement(conn)
+
+    return _transaction
+
+
+def _flatten(levels: int, data: Dict[str, Any]) -> List[Tuple[Tuple[str, ...], Any]]:
+    if levels == 0:
+        return [((), data)]
+    ret = []
+    for key, value in data.items():
+        ret.extend(((key,) + pkey, doc) for pkey, doc in _flatten(levels - 1, value))
+    return ret
+
+
+def _pkey_len(conn: sqlite3.Connection, cog_key: Tuple[str, str], category: str) -> int:
+    try:
+        return ConfigCategory.get_pkey_info(category, {})[0]
+    except KeyError:
+        pass
+    row = conn.execute(
+        "SELECT pkey FROM documents WHERE cog_name = ? AND cog_id = ? AND category = ? LIMIT 1",
+        cog_key + (category,),
+    ).fetchone()
+    if row is None:
+        raise ValueError(
+            f"Cannot set all of the cog's data, the custom group {category} has no documents"
+            " to tell the length of its primary keys from."
+        )
+    return len(row[0].split(_PKEY_SEP)) if row[0] else 0
+
+
+def _insert_document(data: Dict[str, Any], pkey: str, document: Any) -> None:
+    if not pkey:
+        # The only document of a category without primary keys (e.g. GLOBAL) is the category.
+        data.update(document)
+        return
+    *parents, last = pkey.split(_PKEY_SEP)
+    for key in parents:
+        data = data.setdefault(key, {})
+    data[last] = document
@@ -0,0 +1,99 @@
+import collections.abc
+from typing import Any, Dict, Iterator, Optional
+
+__all__ = ["FrozenMapping", "FrozenSequence", "freeze"]
+
+
+class FrozenMapping(collections.abc.Mapping):
+    """Read-only view of a `dict` stored in Config.
+
+    The view doesn't copy the underlying data. Nested dicts and lists are
+    wrapped in views when they're accessed, which means that the view
+    reflects the changes made to the viewed dict after it was created.
+    It keeps showing the old data once the dict itself is replaced, e.g.
+    when the value or one of its parents is set or cleared, or when the
+    driver unloads the data or loads it again from its file, so views
+    shouldn't be kept around for long.
+
+    When ``defaults`` are given, keys missing from the data are looked up
+    in them, and nested dicts are merged with their defaults the same way
+    `Group.nested_update` does it.
+    """
+
+    __slots__ = ("_data", "_defaults")
+
+    def __init__(self, data: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None):
+        self._data = data
+        self._defaults = defaults
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            if self._defaults is None:
+                raise
+            return freeze(self._defaults[key])
+        if self._defaults is not None and isinstance(value, dict):
+            default = self._defaults.get(key)
+            if isinstance(default, dict):
+                return FrozenMapping(value, default)
+        return freeze(value)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._data
+        if self._defaults is not None:
+            for key in self._defaults:
+                if key not in self._data:
+                    yield key
+
+    def __len__(self) -> int:
+        if self._defaults is None:
+            return len(self._data)
+        return len(self._data) + sum(1 for key in self._defaults if key not in self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data or (self._defaults is not None and key in self._defaults)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def with_defaults(self, defaults: Dict[str, Any]) -> "FrozenMapping":
+        """Get a view of the same data with the given defaults mixed in."""
+        return FrozenMapping(self._data, defaults)
+
+
+class FrozenSequence(collections.abc.Sequence):
+    """Read-only view of a `list` stored in Config.
+
+    See `FrozenMapping` for details.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: list):
+        self._data = data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FrozenSequence(self._data[index])
+        return freeze(self._data[index])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (FrozenSequence, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self)!r})"
+
+
+def freeze(value: Any) -> Any:
+    """Wrap the given value in a read-only view, if it's mutable."""
+    if isinstance(value, dict):
+        return FrozenMapping(value)
+    if isinstance(value, list):
+        return FrozenSequence(value)
+    return value
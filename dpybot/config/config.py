@@ -1,6 +1,5 @@
 import asyncio
 import collections.abc
-import json
 import logging
 import pickle
 import weakref
@@ -9,6 +8,8 @@ from typing import (
     AsyncContextManager,
     Awaitable,
     Dict,
+    Iterable,
+    List,
     MutableMapping,
     Optional,
     Tuple,
@@ -19,13 +20,23 @@ from typing import (
 
 import discord
 
-from ._drivers import BaseDriver, ConfigCategory, IdentifierData, JsonDriver
+from ._drivers import (
+    BaseDriver,
+    ConfigCategory,
+    DualWriteDriver,
+    IdentifierData,
+    _driver_picked,
+    codec,
+    get_driver_class,
+)
+from ._drivers.views import FrozenMapping, freeze
 
 __all__ = (
     "ConfigCategory",
     "IdentifierData",
     "Value",
     "Group",
+    "Transaction",
     "Config",
 )
 
@@ -35,6 +46,8 @@ _T = TypeVar("_T")
 
 _config_cache = weakref.WeakValueDictionary()
 _retrieved = weakref.WeakSet()
+# The locks held by transactions in progress, mapped to the task running the transaction.
+_transaction_locks = weakref.WeakKeyDictionary()
 
 
 class ConfigMeta(type):
@@ -101,6 +114,12 @@ class _ValueCtxManager(Awaitable[_T], AsyncContextManager[_T]):  # pylint: disab
 
     async def __aenter__(self) -> _T:
         if self.__acquire_lock is True:
+            if _transaction_locks.get(self.__lock) is asyncio.current_task():
+                self.coro.close()
+                raise RuntimeError(
+                    "This value is locked by a transaction of the current task, which would"
+                    " deadlock. Use the transaction's get() and set() methods instead."
+                )
             await self.__lock.acquire()
         self.raw_value = await self
         if not isinstance(self.raw_value, (list, dict)):
@@ -143,9 +162,13 @@ class Value:
     def __init__(self, identifier_data: IdentifierData, default_value, driver, config: "Config"):
         self.identifier_data = identifier_data
         self.default = default_value
-        self._driver = driver
         self._config = config
 
+    @property
+    def _driver(self) -> BaseDriver:
+        # Looked up on every access, the Config's driver is replaced during live migrations.
+        return self._config._driver
+
     def get_lock(self) -> asyncio.Lock:
         """Get a lock to create a critical region where this value is accessed.
 
@@ -179,14 +202,20 @@ class Value:
         """
         return self._config._lock_cache.setdefault(self.identifier_data, asyncio.Lock())
 
-    async def _get(self, default=...):
+    async def _get(self, default=..., *, readonly: bool = False):
         try:
-            ret = await self._driver.get(self.identifier_data)
+            if readonly:
+                ret = await self._driver.get_view(self.identifier_data)
+            else:
+                ret = await self._driver.get(self.identifier_data)
         except KeyError:
-            return default if default is not ... else self.default
+            ret = default if default is not ... else self.default
+            return freeze(ret) if readonly else ret
         return ret
 
-    def __call__(self, default=..., *, acquire_lock: bool = True) -> _ValueCtxManager[Any]:
+    def __call__(
+        self, default=..., *, acquire_lock: bool = True, readonly: bool = False
+    ) -> _ValueCtxManager[Any]:
         """Get the literal value of this data element.
 
         Each `Value` object is created by the `Group.__getattr__` method. The
@@ -230,6 +259,13 @@ class Value:
             Set to ``False`` to disable the acquisition of the value's
             lock over the context manager body. Defaults to ``True``.
             Has no effect when not used as a context manager.
+        readonly : bool
+            Set to ``True`` to get a read-only view of the stored data instead
+            of a copy of it. Dicts and lists are returned as
+            `FrozenMapping` and `FrozenSequence` objects which reflect
+            later in-place changes to the data, but not the data replacing
+            it, see `FrozenMapping`. This avoids copying large values but
+            can't be used as a context manager. Defaults to ``False``.
 
         Returns
         -------
@@ -239,7 +275,9 @@ class Value:
             with` syntax, on gets the value on entrance, and sets it on exit.
 
         """
-        return _ValueCtxManager(self, self._get(default), acquire_lock=acquire_lock)
+        return _ValueCtxManager(
+            self, self._get(default, readonly=readonly), acquire_lock=acquire_lock
+        )
 
     async def set(self, value):
         """Set the value of the data elements pointed to by `identifiers`.
@@ -300,15 +338,23 @@ class Group(Value):
     ):
         self._defaults = defaults
         self.force_registration = force_registration
-        self._driver = driver
 
-        super().__init__(identifier_data, {}, self._driver, config)
+        super().__init__(identifier_data, {}, driver, config)
 
     @property
     def defaults(self):
         return pickle.loads(pickle.dumps(self._defaults, -1))
 
-    async def _get(self, default: Dict[str, Any] = ...) -> Dict[str, Any]:
+    async def _get(
+        self, default: Dict[str, Any] = ..., *, readonly: bool = False
+    ) -> Dict[str, Any]:
+        if readonly:
+            # The defaults are never modified through the view, no need to copy them.
+            default = default if default is not ... else self._defaults
+            raw = await super()._get(default, readonly=True)
+            if isinstance(raw, FrozenMapping) and isinstance(default, dict):
+                return raw.with_defaults(default)
+            return raw
         default = default if default is not ... else self.defaults
         raw = await super()._get(default)
         if isinstance(raw, dict):
@@ -520,7 +566,9 @@ class Group(Value):
                 return self.nested_update(raw, default)
             return raw
 
-    def all(self, *, acquire_lock: bool = True) -> _ValueCtxManager[Dict[str, Any]]:
+    def all(
+        self, *, acquire_lock: bool = True, readonly: bool = False
+    ) -> _ValueCtxManager[Dict[str, Any]]:
         """Get a dictionary representation of this group's data.
 
         The return value of this method can also be used as an asynchronous
@@ -536,6 +584,8 @@ class Group(Value):
         acquire_lock : bool
             Same as the ``acquire_lock`` keyword parameter in
             `Value.__call__`.
+        readonly : bool
+            Same as the ``readonly`` keyword parameter in `Value.__call__`.
 
         Returns
         -------
@@ -543,7 +593,7 @@ class Group(Value):
             All of this Group's attributes, resolved as raw data values.
 
         """
-        return self(acquire_lock=acquire_lock)
+        return self(acquire_lock=acquire_lock, readonly=readonly)
 
     def nested_update(
         self, current: collections.abc.Mapping, defaults: Dict[str, Any] = ...
@@ -569,6 +619,40 @@ class Group(Value):
             raise ValueError("You may only set the value of a group to be a dict.")
         await super().set(value)
 
+    async def update(self, **fields: Any):
+        """Set multiple attributes of this group at once.
+
+        This is much faster than setting them one by one, the data only
+        gets saved once for all of them.
+
+        Example
+        -------
+        ::
+
+            await config.member(member).update(level=5, xp=0, rank="Regular")
+
+            # is equivalent to
+
+            await config.member(member).level.set(5)
+            await config.member(member).xp.set(0)
+            await config.member(member).rank.set("Regular")
+
+        Parameters
+        ----------
+        **fields : Any
+            The new values, by the names of the attributes.
+
+        Raises
+        ------
+        AttributeError
+            If one of the attributes has not been registered and
+            `force_registration` is set to :code:`True`.
+
+        """
+        await self._config.set_many(
+            [(self.get_attr(name), value) for name, value in fields.items()]
+        )
+
     async def set_raw(self, *nested_path: Any, value):
         """
         Allows a developer to set data as if it was stored in a standard
@@ -598,6 +682,155 @@ class Group(Value):
         await self._driver.set(identifier_data, value=value)
 
 
+class Transaction:
+    """A set of changes to the data of a `Config`, which are applied together.
+
+    This class should not be instantiated directly - you should get instances
+    of this class through `Config.transaction`.
+    """
+
+    def __init__(self, config: "Config", values: Tuple[Value, ...]):
+        self._config = config
+        locks = {}
+        for value_obj in values:
+            config._check_owner(value_obj)
+            locks.setdefault(value_obj.identifier_data.to_tuple(), value_obj.get_lock())
+        self._locks = [locks[key] for key in sorted(locks)]
+        self._paths = list(locks)
+        self._changes: List[Tuple[str, Value, Any]] = []
+
+    async def __aenter__(self) -> "Transaction":
+        acquired = []
+        try:
+            for lock in self._locks:
+                await lock.acquire()
+                acquired.append(lock)
+        except BaseException:
+            for lock in reversed(acquired):
+                lock.release()
+            raise
+        task = asyncio.current_task()
+        for lock in self._locks:
+            _transaction_locks[lock] = task
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None and self._changes:
+                changes = [(op, obj.identifier_data, value) for op, obj, value in self._changes]
+                await self._config._driver.apply(changes)
+        finally:
+            self._changes.clear()
+            for lock in reversed(self._locks):
+                _transaction_locks.pop(lock, None)
+                lock.release()
+
+    def _check_locked(self, value_obj: Value) -> None:
+        self._config._check_owner(value_obj)
+        path = value_obj.identifier_data.to_tuple()
+        if not any(path[: len(locked)] == locked for locked in self._paths):
+            raise ValueError(
+                "Only the values passed to Config.transaction(), and the values under them,"
+                " can be changed in the transaction."
+            )
+
+    async def get(self, value_obj: Value, default=...) -> Any:
+        """Get the value of the given `Value` or `Group`, with the changes
+        made in this transaction so far.
+
+        Parameters
+        ----------
+        value_obj : Value
+            The `Value` (or `Group`) to get.
+        default : `object`, optional
+            Same as the ``default`` parameter of `Value.__call__`.
+
+        Returns
+        -------
+        Any
+            A copy of the value, the same as awaiting ``value_obj()`` would return
+            if the transaction was committed.
+
+        """
+        self._config._check_owner(value_obj)
+        target = value_obj.identifier_data.to_tuple()
+        found, raw, start = False, None, 0
+        # Start from the last change of the value itself or of one of its parents...
+        for index in range(len(self._changes) - 1, -1, -1):
+            op, changed, value = self._changes[index]
+            path = changed.identifier_data.to_tuple()
+            if target[: len(path)] == path:
+                if op == "set":
+                    found, raw = _lookup(value, target[len(path) :])
+                start = index + 1
+                break
+        else:
+            try:
+                raw = await self._config._driver.get(value_obj.identifier_data)
+            except KeyError:
+                pass
+            else:
+                found = True
+        # ...and apply the changes of its children which came after it.
+        for op, changed, value in self._changes[start:]:
+            path = changed.identifier_data.to_tuple()
+            if len(path) <= len(target) or path[: len(target)] != target:
+                continue
+            if op == "set":
+                if not found:
+                    found, raw = True, {}
+                _set_path(raw, path[len(target) :], codec.copy(value))
+            elif found:
+                _clear_path(raw, path[len(target) :])
+
+        if isinstance(value_obj, Group):
+            default = default if default is not ... else value_obj.defaults
+            if found and isinstance(raw, dict):
+                return value_obj.nested_update(raw, default)
+        elif default is ...:
+            default = value_obj.default
+        return raw if found else default
+
+    async def set(self, value_obj: Value, value: Any) -> None:
+        """Set the given `Value` or `Group` once the transaction is committed.
+
+        Parameters
+        ----------
+        value_obj : Value
+            The `Value` (or `Group`) to set.
+        value
+            The new value. Same as the ``value`` parameter of `Value.set`.
+
+        Raises
+        ------
+        ValueError
+            If ``value_obj`` wasn't passed to `Config.transaction`, and isn't
+            under one of the values which were.
+
+        """
+        self._check_locked(value_obj)
+        value = self._config._prepare_value(value_obj, value)
+        self._changes.append(("set", value_obj, codec.copy(value)))
+
+    async def clear(self, value_obj: Value) -> None:
+        """Clear the given `Value` or `Group` once the transaction is committed.
+
+        Parameters
+        ----------
+        value_obj : Value
+            The `Value` (or `Group`) to clear.
+
+        Raises
+        ------
+        ValueError
+            If ``value_obj`` wasn't passed to `Config.transaction`, and isn't
+            under one of the values which were.
+
+        """
+        self._check_locked(value_obj)
+        self._changes.append(("clear", value_obj, None))
+
+
 class Config(metaclass=ConfigMeta):
     """Configuration manager for cogs and Red.
 
@@ -651,6 +884,8 @@ class Config(metaclass=ConfigMeta):
         self.unique_identifier = unique_identifier
 
         self._driver = driver
+        # The driver class and options this Config was created with by `get_conf`.
+        self._driver_request: Optional[Tuple[Type[BaseDriver], Dict[str, Any]]] = None
         self.force_registration = force_registration
         self._defaults = defaults or {}
 
@@ -670,6 +905,8 @@ class Config(metaclass=ConfigMeta):
         identifier: int,
         force_registration=False,
         cog_name=None,
+        driver: Optional[str] = None,
+        **driver_options: Any,
     ):
         """Get a Config instance for your cog.
 
@@ -696,27 +933,57 @@ class Config(metaclass=ConfigMeta):
             Config normally uses ``cog_instance`` to determine the name of your cog.
             If you wish you may pass ``None`` to ``cog_instance`` and directly specify
             the name of your cog here.
+        driver : str, optional
+            The name of the driver storing the data of your cog, e.g. ``"sqlite"``.
+            By default, it's selected with the ``DPYBOT_CONFIG_DRIVERS`` and
+            ``DPYBOT_CONFIG_DRIVER`` environment variables, see
+            `get_driver_class`. The driver is initialized if it wasn't yet,
+            see `initialize_drivers`.
+        **driver_options
+            Options passed to the config driver, e.g. ``commit_window=0.05``
+            to write the cog's data in groups instead of on every change, or
+            ``durability="os"`` to override the ``DPYBOT_CONFIG_DURABILITY``
+            policy for this cog.
 
         Returns
         -------
         Config
-            A new Config object.
+            A new Config object, or the existing one for this cog and identifier.
+
+        Raises
+        ------
+        ValueError
+            If a Config for this cog and identifier already exists and ``driver``
+            or ``driver_options`` differ from the ones it was created with.
 
         """
         uuid = str(identifier)
         if cog_name is None:
             cog_name = type(cog_instance).__name__
 
-        driver = JsonDriver(cog_name, uuid)
-        if hasattr(driver, "migrate_identifier"):
-            driver.migrate_identifier(identifier)
+        driver_cls = get_driver_class(driver, cog_name=cog_name)
+        existing = _config_cache.get((cog_name, uuid))
+        if existing is not None:
+            # The driver options can't change once the cog's data is loaded.
+            requested = (driver_cls, driver_options)
+            if (driver is not None or driver_options) and requested != existing._driver_request:
+                raise ValueError(
+                    f"The Config of {cog_name} already exists with other driver options."
+                )
+            return existing
+
+        driver_obj = driver_cls(cog_name, uuid, **driver_options)
+        _driver_picked(driver_cls)
+        if hasattr(driver_obj, "migrate_identifier"):
+            driver_obj.migrate_identifier(identifier)
 
         conf = cls(
             cog_name=cog_name,
             unique_identifier=uuid,
             force_registration=force_registration,
-            driver=driver,
+            driver=driver_obj,
         )
+        conf._driver_request = (driver_cls, driver_options)
         return conf
 
     @classmethod
@@ -808,7 +1075,7 @@ class Config(metaclass=ConfigMeta):
             self._defaults[key] = {}
 
         # this serves as a 'deep copy' and verification that the default is serializable to JSON
-        data = json.loads(json.dumps(kwargs))
+        data = codec.copy(kwargs)
 
         for k, v in data.items():
             to_add = self._get_defaults_dict(k, v)
@@ -1167,6 +1434,138 @@ class Config(metaclass=ConfigMeta):
             raise ValueError(f"Group identifier not initialized: {group_identifier}")
         return self._get_base_group(str(group_identifier), *map(str, identifiers))
 
+    async def set_many(self, items: Iterable[Tuple[Value, Any]]):
+        """Set the values of multiple `Value` and `Group` objects at once.
+
+        This is much faster than setting them one by one, the data only
+        gets saved once for all of them.
+
+        Example
+        -------
+        ::
+
+            await config.set_many(
+                [
+                    (config.member(author).balance, author_balance),
+                    (config.member(target).balance, target_balance),
+                    (config.guild(guild).last_transfer, timestamp),
+                ]
+            )
+
+        Parameters
+        ----------
+        items : Iterable[Tuple[Value, Any]]
+            Pairs of `Value` (or `Group`) objects of this Config
+            and the values to set them to.
+
+        Raises
+        ------
+        ValueError
+            If a `Value` doesn't belong to this Config, or a `Group` is
+            being set to something else than a dict.
+
+        """
+        changes = [
+            (value_obj.identifier_data, self._prepare_value(value_obj, value))
+            for value_obj, value in items
+        ]
+        await self._driver.set_many(changes)
+
+    def transaction(self, *values: Value) -> "Transaction":
+        """Start a transaction on the data of this Config.
+
+        Changes made in the transaction are buffered and applied all at once
+        when the ``async with`` block exits without an exception, so either
+        all of them or none of them end up being stored.
+
+        The locks of the given values are held for the whole block, so they
+        must only be read and changed through the transaction. Using one of
+        them as a context manager (``async with value() as v``) inside of the
+        block raises `RuntimeError`, and acquiring one of their locks from
+        `Value.get_lock` directly deadlocks.
+
+        Example
+        -------
+        ::
+
+            sender = config.member(author).balance
+            receiver = config.member(target).balance
+            async with config.transaction(sender, receiver) as tx:
+                amount = min(amount, await tx.get(sender))
+                await tx.set(sender, await tx.get(sender) - amount)
+                await tx.set(receiver, await tx.get(receiver) + amount)
+
+        Parameters
+        ----------
+        *values : Value
+            The `Value` (or `Group`) objects the transaction changes. Only these
+            values and the values under them can be set or cleared with the
+            transaction, while any value of this Config can be read. Their
+            locks (see `Value.get_lock`) are held until the transaction ends,
+            and are always acquired in the same order, so transactions can't
+            deadlock on each other.
+
+        Returns
+        -------
+        Transaction
+            The transaction, to be used with the ``async with`` syntax.
+
+        """
+        return Transaction(self, values)
+
+    async def migrate_live(
+        self, new_driver: BaseDriver, *, rate: float = 1000, batch_size: int = 100
+    ) -> None:
+        """Move the data of this Config to another driver, while it keeps being used.
+
+        From the moment this is called, every change is written to both the
+        current driver and ``new_driver``, while the existing documents are
+        copied over in the background at a throttled rate. Once the copy is
+        done and verified, reads are served by ``new_driver``. Changes keep
+        being written to both drivers, so the old one stays up-to-date until
+        the bot is restarted with the new driver configured.
+
+        Only the custom groups which were initialized with `init_custom`
+        are copied.
+
+        Parameters
+        ----------
+        new_driver : BaseDriver
+            A driver of this Config's cog on the new backend.
+        rate : float
+            The maximum number of documents copied per second.
+        batch_size : int
+            The number of documents copied at once.
+
+        Raises
+        ------
+        RuntimeError
+            If the copied data doesn't match. Reads keep being
+            served by the old driver in that case.
+
+        """
+        driver = self._driver
+        if not isinstance(driver, DualWriteDriver) or driver.new is not new_driver:
+            if isinstance(driver, DualWriteDriver):
+                driver = driver.old
+            driver = self._driver = DualWriteDriver(driver, new_driver)
+        await driver.copy(self.custom_groups, rate=rate, batch_size=batch_size)
+        if not await driver.verify(self.custom_groups):
+            raise RuntimeError(f"The copied data of {self.cog_name} doesn't match.")
+
+    def _check_owner(self, value_obj: Value) -> None:
+        if value_obj._config is not self:
+            raise ValueError("All values must belong to this Config.")
+
+    def _prepare_value(self, value_obj: Value, value: Any) -> Any:
+        """Validate the value which is going to be set, the same way `Value.set` does it."""
+        self._check_owner(value_obj)
+        if isinstance(value, dict):
+            return _str_key_dict(value)
+        if isinstance(value_obj, Group):
+            raise ValueError("You may only set the value of a group to be a dict.")
+        return value
+
     async def _all_from_scope(self, scope: str) -> Dict[int, Dict[Any, Any]]:
         """Get a dict of all values from a particular scope of data.
 
@@ -1531,6 +1930,42 @@ async def migrate(cur_driver_cls: Type[BaseDriver], new_driver_cls: Type[BaseDri
     await cur_driver_cls.migrate_to(new_driver_cls, all_custom_group_data)
 
 
+async def migrate_live(new_driver_cls: Type[BaseDriver], **kwargs: Any) -> None:
+    """Move the data of all loaded Configs to another driver type, without downtime.
+
+    See `Config.migrate_live` for details and the available keyword arguments.
+    """
+    for conf in list(_config_cache.values()):
+        await conf.migrate_live(new_driver_cls(conf.cog_name, conf.unique_identifier), **kwargs)
+
+
+def _lookup(data: Any, path: Tuple[str, ...]) -> Tuple[bool, Any]:
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return False, None
+        data = data[key]
+    return True, codec.copy(data)
+
+
+def _set_path(data: Dict[str, Any], path: Tuple[str, ...], value: Any) -> None:
+    for key in path[:-1]:
+        try:
+            data = data.setdefault(key, {})
+        except AttributeError:
+            # Tried to set sub-field of non-object
+            raise TypeError("Cannot set sub-field of non-object")
+    data[path[-1]] = value
+
+
+def _clear_path(data: Dict[str, Any], path: Tuple[str, ...]) -> None:
+    try:
+        for key in path[:-1]:
+            data = data[key]
+        del data[path[-1]]
+    except (KeyError, TypeError):
+        pass
+
+
 def _str_key_dict(value: Dict[Any, _T]) -> Dict[str, _T]:
     """
     Recursively casts all keys in the given `dict` to `str`.
@@ -0,0 +1,40 @@
+"""Run the config daemon, see `ConfigServer`.
+
+Usage: ``python -m dpybot.config.server [--socket PATH] [--driver NAME]``
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+from pathlib import Path
+
+from ._drivers import ConfigServer, get_driver_class
+
+
+async def _serve(server: ConfigServer) -> None:
+    # Shut down cleanly, writing all of the data to disk, when the daemon is stopped.
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve config data to the bot's processes.")
+    parser.add_argument("--socket", type=Path, default=None, help="The path of the socket.")
+    parser.add_argument("--driver", default="json", help="The driver storing the data.")
+    args = parser.parse_args()
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(name)s: %(message)s", level=logging.INFO
+    )
+    server = ConfigServer(args.socket, get_driver_class(args.driver))
+    asyncio.run(_serve(server))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from dpybot.config._drivers import ConfigCategory, IdentifierData
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Run the test in an empty directory, where the drivers create their ``data`` directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def ident():
+    """Make the `IdentifierData` of a value, by its category, primary keys and identifiers.
+
+    The length of the primary keys is the one of the category, unless it's given.
+    """
+
+    def make(cog_name, category, pkey=(), identifiers=(), uuid="1", pkey_len=None):
+        if pkey_len is None:
+            pkey_len = ConfigCategory.get_pkey_info(category, {})[0] if category else 0
+        return IdentifierData(cog_name, uuid, category, tuple(pkey), tuple(identifiers), pkey_len)
+
+    return make
+
+
+@pytest.fixture
+def run_in_process(data_dir):
+    """Run a script in a fresh interpreter, the way the bot is started again after it exits.
+
+    The script is the body of an ``async def main()`` which can use
+    ``JsonDriver`` and ``ident``, whatever it prints is returned.
+    Scripts can end with ``os._exit(0)`` to exit like a crashed bot would,
+    without the drivers writing out anything on exit.
+    """
+
+    def run(body):
+        script = PRELUDE + textwrap.indent(textwrap.dedent(body), "    ")
+        script += "\nasyncio.run(main())\n"
+        proc = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=data_dir,
+            env={**os.environ, "PYTHONPATH": str(ROOT)},
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        assert proc.returncode == 0, proc.stderr
+        return proc.stdout
+
+    return run
+
+
+PRELUDE = """\
+import asyncio
+import os
+from dpybot.config._drivers import ConfigCategory, IdentifierData, JsonDriver
+
+
+def ident(cog_name, category, pkey=(), identifiers=(), uuid="1", pkey_len=None):
+    if pkey_len is None:
+        pkey_len = ConfigCategory.get_pkey_info(category, {})[0] if category else 0
+    return IdentifierData(cog_name, uuid, category, tuple(pkey), tuple(identifiers), pkey_len)
+
+
+async def main():
+"""
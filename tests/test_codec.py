@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from dpybot.config._drivers import codec
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(autouse=True)
+def restore_codec():
+    previous = codec.get_codec()
+    yield
+    codec._codec = previous
+
+
+def test_auto_selects_a_lossless_codec(monkeypatch):
+    monkeypatch.delenv("DPYBOT_JSON_CODEC", raising=False)
+    assert codec.is_lossless(codec.configure())
+
+
+@pytest.mark.parametrize("value", ["simdjson", "JSON5"])
+def test_unknown_codecs_are_rejected(monkeypatch, value):
+    monkeypatch.setenv("DPYBOT_JSON_CODEC", value)
+    with pytest.raises(ValueError, match="DPYBOT_JSON_CODEC"):
+        codec.configure()
+
+
+def test_unknown_codec_does_not_break_the_import():
+    proc = subprocess.run(
+        [sys.executable, "-c", "import dpybot.config._drivers"],
+        cwd=ROOT,
+        env={**os.environ, "DPYBOT_JSON_CODEC": "simdjson", "PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from dpybot.config import Config
+from dpybot.config._drivers import JsonDriver
+
+
+def _config(cog_name):
+    config = Config(cog_name, "1", JsonDriver(cog_name, "1"))
+    config.register_global(sender=100, receiver=0, other=0)
+    return config
+
+
+def test_changes_are_applied_together(data_dir):
+    async def main():
+        config = _config("TxCommit")
+        async with config.transaction(config.sender, config.receiver) as tx:
+            await tx.set(config.sender, await tx.get(config.sender) - 30)
+            await tx.set(config.receiver, await tx.get(config.receiver) + 30)
+            # Nothing is stored before the block exits.
+            assert await config.sender() == 100
+            assert await tx.get(config.sender) == 70
+        assert (await config.sender(), await config.receiver()) == (70, 30)
+
+    asyncio.run(main())
+
+
+def test_failed_transaction_applies_nothing(data_dir):
+    async def main():
+        config = _config("TxRollback")
+        with pytest.raises(RuntimeError, match="declined"):
+            async with config.transaction(config.sender, config.receiver) as tx:
+                await tx.set(config.sender, 0)
+                await tx.set(config.receiver, 100)
+                raise RuntimeError("declined")
+        assert (await config.sender(), await config.receiver()) == (100, 0)
+        # The locks were released.
+        assert not config.sender.get_lock().locked()
+
+    asyncio.run(main())
+
+
+def test_values_which_were_not_passed_cannot_be_changed(data_dir):
+    async def main():
+        config = _config("TxUnlisted")
+        async with config.transaction(config.sender) as tx:
+            assert await tx.get(config.other) == 0
+            with pytest.raises(ValueError, match="transaction"):
+                await tx.set(config.other, 1)
+            with pytest.raises(ValueError, match="transaction"):
+                await tx.clear(config.other)
+        # Values under a value which was passed can be changed.
+        async with config.transaction(config) as tx:
+            await tx.set(config.other, 1)
+        assert await config.other() == 1
+
+    asyncio.run(main())
+
+
+def test_value_context_manager_inside_transaction_raises(data_dir):
+    async def main():
+        config = _config("TxDeadlock")
+        config.register_global(items=[])
+        async with config.transaction(config.items) as tx:
+            with pytest.raises(RuntimeError, match="deadlock"):
+                async with config.items() as items:
+                    items.append(1)
+            await tx.set(config.items, [1])
+        # Other tasks wait for the transaction instead of raising.
+        async with config.transaction(config.items):
+            async def append():
+                async with config.items() as items:
+                    items.append(2)
+
+            task = asyncio.create_task(append())
+            await asyncio.sleep(0)
+            assert not task.done()
+        await task
+        assert await config.items() == [1, 2]
+
+    asyncio.run(main())
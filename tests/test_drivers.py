@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from dpybot.config import Config
+from dpybot.config import _drivers
+from dpybot.config._drivers import JsonDriver, initialize_drivers, teardown_drivers
+
+
+class _RecordingDriver(JsonDriver):
+    initialized = 0
+
+    @classmethod
+    async def initialize(cls, **storage_details):
+        cls.initialized += 1
+
+    @classmethod
+    async def teardown(cls):
+        pass
+
+
+def test_drivers_picked_by_cogs_are_initialized(data_dir, monkeypatch):
+    monkeypatch.setitem(_drivers._DRIVERS, "recording", _RecordingDriver)
+    monkeypatch.setattr(_RecordingDriver, "initialized", 0)
+
+    async def main():
+        # Picked before the drivers are initialized...
+        Config.get_conf(None, 1, cog_name="PickedEarly", driver="recording")
+        assert _RecordingDriver.initialized == 0
+        await initialize_drivers()
+        assert _RecordingDriver.initialized == 1
+        await teardown_drivers()
+
+        # ...and after it.
+        await initialize_drivers()
+        assert _RecordingDriver.initialized == 1
+        Config.get_conf(None, 1, cog_name="PickedLate", driver="recording")
+        Config.get_conf(None, 1, cog_name="PickedLater", driver="recording")
+        await asyncio.sleep(0)
+        assert _RecordingDriver.initialized == 2
+        await teardown_drivers()
+
+    asyncio.run(main())
+
+
+def test_server_driver_rejects_driver_options(data_dir):
+    with pytest.raises(ValueError, match="commit_window, durability"):
+        Config.get_conf(
+            None, 1, cog_name="ServerOptions", driver="server", durability="os", commit_window=1
+        )
@@ -0,0 +1,33 @@
+import pytest
+
+
+@pytest.mark.parametrize("options", ["", "sharded=True", "compression='gzip'"])
+def test_crash_while_saving_keeps_the_last_save(data_dir, run_in_process, options):
+    run_in_process(
+        f"""
+        from pathlib import Path
+
+        driver = JsonDriver("Atomic", "1", {options})
+        await driver.set(ident("Atomic", "GLOBAL", (), ("a",)), 1)
+        await driver.set(ident("Atomic", "MEMBER", ("10", "20"), ("xp",)), 5)
+
+        def crash(self, target):
+            # Die with the temporary file half written, before it replaces anything.
+            self.write_bytes(self.read_bytes()[: self.stat().st_size // 2])
+            os._exit(0)
+
+        Path.replace = crash
+        await driver.set(ident("Atomic", "GLOBAL", (), ("a",)), 2)
+        await driver.set(ident("Atomic", "MEMBER", ("10", "20"), ("xp",)), 6)
+        """
+    )
+    assert list(data_dir.glob("data/Atomic/**/*.tmp"))
+
+    output = run_in_process(
+        f"""
+        driver = JsonDriver("Atomic", "1", {options})
+        print(await driver.get(ident("Atomic", "GLOBAL", (), ("a",))))
+        print(await driver.get(ident("Atomic", "MEMBER", ("10", "20"), ("xp",))))
+        """
+    )
+    assert output.split() == ["1", "5"]
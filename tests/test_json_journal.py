@@ -0,0 +1,108 @@
+import asyncio
+import errno
+
+import pytest
+
+from dpybot.config._drivers import JsonDriver
+from dpybot.config._drivers.json.registry import _cogs
+
+
+class _TornFile:
+    """A journal file which runs out of space halfway through the next write."""
+
+    def __init__(self, fs):
+        self._fs = fs
+
+    def write(self, data):
+        self._fs.write(data[: len(data) // 2])
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self._fs, name)
+
+
+def test_replay_applies_the_journal(data_dir, ident, run_in_process):
+    run_in_process(
+        """
+        driver = JsonDriver("Replay", "1", journal=True)
+        for i in range(10):
+            await driver.set(ident("Replay", "GLOBAL", (), (f"k{i}",)), i)
+        await driver.clear(ident("Replay", "GLOBAL", (), ("k0",)))
+        os._exit(0)
+        """
+    )
+    assert (data_dir / "data/Replay/settings.journal").stat().st_size > 0
+
+    output = run_in_process(
+        """
+        driver = JsonDriver("Replay", "1", journal=True)
+        print(await driver.get(ident("Replay", "GLOBAL")))
+        """
+    )
+    assert output.strip() == str({f"k{i}": i for i in range(1, 10)})
+
+
+def test_replay_discards_a_torn_record(data_dir, ident, run_in_process):
+    run_in_process(
+        """
+        driver = JsonDriver("Torn", "1", journal=True)
+        await driver.set(ident("Torn", "GLOBAL", (), ("a",)), 1)
+        os._exit(0)
+        """
+    )
+    journal = data_dir / "data/Torn/settings.journal"
+    intact = journal.stat().st_size
+    with journal.open("ab") as fs:
+        fs.write(b'["set", ["1", "GLOBAL", "b"], 2')
+
+    output = run_in_process(
+        """
+        driver = JsonDriver("Torn", "1", journal=True)
+        await driver.set(ident("Torn", "GLOBAL", (), ("c",)), 3)
+        print(await driver.get(ident("Torn", "GLOBAL")), flush=True)
+        os._exit(0)
+        """
+    )
+    assert output.strip() == str({"a": 1, "c": 3})
+    # The torn record was cut off before the next one was appended.
+    assert journal.read_bytes().count(b"\n") == 2
+    assert journal.stat().st_size > intact
+
+
+def test_failed_append_does_not_lose_later_changes(data_dir, ident, run_in_process):
+    async def main():
+        driver = JsonDriver("FailedAppend", "1", journal=True)
+        await driver.set(ident("FailedAppend", "GLOBAL", (), ("a",)), 1)
+        journal = _cogs["FailedAppend"].storage.journal
+        journal._open = lambda: _TornFile(journal._fs)
+        with pytest.raises(OSError):
+            await driver.set(ident("FailedAppend", "GLOBAL", (), ("b",)), 2)
+        del journal._open
+        assert journal.needs_compaction
+        await driver.set(ident("FailedAppend", "GLOBAL", (), ("c",)), 3)
+        assert not journal.needs_compaction
+        await driver.set(ident("FailedAppend", "GLOBAL", (), ("d",)), 4)
+        journal.close()
+
+    asyncio.run(main())
+    output = run_in_process(
+        """
+        driver = JsonDriver("FailedAppend", "1", journal=True)
+        print(await driver.get(ident("FailedAppend", "GLOBAL")))
+        """
+    )
+    assert output.strip() == str({"a": 1, "b": 2, "c": 3, "d": 4})
+
+
+def test_only_appends_are_encoded_on_the_loop(data_dir, ident):
+    async def main():
+        driver = JsonDriver("JournalLoop", "1", journal=True)
+        await driver.set(ident("JournalLoop", "GLOBAL", (), ("a",)), 1)
+        storage = _cogs["JournalLoop"].storage
+        storage.fragments.invalidate(("1",))
+        assert storage.encodes_on_loop()
+        # Compacting the journal encodes every document which isn't cached.
+        assert not storage.encodes_on_loop(rewrite=True)
+        await JsonDriver.teardown()
+
+    asyncio.run(main())
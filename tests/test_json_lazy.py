@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+LOAD = """
+from dpybot.config._drivers.json.registry import _cogs
+
+driver = JsonDriver("Lazy", "1", lazy_load=True)
+print(await driver.get(ident("Lazy", "MEMBER", ("10", "20"), ("xp",))))
+print(_cogs["Lazy"].storage.undecoded)
+"""
+
+
+@pytest.fixture
+def saved(data_dir, run_in_process):
+    """Save the data of a lazily loaded cog, along with its index."""
+    run_in_process(
+        """
+        driver = JsonDriver("Lazy", "1", lazy_load=True)
+        for guild in range(5):
+            await driver.set(ident("Lazy", "MEMBER", (str(10 + guild), "20"), ("xp",)), guild)
+        """
+    )
+    assert (data_dir / "data/Lazy/settings.index").exists()
+    return data_dir / "data/Lazy"
+
+
+def test_documents_are_decoded_when_accessed(saved, run_in_process):
+    assert run_in_process(LOAD).split() == ["0", "4"]
+
+
+def test_file_changed_without_the_index_is_loaded_eagerly(saved, run_in_process):
+    path = saved / "settings.json"
+    data = json.loads(path.read_text())
+    data["1"]["MEMBER"]["10"]["20"]["xp"] = 100
+    path.write_text(json.dumps(data))
+    assert run_in_process(LOAD).split() == ["100", "0"]
+
+
+@pytest.mark.parametrize("index", [b"", b"{not json", None])
+def test_missing_or_malformed_index_is_loaded_eagerly(saved, run_in_process, index):
+    path = saved / "settings.index"
+    if index is None:
+        path.unlink()
+    else:
+        path.write_bytes(index)
+    assert run_in_process(LOAD).split() == ["0", "0"]
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from dpybot.config._drivers import JsonDriver
+from dpybot.config._drivers.json import watcher
+
+
+class _NoInotify:
+    def __init__(self):
+        raise OSError("inotify is unavailable")
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_changes_of_other_processes_are_reloaded(
+    data_dir, ident, run_in_process, monkeypatch, polling
+):
+    if polling:
+        monkeypatch.setattr(watcher, "_Inotify", _NoInotify)
+        monkeypatch.setattr(watcher._watcher, "poll_interval", 0.05)
+
+    async def main():
+        driver = JsonDriver("Watched", "1", watch=True)
+        await JsonDriver.initialize()
+        reloads = []
+        driver.add_reload_listener(lambda: reloads.append(1))
+        await driver.set(ident("Watched", "GLOBAL", (), ("name",)), "mine")
+        await asyncio.sleep(0.2)
+        # Our own writes aren't reloaded.
+        assert not reloads
+
+        await asyncio.to_thread(
+            run_in_process,
+            """
+            driver = JsonDriver("Watched", "1")
+            await driver.set(ident("Watched", "GLOBAL", (), ("name",)), "theirs")
+            """,
+        )
+        for _ in range(100):
+            if reloads:
+                break
+            await asyncio.sleep(0.05)
+        assert reloads
+        assert await driver.get(ident("Watched", "GLOBAL", (), ("name",))) == "theirs"
+        await JsonDriver.teardown()
+
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+
+from dpybot.config._drivers.json.writer import _WriterExecutor
+
+
+@pytest.mark.parametrize("value", ["four", "0", "-1"])
+@pytest.mark.parametrize("name", ["DPYBOT_CONFIG_WRITERS", "DPYBOT_CONFIG_WRITE_QUEUE"])
+def test_invalid_sizes_are_rejected(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValueError, match=name):
+        _WriterExecutor().configure()
+
+
+def test_sizes_are_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("DPYBOT_CONFIG_WRITERS", "2")
+    monkeypatch.delenv("DPYBOT_CONFIG_WRITE_QUEUE", raising=False)
+    writer = _WriterExecutor()
+    writer.configure()
+    assert (writer.max_workers, writer.max_queued) == (2, 64)
+
+
+def test_cancelled_calls_are_not_counted():
+    async def main():
+        writer = _WriterExecutor(max_workers=1, max_queued=1)
+        release = threading.Event()
+        running = asyncio.create_task(writer.run(release.wait))
+        queued = asyncio.create_task(writer.run(lambda: None))
+        await asyncio.sleep(0.05)
+        assert writer.waiting == 1
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert writer.waiting == 0
+        release.set()
+        await running
+        assert writer.queued == 0
+        writer.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from dpybot.config._drivers import JsonDriver, SqliteDriver
+from dpybot.config._drivers.base import _MigrationCheckpoint
+
+
+class _Interrupted(Exception):
+    pass
+
+
+async def _fill(ident, cog_names):
+    for cog_name in cog_names:
+        driver = JsonDriver(cog_name, "1")
+        await driver.set(ident(cog_name, "GLOBAL", (), ("name",)), cog_name)
+        await driver.set(ident(cog_name, "GUILD", ("10",), ("prefix",)), "!")
+        await driver.set(ident(cog_name, "MEMBER", ("10", "20"), ("xp",)), 7)
+
+
+async def _dump(driver_cls, cog_name):
+    return [document async for document in driver_cls(cog_name, "1").export_data({})]
+
+
+def _migrate(data_dir, ident, cog_names, scenario):
+    async def main():
+        await SqliteDriver.initialize(path=str(data_dir / "config.sqlite3"))
+        try:
+            await _fill(ident, cog_names)
+            await scenario(data_dir / "config-migration.json")
+        finally:
+            await SqliteDriver.teardown()
+            await JsonDriver.teardown()
+
+    asyncio.run(main())
+
+
+def test_interrupted_migration_resumes(data_dir, ident, monkeypatch):
+    imported = []
+    import_data = SqliteDriver.import_data
+
+    async def counting_import(self, documents, custom_group_data):
+        imported.append(self.cog_name)
+        await import_data(self, documents, custom_group_data)
+
+    monkeypatch.setattr(SqliteDriver, "import_data", counting_import)
+    add_category = _MigrationCheckpoint.add_category
+
+    def interrupt(self, *args):
+        add_category(self, *args)
+        raise _Interrupted
+
+    async def scenario(checkpoint_path):
+        with monkeypatch.context() as m:
+            m.setattr(_MigrationCheckpoint, "add_category", interrupt)
+            with pytest.raises(_Interrupted):
+                await JsonDriver.migrate_to(
+                    SqliteDriver, {}, concurrency=1, checkpoint_path=checkpoint_path
+                )
+        assert checkpoint_path.exists()
+        assert len(imported) == 1
+        imported.clear()
+
+        await JsonDriver.migrate_to(SqliteDriver, {}, checkpoint_path=checkpoint_path)
+        # The category migrated before the interruption isn't migrated again.
+        assert len(imported) == 5
+        assert not checkpoint_path.exists()
+        for cog_name in ("ResumeA", "ResumeB"):
+            assert await _dump(SqliteDriver, cog_name) == await _dump(JsonDriver, cog_name)
+
+    _migrate(data_dir, ident, ("ResumeA", "ResumeB"), scenario)
+
+
+def test_mismatched_migration_is_redone(data_dir, ident, monkeypatch):
+    import_data = SqliteDriver.import_data
+
+    async def lossy_import(self, documents, custom_group_data):
+        async def skip_members():
+            async for document in documents:
+                if document[0] != "MEMBER" or self.cog_name != "MigrateB":
+                    yield document
+
+        await import_data(self, skip_members(), custom_group_data)
+
+    async def scenario(checkpoint_path):
+        with monkeypatch.context() as m:
+            m.setattr(SqliteDriver, "import_data", lossy_import)
+            with pytest.raises(RuntimeError, match="MigrateB"):
+                await JsonDriver.migrate_to(SqliteDriver, {}, checkpoint_path=checkpoint_path)
+        checkpoint = _MigrationCheckpoint(checkpoint_path, "JsonDriver", "SqliteDriver")
+        assert checkpoint.is_verified("MigrateA", "1")
+        assert not checkpoint.categories("MigrateB", "1")
+
+        await JsonDriver.migrate_to(SqliteDriver, {}, checkpoint_path=checkpoint_path)
+        assert not checkpoint_path.exists()
+        assert await _dump(SqliteDriver, "MigrateB") == await _dump(JsonDriver, "MigrateB")
+
+    _migrate(data_dir, ident, ("MigrateA", "MigrateB"), scenario)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from dpybot.config._drivers import JsonDriver, SqliteDriver
+
+
+def _run_on_both(data_dir, scenario):
+    """Run the scenario on a JsonDriver and a SqliteDriver, returning what it returned for each."""
+
+    async def main():
+        await SqliteDriver.initialize(path=str(data_dir / "config.sqlite3"))
+        try:
+            return [
+                await scenario(JsonDriver("Parity", "1")),
+                await scenario(SqliteDriver("Parity", "1")),
+            ]
+        finally:
+            await SqliteDriver.teardown()
+            await JsonDriver.teardown()
+
+    return asyncio.run(main())
+
+
+async def _fill(driver, ident):
+    await driver.set(ident("Parity", "GLOBAL", (), ("x",)), 5)
+    await driver.set(ident("Parity", "GLOBAL", (), ("nested", "y")), [1, 2])
+    await driver.set(ident("Parity", "GUILD", ("10",), ("prefix",)), "!")
+    await driver.set(ident("Parity", "MEMBER", ("10", "20"), ("xp",)), 7)
+    await driver.set(ident("Parity", "MEMBER", ("10", "21"), ("xp",)), 8)
+    await driver.set(ident("Parity", "MEMBER", ("11", "20"), ("xp",)), 9)
+
+
+@pytest.mark.parametrize(
+    "category, pkey, identifiers",
+    [
+        ("", (), ()),
+        ("GLOBAL", (), ()),
+        ("GLOBAL", (), ("nested",)),
+        ("GUILD", (), ()),
+        ("GUILD", ("10",), ("prefix",)),
+        ("MEMBER", (), ()),
+        ("MEMBER", ("10",), ()),
+        ("MEMBER", ("10", "20"), ()),
+        ("MEMBER", ("10", "20"), ("xp",)),
+    ],
+)
+def test_get(data_dir, ident, category, pkey, identifiers):
+    async def scenario(driver):
+        await _fill(driver, ident)
+        return await driver.get(ident("Parity", category, pkey, identifiers))
+
+    json_result, sqlite_result = _run_on_both(data_dir, scenario)
+    assert json_result == sqlite_result
+
+
+def test_set_all_of_the_cogs_data(data_dir, ident):
+    new_data = {
+        "GLOBAL": {"x": 1},
+        "MEMBER": {"12": {"30": {"xp": 3}}},
+    }
+
+    async def scenario(driver):
+        await _fill(driver, ident)
+        await driver.set(ident("Parity", ""), new_data)
+        return [
+            await driver.get(ident("Parity", "")),
+            await driver.get(ident("Parity", "MEMBER", ("12", "30"), ("xp",))),
+        ]
+
+    json_result, sqlite_result = _run_on_both(data_dir, scenario)
+    assert json_result == sqlite_result == [new_data, 3]
+
+
+def test_clear(data_dir, ident):
+    async def scenario(driver):
+        await _fill(driver, ident)
+        await driver.clear(ident("Parity", "MEMBER", ("10",)))
+        await driver.clear(ident("Parity", "GLOBAL", (), ("nested", "y")))
+        return await driver.get(ident("Parity", ""))
+
+    json_result, sqlite_result = _run_on_both(data_dir, scenario)
+    assert json_result == sqlite_result
+
+
+def test_set_all_of_the_cogs_data_with_a_new_custom_group(data_dir, ident):
+    async def main():
+        await SqliteDriver.initialize(path=str(data_dir / "config.sqlite3"))
+        driver = SqliteDriver("Parity", "1")
+        try:
+            await driver.set(ident("Parity", "Custom", ("1",), ("a",), pkey_len=1), 1)
+            # The length of the primary keys of Custom is known from its document.
+            await driver.set(ident("Parity", ""), {"Custom": {"2": {"a": 2}}})
+            assert await driver.get(ident("Parity", "Custom", ("2",), pkey_len=1)) == {"a": 2}
+            with pytest.raises(ValueError, match="Other"):
+                await driver.set(ident("Parity", ""), {"Other": {"1": {"a": 1}}})
+            # The failed set didn't change anything.
+            assert await driver.get(ident("Parity", "")) == {"Custom": {"2": {"a": 2}}}
+        finally:
+            await SqliteDriver.teardown()
+
+    asyncio.run(main())